@@ -14,7 +14,7 @@ class EtcdV3Mapper:
     def modifyPwd(self, username:str, password:str)->int:
         pass
     
-    @Selete(datasource='ds04', sql='select * from t_config order by node_name asc')
+    @Selete(datasource='ds04', sql='select * from t_config order by node_name asc', cache=True)
     def getallconfig(self)->list:
         pass
     
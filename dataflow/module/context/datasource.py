@@ -1,5 +1,7 @@
-from dataflow.module import Context, Bean
-from dataflow.utils.dbtools.pydbc import PydbcTools,Propagation as _Propagation, TX as _tx
+from dataflow.module import Context, Bean, WebContext
+from dataflow.utils.dbtools.pydbc import PydbcTools,Propagation as _Propagation, TX as _tx, ExecutorType as _ExecutorType
+from dataflow.utils.dbtools.sharding import ShardingTools
+from dataflow.utils.dbtools.gather import gather as _gather, GatherResult
 
 from dataflow.utils.utils import str_isEmpty
 from dataflow.utils.log import Logger
@@ -11,6 +13,9 @@ prefix = 'context.database'
 
 _logger = Logger('dataflow.module.context.datasource')
 
+_datasources:dict[str, PydbcTools] = {}
+_shardings:dict[str, ShardingTools] = {}
+
 class Propagation(Enum):    
     """事务传播行为"""
     REQUIRED = _Propagation.REQUIRED.value  # "REQUIRED"        # 支持当前事务，如果不存在则创建新事务
@@ -20,6 +25,11 @@ class Propagation(Enum):
     MANDATORY = _Propagation.MANDATORY.value  # "MANDATORY"      # 必须存在当前事务，否则抛出异常
     NEVER = _Propagation.NEVER.value  # "NEVER"              # 必须不存在事务，否则抛出异常
 
+class ExecutorType(Enum):
+    """事务中写语句的执行方式"""
+    SIMPLE = _ExecutorType.SIMPLE.value  # 每条语句立即执行
+    BATCH = _ExecutorType.BATCH.value    # 语句排队，用executemany批量执行
+
 class DataSourceContext:
     @staticmethod
     def getDefaultKey():
@@ -31,12 +41,29 @@ class DataSourceContext:
             ds_name = DataSourceContext.getDefaultKey()
                         
         return Context.getContext().getBean(f'{ds_name}')
+
+    @staticmethod
+    def getAllDS()->dict[str, PydbcTools]:
+        """配置的全部数据源，{名称: PydbcTools}，分片数据源自己创建的分片名称为{分片数据源}.{分片}"""
+        return _datasources.copy()
+
+    @staticmethod
+    def getSharding(ds_name:str)->ShardingTools:
+        return _shardings[ds_name]
+
+    @staticmethod
+    async def gather(queries:list[tuple], timeout:float=None, limit:int=None, return_exceptions:bool=True)->list[GatherResult]:
+        """并发执行多个数据源上的独立查询，queries为(数据源名称或者实例, sql, params[, method])列表，结果按顺序返回，
+        每个结果有result/error/elapsed，参数说明见dataflow.utils.dbtools.gather.gather"""
+        queries = [(DataSourceContext.getDS(one[0]) if one[0] is None or isinstance(one[0], str) else one[0], *one[1:]) for one in queries]
+        return await _gather(queries, timeout, limit, return_exceptions)
     
 class TransactionManager:
     def __init__(self, pydbc:PydbcTools):
         self._pydbc = pydbc
     
-def TX(tx_name:str=None, *, propagation:Propagation=Propagation.REQUIRED,rollback_for:Union[Type[Exception], Tuple[Type[Exception], ...]] = Exception):
+def TX(tx_name:str=None, *, propagation:Propagation=Propagation.REQUIRED,rollback_for:Union[Type[Exception], Tuple[Type[Exception], ...]] = Exception,
+       executor:ExecutorType=ExecutorType.SIMPLE):
     
     if tx_name and isinstance(tx_name, str):
         tx = Bean(tx_name)
@@ -46,7 +73,32 @@ def TX(tx_name:str=None, *, propagation:Propagation=Propagation.REQUIRED,rollbac
         tx = Bean(get_fullname(TransactionManager))
         
     tx:TransactionManager = tx    
-    return _tx(tx._pydbc, propagation=propagation, rollback_for=rollback_for)
+    return _tx(tx._pydbc, propagation=propagation, rollback_for=rollback_for, executor=executor)
+
+def _setup_result_cache_redis(pt:PydbcTools):
+    """result_cache.redis为true时使用context.redis的RedisTools作为结果缓存的二级缓存，第一次使用时获取"""
+    config = pt.getConfig().get('result_cache')
+    if isinstance(config, dict) and config.get('redis', False):
+        from dataflow.utils.dbtools.redis import RedisTools
+        pt.setResultCacheRedis(lambda: Context.getContext().getBean(get_fullname(RedisTools)))
+
+def _init_sharding(k:str, v:dict)->ShardingTools:
+    """type: sharding的数据源，shards为{分片名: 数据源配置或者已配置的数据源名称}或者数据源名称列表
+    key为分片键，strategy为hash/range/map，range使用ranges: [[上界, 分片], ..., [null, 分片]]，map使用mapping: {值: 分片}和default"""
+    shards = v.get('shards') or {}
+    if isinstance(shards, list):
+        shards = {one: one for one in shards}
+    instances = {}
+    for name, one in shards.items():
+        if isinstance(one, str):
+            instances[name] = Context.getContext().getBean(one)
+        else:
+            pt = PydbcTools(**one)
+            _setup_result_cache_redis(pt)
+            _datasources[f'{k}.{name}'] = pt
+            instances[name] = pt
+    return ShardingTools(instances, v['key'], v.get('strategy', 'hash'), v.get('ranges'), v.get('mapping'),
+                         v.get('default'), v.get('max_workers'))
 
 @Context.Configurationable(prefix=prefix)
 def _init_datasource_context(config):
@@ -54,11 +106,16 @@ def _init_datasource_context(config):
     if c:
         default_ok:bool = False
         _default_c = {}
+        _sharding_c = {}
         for k, v in c.items(): 
-            if isinstance(v, dict):
+            if isinstance(v, dict) and v.get('type') == 'sharding':
+                _sharding_c[k] = v      # 分片可以引用其他数据源，最后初始化
+            elif isinstance(v, dict):
                 _logger.INFO(f'初始化数据源{prefix}.{k}[{v}]开始')
                 pt = PydbcTools(**v)
+                _setup_result_cache_redis(pt)
                 Context.getContext().registerBean(f'{k}', pt)
+                _datasources[k] = pt
                 _logger.INFO(f'初始化数据源{prefix}.{k}[{v}]={pt}成功')
                 if not default_ok:
                     Context.getContext().registerBean(DataSourceContext.getDefaultKey(), pt)
@@ -69,9 +126,17 @@ def _init_datasource_context(config):
                 
         if _default_c and 'url' in _default_c:            
             pt = PydbcTools(**_default_c)
+            _setup_result_cache_redis(pt)
             _logger.INFO(f'初始化DEFAULT数据源{prefix}.ds[{_default_c}]={pt}成功')
             Context.getContext().registerBean(DataSourceContext.getDefaultKey(), pt)
+            _datasources[DataSourceContext.getDefaultKey()] = pt
             _logger.INFO(f'设置默认数据源={pt}')
+
+        for k, v in _sharding_c.items():
+            st = _init_sharding(k, v)
+            Context.getContext().registerBean(f'{k}', st)
+            _shardings[k] = st
+            _logger.INFO(f'初始化分片数据源{prefix}.{k}={st}成功')
         
         # 注册默认的TransactionManager实例，作为TX默认事务管理器
         tm:TransactionManager = TransactionManager(DataSourceContext.getDS(DataSourceContext.getDefaultKey()))
@@ -80,3 +145,38 @@ def _init_datasource_context(config):
             
     else:
         _logger.INFO('没有配置数据源，跳过初始化')
+
+
+@WebContext.Event.on_loaded
+def _register_router_for_datasource(app):
+    @app.get('/actuator/datasources')
+    def actuator_datasources():
+        return {k: {
+            'url': v.engine.url.render_as_string(hide_password=True),
+            'dialect': v.getDbType(),
+            'pool': v.getPoolStats(),
+            'async_pool': v.getAsyncPoolStats(),
+            'replicas': v.getReplicaStats(),
+        } for k, v in _datasources.items()}
+
+    @app.get('/actuator/sql/top')
+    def actuator_sql_top(n:int=20, order:str='total', datasource:str=None):
+        """按SQL指纹统计的耗时排行，order为total/calls/avg/max/rows/errors"""
+        return {k: v.getSqlTop(n, order) for k, v in _datasources.items()
+                if v.getSqlStats() is not None and (datasource is None or datasource == k)}
+
+    @app.get('/actuator/datasources/statements')
+    def actuator_datasource_statements():
+        return {k: v.getStatementCacheStats() for k, v in _datasources.items()}
+
+    @app.get('/actuator/datasources/replicas')
+    def actuator_datasource_replicas():
+        return {k: {'pool': v.getPoolStats(), 'replicas': v.getReplicaStats()} for k, v in _datasources.items()}
+
+    @app.get('/actuator/datasources/shards')
+    def actuator_datasource_shards():
+        return {k: v.getShardStats() for k, v in _shardings.items()}
+
+    @app.get('/actuator/datasources/cache')
+    def actuator_datasource_cache():
+        return {k: v.getResultCache().stats() for k, v in _datasources.items() if v._result_cache is not None}
@@ -3,7 +3,9 @@
 This module sets up and configures Prometheus metrics for monitoring the application.
 """
 
-from prometheus_client import Counter, Histogram, Gauge  # noqa: F401
+from prometheus_client import Counter, Histogram, Gauge, REGISTRY  # noqa: F401
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily, HistogramMetricFamily
+from prometheus_client.utils import floatToGoString
 from starlette_prometheus import metrics, PrometheusMiddleware
 
 import time
@@ -75,6 +77,86 @@ def setup_metrics(app):
     
     metricsContext = MetricsContext()
     Context.getContext().registerBean(get_fullname(metricsContext), metricsContext)
+
+    REGISTRY.register(DataSourceCollector())
+    _logger.INFO('添加数据源连接池指标DataSourceCollector')
+
+
+class DataSourceCollector:
+    """数据源指标，抓取时读取每个数据源(包括只读副本)的连接池状态、连接池事件统计和语句/结果缓存计数
+    标签datasource为配置的数据源名称，副本为{名称}.replica{序号}，engine为sync/async
+    启用sql_stats的数据源按SQL指纹导出耗时直方图，fingerprint为指纹id，对应/actuator/sql/top的id"""
+    def collect(self):
+        from dataflow.module.context.datasource import DataSourceContext
+
+        labels = ['datasource', 'engine']
+        gauges = {
+            'checkedout': GaugeMetricFamily('db_pool_checked_out_connections', 'Connections currently checked out of the pool', labels=labels),
+            'checkedin': GaugeMetricFamily('db_pool_idle_connections', 'Idle connections in the pool', labels=labels),
+            'overflow': GaugeMetricFamily('db_pool_overflow_connections', 'Connections opened beyond pool_size', labels=labels),
+            'size': GaugeMetricFamily('db_pool_size', 'Configured pool_size', labels=labels),
+        }
+        counters = {
+            'connect': CounterMetricFamily('db_pool_connects', 'DBAPI connections opened', labels=labels),
+            'close': CounterMetricFamily('db_pool_closes', 'DBAPI connections closed', labels=labels),
+            'checkout': CounterMetricFamily('db_pool_checkouts', 'Pool checkouts', labels=labels),
+            'invalidate': CounterMetricFamily('db_pool_invalidations', 'Connections invalidated', labels=labels),
+            'soft_invalidate': CounterMetricFamily('db_pool_soft_invalidations', 'Connections soft invalidated', labels=labels),
+            'timeout': CounterMetricFamily('db_pool_checkout_timeouts', 'Checkouts failed after pool_timeout', labels=labels),
+        }
+        wait = HistogramMetricFamily('db_pool_checkout_wait_seconds', 'Time spent obtaining a connection from the pool', labels=labels)
+        lifetime = HistogramMetricFamily('db_pool_connection_lifetime_seconds', 'Lifetime of closed DBAPI connections', labels=labels)
+        statement = CounterMetricFamily('db_statement_cache', 'Statement cache lookups', labels=['datasource', 'result'])
+        result = CounterMetricFamily('db_result_cache', 'Query result cache lookups', labels=['datasource', 'result'])
+        sql_labels = ['datasource', 'fingerprint', 'statement']
+        sql_duration = HistogramMetricFamily('db_sql_duration_seconds', 'SQL execution time by fingerprint', labels=sql_labels)
+        sql_rows = CounterMetricFamily('db_sql_rows', 'Rows returned or affected by fingerprint', labels=sql_labels)
+        sql_errors = CounterMetricFamily('db_sql_errors', 'Failed executions by fingerprint', labels=sql_labels)
+
+        for name, ds in self._datasources(DataSourceContext.getAllDS()):
+            for engine, one in ds.getPoolTelemetry().items():
+                values = [name, engine]
+                for k, g in gauges.items():
+                    if k in one['pool']:
+                        g.add_metric(values, one['pool'][k])
+                for k, c in counters.items():
+                    c.add_metric(values, one['counters'][k])
+                for h, snapshot in ((wait, one['wait']), (lifetime, one['lifetime'])):
+                    h.add_metric(values, [(floatToGoString(le), cnt) for le, cnt in snapshot['buckets']], snapshot['sum'])
+            stats = ds.getStatementCacheStats()
+            statement.add_metric([name, 'hit'], stats['hits'])
+            statement.add_metric([name, 'miss'], stats['misses'])
+            if ds._result_cache is not None:
+                stats = ds.getResultCache().stats()
+                result.add_metric([name, 'hit'], stats['hits'])
+                result.add_metric([name, 'miss'], stats['misses'])
+
+        yield from gauges.values()
+        yield from counters.values()
+        yield wait
+        yield lifetime
+        yield statement
+        yield result
+
+        for name, ds in DataSourceContext.getAllDS().items():   # 副本与主库共用一个SqlStats
+            stats = ds.getSqlStats()
+            if stats is None:
+                continue
+            for one in stats.histograms():
+                values = [name, one['id'], one['statement'] or '']
+                sql_duration.add_metric(values, [(floatToGoString(le), cnt) for le, cnt in one['buckets']], one['sum'])
+                sql_rows.add_metric(values, one['rows'])
+                sql_errors.add_metric(values, one['errors'])
+        yield sql_duration
+        yield sql_rows
+        yield sql_errors
+
+    @staticmethod
+    def _datasources(datasources:dict):
+        for name, ds in datasources.items():
+            yield name, ds
+            for i, replica in enumerate(ds.getReplicas()):
+                yield f'{name}.replica{i}', replica
     
     
 class MetricsMiddleware(BaseHTTPMiddleware):
@@ -1,17 +1,21 @@
 from dataflow.utils.log import Logger
 from dataflow.utils.reflect import get_fullname
-from dataflow.utils.dbtools.pydbc import PydbcTools
+from dataflow.utils.dbtools.pydbc import PydbcTools, ExecutorType
+from dataflow.utils.dbtools.sharding import ShardingTools
 from dataflow.utils.dbtools.pybatis import Mapper as _Mapper, SELECT as _SELECT, UPDATE as _UPDATE, XMLConfig
+from dataflow.utils.dbtools.association import Association, Collection, detect_n_plus_one  # noqa: F401
+from dataflow.utils.dbtools.sqlrender import render_stats
+from dataflow.utils.dbtools.namespacecache import cache_stats, set_cache_redis
 from dataflow.module.context.datasource import DataSourceContext
-from dataflow.module import Context
+from dataflow.module import Context, WebContext
 
 _logger = Logger('dataflow.module.context.pybatisplus')
 
-def _get_datasource(datasource:str|PydbcTools=None):
+def _get_datasource(datasource:str|PydbcTools|ShardingTools=None):
     if datasource:
         if datasource is None or isinstance(datasource, str):
             datasource = DataSourceContext.getDS(datasource)
-        elif isinstance(datasource, PydbcTools):
+        elif isinstance(datasource, (PydbcTools, ShardingTools)):
             datasource = datasource
         else:
             raise KeyError(f'缺少 datasource：{id}')
@@ -21,9 +25,9 @@ def _get_datasource(datasource:str|PydbcTools=None):
     return datasource
     
 
-def Mapper(datasource:str|PydbcTools=None,namespace:str=None, table:str=None, id_col=None):
+def Mapper(datasource:str|PydbcTools=None,namespace:str=None, table:str=None, id_col=None, validate:bool=True, executor:ExecutorType=None):
     datasource = _get_datasource(datasource)
-    decorator = _Mapper(datasource, namespace=namespace, table=table, id_col=id_col)
+    decorator = _Mapper(datasource, namespace=namespace, table=table, id_col=id_col, validate=validate, executor=executor)
     def mapper_decorator(cls):
         wrap = decorator(cls)
         service = wrap()
@@ -33,17 +37,27 @@ def Mapper(datasource:str|PydbcTools=None,namespace:str=None, table:str=None, id
         return wrap
     return mapper_decorator
 
-def Selete(datasource:str|PydbcTools, sql:str=None, *, resultType:type|str=dict):
+def Selete(datasource:str|PydbcTools, sql:str=None, *, resultType:type|str=dict, cache:bool|int=None, shardKey:str=None, timeout:float=None, validate:bool=True,
+           associations:list[Association]=None, fetchSize:int=None):
     datasource = _get_datasource(datasource)        
-    return _SELECT(datasource, sql=sql, resultType=resultType)
+    return _SELECT(datasource, sql=sql, resultType=resultType, cache=cache, shardKey=shardKey, timeout=timeout, validate=validate,
+                   associations=associations, fetchSize=fetchSize)
 
-def Update(datasource:str|PydbcTools, sql:str=None):
+def Update(datasource:str|PydbcTools, sql:str=None, *, shardKey:str=None, timeout:float=None, executor:ExecutorType=None):
     datasource = _get_datasource(datasource)        
-    return _UPDATE(datasource, sql=sql)
+    return _UPDATE(datasource, sql=sql, shardKey=shardKey, timeout=timeout, executor=executor)
 
 
 prefix = 'context.pybatisplus'
 
+_n_plus_one_threshold = 0
+
+
+def _get_redis():
+    """<cache redis="true">的namespace缓存通过context.redis的RedisTools同步清空，第一次使用时获取"""
+    from dataflow.utils.dbtools.redis import RedisTools
+    return Context.getContext().getBean(get_fullname(RedisTools))
+
 
 @Context.Configurationable(prefix=prefix)
 def _init_datasource_context(config:dict):
@@ -51,4 +65,37 @@ def _init_datasource_context(config:dict):
     config.setdefault('pattern','/**/*Mapper.xml')    
     root:str = config['root']
     pattern:str = config['pattern']    
-    XMLConfig.scan_mapping_xml(root=root, pattern=pattern)
\ No newline at end of file
+    set_cache_redis(_get_redis)
+    XMLConfig.scan_mapping_xml(root=root, pattern=pattern, cache=config.get('cache'))
+    global _n_plus_one_threshold
+    _n_plus_one_threshold = int(config.get('detect_n_plus_one') or 0)
+
+
+class _NPlusOneMiddleware:
+    """调试用：每个请求内同一个pybatis语句执行达到threshold次时输出N+1查询警告"""
+    def __init__(self, app, threshold:int):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        with detect_n_plus_one(f'请求{scope["method"]} {scope["path"]}', self.threshold):
+            await self.app(scope, receive, send)
+
+
+@WebContext.Event.on_loaded
+def _register_router_for_pybatis(app):
+    if _n_plus_one_threshold > 0:
+        app.add_middleware(_NPlusOneMiddleware, threshold=_n_plus_one_threshold)
+        _logger.INFO(f'添加过滤器NPlusOneMiddleware，同一请求中语句执行{_n_plus_one_threshold}次以上时输出警告')
+
+    @app.get('/actuator/pybatis/render')
+    def actuator_pybatis_render(namespace:str=None):
+        """每个语句(namespace.id或者函数全名)的SQL渲染缓存命中率"""
+        return {k: v for k, v in render_stats().items() if namespace is None or k.startswith(namespace)}
+
+    @app.get('/actuator/pybatis/cache')
+    def actuator_pybatis_cache(namespace:str=None):
+        """每个namespace缓存(<cache>)的大小、清空次数和每个语句的命中率"""
+        return {k: v for k, v in cache_stats().items() if namespace is None or k == namespace}
@@ -0,0 +1,200 @@
+from dataflow.utils.log import Logger
+from dataflow.utils.reflect import is_not_primitive
+from dataflow.utils.dbtools.rowmapper import row_mapper, dict_mapper
+from dataflow.utils.dbtools.sqlstats import statement as _sql_statement
+from typing import Callable
+import collections
+import contextlib
+import contextvars
+import functools
+import re
+import threading
+
+_logger = Logger('dataflow.utils.dbtools.association')
+
+# 子查询中父结果键列表的参数，in :keys 或者 in (:keys)
+_KEYS = re.compile(r'\(\s*:keys\s*\)|(?<![:\w]):keys\b')
+
+
+class Association:
+    """一对一关联：父结果按column列的值收集键，子查询用 in :keys 一次取回(每chunk个键一条语句)，
+    按子结果的foreignColumn列拼接到父结果的property属性，没有对应子行时为None
+    子查询为sql，或者select引用的Mapper语句id(同一namespace的id或者namespace.id)，执行时同时可以使用父查询的参数"""
+    many = False
+
+    def __init__(self, property:str, sql:str=None, *, select:str=None, column:str='id', foreignColumn:str=None,
+                 resultType:type|str=None, chunk:int=500):
+        if not sql and not select:
+            raise ValueError(f'关联{property}缺少sql或者select')
+        self.property = property
+        self.sql = sql
+        self.select = select
+        self.column = column
+        self.foreignColumn = foreignColumn or column
+        self.resultType = resultType
+        self.chunk = max(int(chunk), 1)
+
+    def to_dict(self)->dict:
+        return {'many': self.many, 'property': self.property, 'sql': self.sql, 'select': self.select, 'column': self.column,
+                'foreignColumn': self.foreignColumn, 'resultType': self.resultType, 'chunk': self.chunk}
+
+    @staticmethod
+    def of(data:dict)->'Association':
+        """Mapper XML解析结果(和解析缓存)中的dict"""
+        data = dict(data)
+        cls = Collection if data.pop('many', False) else Association
+        return cls(**data)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.property} {self.column}->{self.select or self.sql}.{self.foreignColumn})'
+
+
+class Collection(Association):
+    """一对多关联，property为子结果列表，没有子行时为[]"""
+    many = True
+
+
+@functools.lru_cache(maxsize=256)
+def _in_sql(sql:str, size:int)->str:
+    if _KEYS.search(sql) is None:
+        raise ValueError(f'关联子查询缺少:keys参数\n[SQL]:{sql}')
+    return _KEYS.sub('(' + ', '.join(f':__keys_{i}' for i in range(size)) + ')', sql)
+
+
+def _chunks(sql:str, keys:list, chunk:int):
+    """按chunk拆分键列表，每段补齐到2的幂(重复最后一个键)，同一子查询最多生成log2(chunk)+1种SQL，语句缓存和数据库执行计划可以复用"""
+    for start in range(0, len(keys), chunk):
+        part = keys[start:start + chunk]
+        size = 1
+        while size < len(part):
+            size <<= 1
+        size = min(size, chunk)
+        part = part + [part[-1]] * (size - len(part))
+        yield _in_sql(sql, size), {f'__keys_{i}': key for i, key in enumerate(part)}
+
+
+class BatchLoader:
+    """一个<association>/<collection>的批量加载，resolve在第一次加载时返回(语句名, render, resultType, 子关联的BatchLoader列表)"""
+    def __init__(self, association:Association, ds, resolve:Callable[[], tuple], validate:bool=True):
+        self.association = association
+        self.ds = ds
+        self.validate = validate
+        self._resolve = resolve
+        self._plan = None
+
+    def _get_plan(self)->tuple:
+        if self._plan is None:
+            self._plan = self._resolve()
+            _logger.DEBUG(f'关联{self.association}使用语句{self._plan[0]} resultType={self._plan[2]}')
+        return self._plan
+
+    def _keys(self, rows:list[dict])->list:
+        column = self.association.column
+        return list(dict.fromkeys(value for value in (row.get(column) for row in rows) if value is not None))
+
+    def _fetch(self, sql:str, params:dict)->tuple[tuple, list]:
+        if hasattr(self.ds, 'queryRows'):
+            return self.ds.queryRows(sql, params)
+        rows = self.ds.queryMany(sql, params)   # 分片数据源
+        return (tuple(rows[0]) if rows else ()), [tuple(one.values()) for one in rows]
+
+    def _convert(self, columns:tuple, data:list, resultType:type, nested:bool)->list:
+        if not data:
+            return []
+        if nested or resultType is dict:
+            return [dict(zip(columns, one)) for one in data]
+        if not is_not_primitive(resultType):
+            return [one[0] for one in data]
+        return [row_mapper(resultType, tuple(columns), self.validate)(one) for one in data]
+
+    def _index(self, columns:tuple)->int:
+        try:
+            index = list(columns).index(self.association.foreignColumn)
+        except ValueError:
+            raise ValueError(f'关联{self.association}的子查询结果中没有列{self.association.foreignColumn}') from None
+        return index
+
+    def _attach(self, rows:list[dict], keys_of_children:list, children:list, resultType:type, nested:bool):
+        if nested and resultType is not dict and is_not_primitive(resultType):
+            mapper = dict_mapper(resultType, self.validate)
+            children = [mapper(one) for one in children]
+        groups = collections.defaultdict(list)
+        for key, child in zip(keys_of_children, children):
+            groups[key].append(child)
+        column, prop = self.association.column, self.association.property
+        for row in rows:
+            found = groups.get(row.get(column))
+            if self.association.many:
+                row[prop] = list(found) if found else []
+            else:
+                row[prop] = found[0] if found else None
+
+    def load(self, rows:list[dict], arguments:dict=None):
+        """原地给rows(dict列表)加上关联属性"""
+        keys = self._keys(rows)
+        name, render, resultType, loaders = self._get_plan()
+        columns, data = (), []
+        if keys:
+            arguments = arguments or {}
+            sql = render(arguments)
+            with _sql_statement(name):
+                for one, params in _chunks(sql, keys, self.association.chunk):
+                    columns, part = self._fetch(one, {**arguments, **params})
+                    data.extend(part)
+        index = self._index(columns) if data else 0
+        children = self._convert(columns, data, resultType, bool(loaders))
+        for loader in loaders:
+            loader.load(children, arguments)
+        self._attach(rows, [one[index] for one in data], children, resultType, bool(loaders))
+
+    async def aload(self, rows:list[dict], arguments:dict=None):
+        keys = self._keys(rows)
+        name, render, resultType, loaders = self._get_plan()
+        columns, data = (), []
+        if keys:
+            arguments = arguments or {}
+            sql = render(arguments)
+            with _sql_statement(name):
+                for one, params in _chunks(sql, keys, self.association.chunk):
+                    columns, part = await self.ds.aqueryRows(one, {**arguments, **params})
+                    data.extend(part)
+        index = self._index(columns) if data else 0
+        children = self._convert(columns, data, resultType, bool(loaders))
+        for loader in loaders:
+            await loader.aload(children, arguments)
+        self._attach(rows, [one[index] for one in data], children, resultType, bool(loaders))
+
+
+class _Scope:
+    __slots__ = ('name', 'threshold', 'counts', 'lock')
+
+    def __init__(self, name:str, threshold:int):
+        self.name = name
+        self.threshold = threshold
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+
+
+_scope:contextvars.ContextVar[_Scope] = contextvars.ContextVar('pybatis_n_plus_one', default=None)
+
+@contextlib.contextmanager
+def detect_n_plus_one(name:str, threshold:int=10):
+    """调试用：统计范围内(一个请求)每个pybatis语句的执行次数，结束时对执行次数达到threshold的语句输出警告，
+    通常是对列表结果逐行调用另一个语句的N+1查询，返回语句执行次数的Counter"""
+    scope = _Scope(name, threshold)
+    token = _scope.set(scope)
+    try:
+        yield scope.counts
+    finally:
+        _scope.reset(token)
+        for stmt, count in scope.counts.most_common():
+            if count < threshold:
+                break
+            _logger.WARN(f'{name}中语句{stmt}执行了{count}次，可能是N+1查询，可以改为<collection>/<association>批量加载')
+
+def count_statement(name:str):
+    """pybatis语句执行时调用，没有启用检测时只读取一次contextvar"""
+    scope = _scope.get()
+    if scope is not None:
+        with scope.lock:
+            scope.counts[name] += 1
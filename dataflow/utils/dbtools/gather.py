@@ -0,0 +1,106 @@
+from dataflow.utils.log import Logger
+from dataflow.utils.dbtools.pydbc import statement_timeout, use_async_engine
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Iterable
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+
+_logger = Logger('dataflow.utils.dbtools.gather')
+
+_executor:ThreadPoolExecutor = None
+_executor_lock = threading.Lock()
+
+def get_executor(max_workers:int=None)->ThreadPoolExecutor:
+    """同步驱动的查询(gather、没有异步驱动时的pybatis协程方法)使用的共享线程池，第一次使用时创建"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers or 16, thread_name_prefix='gather')
+        return _executor
+
+
+@dataclass
+class GatherResult:
+    """gather中一个查询的结果"""
+    datasource: Any
+    sql: str
+    result: Any = None
+    error: BaseException = None
+    elapsed: float = 0.0    # 秒，包括等待并发许可的时间
+
+    @property
+    def ok(self)->bool:
+        return self.error is None
+
+    def get(self):
+        """返回结果，查询失败或者超时时抛出对应的异常"""
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _is_async(ds, method:str)->bool:
+    """数据源启用了异步引擎(和pybatis协程存根同样的判断)，并且有对应的异步方法"""
+    return hasattr(ds, 'a' + method) and use_async_engine(ds)
+
+def _remaining(deadline:float)->float:
+    return None if deadline is None else max(deadline - time.monotonic(), 0.001)
+
+async def gather(queries:Iterable[tuple], timeout:float=None, limit:int=None, return_exceptions:bool=True,
+                 max_workers:int=None)->list[GatherResult]:
+    """并发执行多个独立查询，queries为(datasource, sql, params[, method])列表，method默认queryMany，可以是queryOne/queryCount/queryPage等
+    配置了async_enabled并且有异步驱动的数据源使用a开头的异步方法，其他(包括分片数据源、没有安装异步驱动)在共享线程池中执行
+    limit为每个数据源同时执行的查询数，默认为数据源的pool_size，避免一个慢的数据库占满连接池或者线程池
+    timeout为全部查询的总期限，每个查询的语句超时为剩余时间，到期未完成的查询被取消(异步查询同时在数据库端取消)
+    返回结果和queries顺序相同，return_exceptions为False时第一个失败(或超时)的查询抛出异常"""
+    queries = [tuple(one) for one in queries]
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    results = [GatherResult(one[0], one[1]) for one in queries]
+    semaphores:dict[int, asyncio.Semaphore] = {}
+    for one in queries:
+        if id(one[0]) not in semaphores:
+            pool_size = one[0].getConfig().get('pool_size', 20) if hasattr(one[0], 'getConfig') else 20
+            semaphores[id(one[0])] = asyncio.Semaphore(limit or pool_size)
+    loop = asyncio.get_running_loop()
+
+    async def _one(index:int, ds, sql:str, params:dict=None, method:str='queryMany'):
+        rtn = results[index]
+        start = time.perf_counter()
+        try:
+            async with semaphores[id(ds)]:
+                if _is_async(ds, method):
+                    with statement_timeout(_remaining(deadline)):
+                        rtn.result = await getattr(ds, 'a' + method)(sql, params)
+                else:
+                    with statement_timeout(_remaining(deadline)):
+                        context = contextvars.copy_context()   # 线程中执行时数据库按剩余时间中止语句
+                    func = functools.partial(context.run, getattr(ds, method), sql, params)
+                    rtn.result = await loop.run_in_executor(get_executor(max_workers), func)
+        except asyncio.CancelledError as e:
+            rtn.error = TimeoutError(f'查询超过gather期限{timeout}秒') if deadline is not None and time.monotonic() >= deadline else e
+            raise
+        except Exception as e:
+            rtn.error = e
+            if not return_exceptions:
+                raise
+        finally:
+            rtn.elapsed = time.perf_counter() - start
+
+    tasks = [asyncio.ensure_future(_one(i, *one)) for i, one in enumerate(queries)]
+    try:
+        async with asyncio.timeout(timeout):
+            await asyncio.gather(*tasks)
+    except TimeoutError:
+        _logger.WARN(f'gather超过期限{timeout}秒，{sum(1 for one in results if isinstance(one.error, TimeoutError))}个查询未完成')
+        if not return_exceptions:
+            raise
+    finally:
+        for one in tasks:
+            if not one.done():
+                one.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
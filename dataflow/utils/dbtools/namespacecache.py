@@ -0,0 +1,159 @@
+from cachetools import LRUCache, FIFOCache, TTLCache
+from dataflow.utils.log import Logger
+import copy
+import threading
+import time
+
+_logger = Logger('dataflow.utils.dbtools.namespacecache')
+
+_MISS = object()
+
+
+class NamespaceCache:
+    """Mapper namespace的二级缓存(<cache>)，缓存namespace中select语句转换后的结果，同一namespace的insert/update/delete执行后清空
+    eviction为LRU、FIFO或者TTL(每个结果flushInterval毫秒后过期)，LRU/FIFO配置flushInterval时按间隔整体清空
+    redis为true时清空操作递增Redis中的namespace版本号，每个worker读取时比较版本号，不一致时清空本地缓存；结果只保存在进程内
+    readOnly为false(默认)时保存和返回结果的深拷贝，调用方修改结果不影响缓存"""
+    EVICTIONS = ('LRU', 'FIFO', 'TTL')
+
+    def __init__(self, namespace:str, eviction:str='LRU', size:int=1024, flushInterval:int=None, readOnly:bool=False,
+                 redis=None, prefix:str='pybatis:cache'):
+        eviction = (eviction or 'LRU').upper()
+        if eviction not in self.EVICTIONS:
+            raise ValueError(f'namespace {namespace}不支持的缓存策略{eviction}，可选{self.EVICTIONS}')
+        self.namespace = namespace
+        self.eviction = eviction
+        self.size = int(size)
+        self.interval = int(flushInterval) / 1000 if flushInterval else None
+        self.readOnly = readOnly
+        self.prefix = prefix
+        self.config:dict = None   # <cache>的属性
+        if eviction == 'TTL':
+            self._local = TTLCache(maxsize=self.size, ttl=self.interval or 60)
+        elif eviction == 'FIFO':
+            self._local = FIFOCache(maxsize=self.size)
+        else:
+            self._local = LRUCache(maxsize=self.size)
+        self._redis = redis   # RedisTools或者返回RedisTools的函数
+        self._version = None
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats:dict[str, list[int]] = {}
+        self._flushes = 0
+
+    def _get_redis(self):
+        if callable(self._redis):
+            try:
+                self._redis = self._redis()
+            except Exception as e:
+                _logger.WARN(f'namespace {self.namespace}缓存获取Redis失败，只使用进程内缓存:{e}')
+                self._redis = None
+        return self._redis
+
+    def _check(self):
+        """按flushInterval整体清空，或者其他worker已经清空(Redis版本号变化)"""
+        if self.interval is not None and self.eviction != 'TTL' and time.monotonic() - self._flushed >= self.interval:
+            with self._lock:
+                self._local.clear()
+                self._flushed = time.monotonic()
+        redis = self._get_redis()
+        if redis is None:
+            return
+        try:
+            version = redis.get(f'{self.prefix}:ver:{self.namespace}')
+        except Exception as e:
+            _logger.WARN(f'namespace {self.namespace}缓存读取Redis版本失败:{e}')
+            return
+        with self._lock:
+            if version != self._version:
+                self._local.clear()
+                self._version = version
+
+    @staticmethod
+    def key(statement:str, sql:str, params:dict)->tuple:
+        return (statement, sql, tuple(sorted((k, repr(v)) for k, v in (params or {}).items())))
+
+    def get(self, statement:str, key:tuple):
+        self._check()
+        with self._lock:
+            value = self._local.get(key, _MISS)
+            counter = self._stats.setdefault(statement, [0, 0])
+            counter[0 if value is not _MISS else 1] += 1
+        if value is _MISS or self.readOnly:
+            return value
+        return copy.deepcopy(value)
+
+    def put(self, key:tuple, value):
+        with self._lock:
+            self._local[key] = value if self.readOnly else copy.deepcopy(value)
+
+    def load(self, statement:str, sql:str, params:dict, loader):
+        key = self.key(statement, sql, params)
+        value = self.get(statement, key)
+        if value is _MISS:
+            value = loader()
+            self.put(key, value)
+        return value
+
+    async def aload(self, statement:str, sql:str, params:dict, loader):
+        key = self.key(statement, sql, params)
+        value = self.get(statement, key)
+        if value is _MISS:
+            value = await loader()
+            self.put(key, value)
+        return value
+
+    def flush(self):
+        """同一namespace的写语句执行后调用，配置Redis时同时通知其他worker"""
+        with self._lock:
+            self._local.clear()
+            self._flushed = time.monotonic()
+            self._flushes += 1
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                redis.incr(f'{self.prefix}:ver:{self.namespace}')
+            except Exception as e:
+                _logger.WARN(f'namespace {self.namespace}缓存更新Redis版本失败:{e}')
+        _logger.DEBUG(f'清空namespace {self.namespace}缓存')
+
+    def stats(self)->dict:
+        with self._lock:
+            statements = {}
+            for name, (hits, misses) in self._stats.items():
+                total = hits + misses
+                statements[name] = {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / total, 4) if total else 0.0}
+            return {'eviction': self.eviction, 'size': len(self._local), 'maxsize': self.size, 'flushInterval': self.interval,
+                    'readOnly': self.readOnly, 'redis': self._redis is not None, 'flushes': self._flushes, 'statements': statements}
+
+
+_caches:dict[str, NamespaceCache] = {}
+_caches_lock = threading.Lock()
+_redis = None
+
+def set_cache_redis(redis):
+    """<cache redis="true">使用的RedisTools或者返回RedisTools的函数(首次使用时获取)"""
+    global _redis
+    _redis = redis
+    with _caches_lock:
+        for one in _caches.values():
+            if one.config.get('redis'):
+                one._redis = redis
+
+def namespace_cache(namespace:str, config:dict)->NamespaceCache:
+    """按<cache>配置创建namespace缓存，相同namespace和配置重复加载时返回同一个缓存"""
+    with _caches_lock:
+        one = _caches.get(namespace)
+        if one is None or one.config != config:
+            options = dict(config)
+            use_redis = options.pop('redis', False)
+            one = NamespaceCache(namespace, redis=_redis if use_redis else None, **options)
+            one.config = dict(config)
+            _caches[namespace] = one
+            _logger.INFO(f'启用namespace {namespace}缓存{config}')
+        return one
+
+def cache_stats()->dict[str, dict]:
+    """每个namespace缓存的大小、清空次数和每个语句的命中率"""
+    with _caches_lock:
+        return {name: one.stats() for name, one in _caches.items()}
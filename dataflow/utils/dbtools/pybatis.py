@@ -1,20 +1,39 @@
 from dataflow.utils.antpath import find
 from dataflow.utils.reflect import getType, get_fullname, getInstance,isList,isType,is_not_primitive,is_user_defined
 # from dataflow.utils.reflect import inspect_own_method, inspect_class_method, inspect_static_method, getPydanticInstance
-from jinja2 import Template
+from jinja2 import Template, Environment, BaseLoader, FileSystemBytecodeCache
 import re
 import xml.etree.ElementTree as ET
-from typing import Self
+from typing import Self, Optional, Union, Any
 from dataflow.utils.utils import str_isEmpty,PageResult
 from datetime import datetime, date
 from pydantic import BaseModel,Field
 from enum import Enum
 from dataflow.utils.log import Logger
 from dataflow.utils.reflect import inspect_own_method, inspect_class_method, inspect_static_method,getType
-from dataflow.utils.dbtools.pydbc import PydbcTools
-from typing import get_type_hints
+from dataflow.utils.dbtools.pydbc import PydbcTools, ExecutorType, statement_timeout, use_async_engine
+from dataflow.utils.dbtools.sqlstats import statement as _sql_statement
+from dataflow.utils.dbtools.sharding import ShardingTools, with_shard_key
+from dataflow.utils.dbtools.sqlrender import SqlRenderer, renderer as _renderer
+from dataflow.utils.dbtools.rowmapper import dict_mapper, map_rows, row_mapper
+from dataflow.utils.dbtools.gather import get_executor
+from dataflow.utils.dbtools.association import Association, Collection, BatchLoader, count_statement
+from dataflow.utils.dbtools.namespacecache import NamespaceCache, namespace_cache
+from sqlalchemy import event
+from typing import get_type_hints, get_origin, get_args
+from collections import abc
+from concurrent.futures import ThreadPoolExecutor
 import inspect
 import functools
+import types
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import time
+import weakref
 
 
 _logger = Logger('dataflow.utils.dbtools.pybatis')
@@ -31,6 +50,9 @@ _logger = Logger('dataflow.utils.dbtools.pybatis')
 class PageMode(BaseModel):    
     pageno: int = Field(..., min=1)  # 必填，长度限制
     pagesize: int = 20
+    orderby: Optional[list[str]] = None  # keyset分页排序列，如['create_time desc', 'id']
+    after: Optional[str] = None  # keyset分页游标，上一页PageResult.cursor
+    count: Optional[bool|str] = None  # 总数统计方式 exact|cached|estimate|none，False同none
 
 
 _p = r'\{\$\s*.*?\s*\$\}'
@@ -71,6 +93,7 @@ class SQLItem:
         self.references = references
         self.options = options
         self.sqlTemplate:Template = None
+        self.renderer:SqlRenderer = None
     
     def __repr__(self):
         # return f'type={self.type} txt={self.txt} sql={self.sql} resultType={self.getReulstType()}[{self.resultType}] references={self.references} options={self.options}'
@@ -80,6 +103,8 @@ class SQLItem:
         return self.references
     
     def build_sql(self, data:any)->str:
+        if self.renderer is not None:
+            return self.renderer.render(data)
         return self.sqlTemplate.render(data)
     
     def getReulstType(self):
@@ -103,17 +128,126 @@ class SQLItem:
         # return getType(self.resultType)
 
 
+class _SqlLoader(BaseLoader):
+    """按名称返回SQL模板源码，配合字节码缓存使用"""
+    def __init__(self):
+        self.sources:dict[str, str] = {}
+
+    def get_source(self, environment, template):
+        source = self.sources[template]
+        return source, None, lambda: True
+
+
+class _CountingBytecodeCache(FileSystemBytecodeCache):
+    def __init__(self, directory:str):
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(directory, 'pybatis-%s.cache')
+        self.hits = 0
+        self.misses = 0
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+
+class MapperCache:
+    """Mapper XML的本地编译缓存，多个worker和重启后共用
+    解析并合并ref之后的XMLConfig按文件路径保存为JSON，文件mtime和大小不变时直接使用，变化时再比较内容sha1；
+    SQL模板通过Jinja字节码缓存加载，模板源码不变时不再编译"""
+    VERSION = 4   # 2: <association>/<collection> 3: <cache> 4: fetchSize
+
+    def __init__(self, path:str):
+        self.path = path
+        self._loader = _SqlLoader()
+        self._bytecode = _CountingBytecodeCache(os.path.join(path, 'jinja'))
+        self._environment = Environment(loader=self._loader, bytecode_cache=self._bytecode, cache_size=0,
+                                        trim_blocks=True, lstrip_blocks=True)
+        self.hits = 0
+        self.misses = 0
+
+    def template(self, name:str, sql:str)->Template:
+        self._loader.sources[name] = sql
+        try:
+            return self._environment.get_template(name)
+        finally:
+            del self._loader.sources[name]
+
+    def _file(self, xml_file:str)->str:
+        return os.path.join(self.path, f'mapper-{hashlib.sha1(os.path.abspath(xml_file).encode()).hexdigest()[:16]}.json')
+
+    def load(self, xml_file:str):
+        """返回缓存的XMLConfig，没有缓存或者文件已修改时返回None"""
+        file = self._file(xml_file)
+        try:
+            with open(file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        stat = os.stat(xml_file)
+        if data.get('version') != self.VERSION or (data.get('mtime'), data.get('size')) != (stat.st_mtime_ns, stat.st_size):
+            if data.get('version') != self.VERSION or data.get('sha1') != _file_sha1(xml_file):
+                self.misses += 1
+                return None
+        self.hits += 1
+        return XMLConfig._from_cache(data['config'])
+
+    def save(self, xml_file:str, xc):
+        file = self._file(xml_file)
+        stat = os.stat(xml_file)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp = f'{file}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'file': os.path.abspath(xml_file), 'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+                           'sha1': _file_sha1(xml_file), 'config': xc._to_cache()}, f, ensure_ascii=False)
+            os.replace(tmp, file)   # 多个worker同时写时保证文件完整
+        except OSError as e:
+            _logger.WARN(f'写入Mapper缓存文件{file}失败:{e}')
+
+    def stats(self)->dict:
+        return {'path': self.path, 'hits': self.hits, 'misses': self.misses,
+                'bytecode_hits': self._bytecode.hits, 'bytecode_misses': self._bytecode.misses}
+
+
+def _file_sha1(file:str)->str:
+    with open(file, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def _sql_template(name:str, sql:str)->Template:
+    """配置了Mapper缓存时通过字节码缓存加载模板"""
+    if XMLConfig._CACHE is not None:
+        return XMLConfig._CACHE.template(name, sql)
+    return Template(sql, trim_blocks=True, lstrip_blocks=True)
+
+
 class XMLConfig:
     _ALL_CONFIG:dict[str,str] = {}
+    _CACHE:MapperCache = None
     @staticmethod
-    def scan_mapping_xml(root:str='conf', pattern:str='/**/*Mapper.xml'):
+    def scan_mapping_xml(root:str='conf', pattern:str='/**/*Mapper.xml', cache:str=None):
+        """cache为本地缓存目录，未修改的Mapper文件不再解析，SQL模板使用字节码缓存"""
+        if cache:
+            XMLConfig._CACHE = MapperCache(cache)
+        start = time.perf_counter()
         xml_files = find(root, pattern)
         for p, xml_file in xml_files:
             xc:XMLConfig = XMLConfig.parseXML(xml_file)
             XMLConfig.putOne(xc)
-    def __init__(self, namespace:str, sqls:dict[str,SQLItem]={}):
+        cost = (time.perf_counter() - start) * 1000
+        if XMLConfig._CACHE is not None:
+            stats = XMLConfig._CACHE.stats()
+            _logger.INFO(f'加载Mapper文件{len(xml_files)}个，耗时{cost:.1f}ms，解析缓存命中{stats["hits"]}个，'
+                         f'SQL模板字节码缓存命中{stats["bytecode_hits"]}/{stats["bytecode_hits"] + stats["bytecode_misses"]}')
+        else:
+            _logger.INFO(f'加载Mapper文件{len(xml_files)}个，耗时{cost:.1f}ms')
+    def __init__(self, namespace:str, sqls:dict[str,SQLItem]={}, cache:dict=None):
         self.namespace = namespace
         self.sqls = sqls
+        self.cache = cache   # <cache>的属性
         self.references = {}        
         if sqls:
             # self.sqls.setdefault('id')
@@ -136,6 +270,12 @@ class XMLConfig:
     def buildSql(self, id:str,data:any)->str:
         sql:SQLItem = self.getSql(id)
         return sql.build_sql(data)
+
+    def getCache(self)->NamespaceCache:
+        """<cache>配置的namespace二级缓存，没有配置时返回None"""
+        if self.cache is None:
+            return None
+        return namespace_cache(self.namespace, self.cache)
     
     @staticmethod
     def sqlItem(namespace:str, id:str)->SQLItem:
@@ -211,9 +351,28 @@ class XMLConfig:
                     v.sql = _sql
                 else:
                     v.sql = v.txt
-                
-                v.sqlTemplate = Template(v.sql, trim_blocks=True, lstrip_blocks=True)
+        self.compile_templates()
+
+    def compile_templates(self):
+        for k, v in self.sqls.items():
+            if not v.type == SQLItem.SQLType.REF:
+                v.sqlTemplate = _sql_template(f'{self.namespace}.{k}', v.sql)
+                v.renderer = _renderer(f'{self.namespace}.{k}', v.sqlTemplate, v.sql)
         self.ready = True
+
+    def _to_cache(self)->dict:
+        return {'namespace': self.namespace, 'cache': self.cache, 'sqls': [{
+            'id': v.id, 'txt': v.txt, 'type': v.type.value, 'sql': v.sql, 'resultType': v.resultType,
+            'references': v.references, 'options': v.options,
+        } for v in self.sqls.values()]}
+
+    @staticmethod
+    def _from_cache(data:dict)->Self:
+        sqls = {}
+        for one in data['sqls']:
+            sqls[one['id']] = SQLItem(one['id'], one['txt'], SQLItem.SQLType(one['type']), one['sql'], one['resultType'],
+                                      [tuple(ref) for ref in one['references'] or []], one['options'])
+        return XMLConfig(data['namespace'], sqls, data.get('cache'))
             
     @staticmethod
     def putOne(xc:Self):
@@ -221,9 +380,17 @@ class XMLConfig:
         XMLConfig._ALL_CONFIG[xc.namespace] = xc        
     @staticmethod
     def parseXML(xmlFile:str):
-        xc:XMLConfig = _parse_xml(xmlFile)
+        cache = XMLConfig._CACHE
+        xc:XMLConfig = cache.load(xmlFile) if cache is not None else None
+        if xc is not None:
+            XMLConfig.putOne(xc)
+            xc.compile_templates()
+            return xc
+        xc = _parse_xml(xmlFile)
         XMLConfig.putOne(xc)
         xc.binding_references()
+        if cache is not None:
+            cache.save(xmlFile, xc)
         return xc
     @classmethod
     def is_test(cls):
@@ -241,8 +408,13 @@ def _parse_xml(file:str)->XMLConfig:
     
     # sqlnodes = root.iter('sql')
     sqls = {}
+    namespaceCache = None
     for sqlnode in root:
-        txt = sqlnode.text.strip()
+        if sqlnode.tag == 'cache':
+            namespaceCache = _parse_cache(sqlnode)
+            continue
+        # <association>/<collection>子元素之后的文本在子元素的tail中
+        txt = ((sqlnode.text or '') + ''.join(child.tail or '' for child in sqlnode)).strip()
         id = sqlnode.attrib['id']        
         _list = get_ref_name(txt)
         references = []
@@ -272,211 +444,638 @@ def _parse_xml(file:str)->XMLConfig:
             nodeType = SQLItem.SQLType.SELECT
             sqlnode.attrib.setdefault('resultType')
             resultType = sqlnode.attrib['resultType']
+            cache = sqlnode.attrib.get('cache')   # cache="true"或者缓存秒数
+            if not str_isEmpty(cache) and cache.strip().lower() not in ('false', '0'):
+                opt['cache'] = True if cache.strip().lower() == 'true' else int(cache)
+            validate = sqlnode.attrib.get('validate')   # validate="false"时pydantic结果使用model_construct不校验
+            if not str_isEmpty(validate) and validate.strip().lower() == 'false':
+                opt['validate'] = False
+            fetchSize = sqlnode.attrib.get('fetchSize')   # 返回Iterator/AsyncIterator时每批获取的行数
+            if not str_isEmpty(fetchSize):
+                opt['fetchSize'] = int(fetchSize)
+            useCache = sqlnode.attrib.get('useCache')   # useCache="false"时不使用namespace缓存
+            if not str_isEmpty(useCache) and useCache.strip().lower() == 'false':
+                opt['useCache'] = False
+            associations = [_parse_association(child, file, id) for child in sqlnode if child.tag in ('association', 'collection')]
+            if associations:
+                opt['associations'] = associations
         else:
             raise ValueError(f'不支持标签{tag}, 本版本目前可以支持select, update, delete, insert, ref')
+        shardKey = sqlnode.attrib.get('shardKey')   # 分片数据源按该参数的值路由
+        if not str_isEmpty(shardKey):
+            opt['shardKey'] = shardKey.strip()
+        timeout = sqlnode.attrib.get('timeout')     # 语句超时秒数
+        if not str_isEmpty(timeout):
+            opt['timeout'] = float(timeout)
             
         sqlItem = SQLItem(id, txt, nodeType, None, resultType, references, opt)
         sqls[sqlItem.id] = sqlItem
          
-    xmlConfig = XMLConfig(ns, sqls)
+    xmlConfig = XMLConfig(ns, sqls, namespaceCache)
     
     _logger.DEBUG(f'Mapper文件{file}解析到{len(sqls)}个SQL模板')
     # xmlConfig.sqls = sqls        
     return xmlConfig
     
-def _binding_sql_with_func(func:callable, sql:str, sqlType:str, resultType:type, ds:PydbcTools, options:dict={}):    
-    sig = inspect.signature(func)        
-    # params = sig.parameters               # 2. 有序参数字典
-    # return_ann = sig.return_annotation  
+def _parse_cache(node:ET.Element)->dict:
+    """<cache eviction="LRU" size="1024" flushInterval="60000" readOnly="false" redis="false"/>，flushInterval为毫秒"""
+    attrib = node.attrib
+    cache = {'eviction': (attrib.get('eviction') or 'LRU').strip().upper(), 'size': int(attrib.get('size') or 1024),
+             'readOnly': (attrib.get('readOnly') or '').strip().lower() == 'true',
+             'redis': (attrib.get('redis') or '').strip().lower() == 'true'}
+    if not str_isEmpty(attrib.get('flushInterval')):
+        cache['flushInterval'] = int(attrib['flushInterval'])
+    return cache
+
+def _parse_association(node:ET.Element, file:str, id:str)->dict:
+    """<collection property="search" select="getsearchsByConfig" column="id" foreignColumn="config_id"/>，
+    子查询也可以直接写在元素内容中，使用in :keys按父结果的键批量查询"""
+    attrib = node.attrib
+    sql = (node.text or '').strip() or None
+    if str_isEmpty(attrib.get('property')) or (str_isEmpty(attrib.get('select')) and sql is None):
+        raise ValueError(f'{file}中{id}的<{node.tag}>缺少property或者select')
+    cls = Collection if node.tag == 'collection' else Association
+    one = cls(attrib['property'].strip(), sql, select=attrib.get('select'), column=attrib.get('column') or 'id',
+              foreignColumn=attrib.get('foreignColumn'), resultType=attrib.get('resultType'), chunk=attrib.get('chunk') or 500)
+    return one.to_dict()
+
+def _arguments_binder(sig:inspect.Signature, skip_self:bool=False)->callable:
+    """按签名生成参数绑定函数，结果等同于bind_partial+apply_defaults的arguments，skip_self时不包含第一个参数(self)
+    只有普通参数时直接按位置和默认值组装dict，有*args/**kwargs/仅位置参数或者参数不匹配时使用Signature.bind_partial"""
+    params = list(sig.parameters.values())
+    if skip_self:
+        params = params[1:]
+    signature = sig.replace(parameters=params)
+
+    def _bind_slow(args:tuple, kwargs:dict)->dict:
+        bound = signature.bind_partial(*args, **kwargs)
+        bound.apply_defaults()
+        return dict(bound.arguments)
+
+    if any(p.kind not in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY) for p in params):
+        return _bind_slow
+
+    positional = tuple(p.name for p in params if p.kind == p.POSITIONAL_OR_KEYWORD)
+    names = frozenset(p.name for p in params)
+    defaults = tuple((p.name, p.default) for p in params if p.default is not p.empty)
+
+    def _bind(args:tuple, kwargs:dict)->dict:
+        if len(args) > len(positional):
+            return _bind_slow(args, kwargs)
+        arguments = dict(zip(positional, args))
+        if kwargs:
+            if not names.issuperset(kwargs) or not arguments.keys().isdisjoint(kwargs):
+                return _bind_slow(args, kwargs)   # 由bind_partial抛出参数错误
+            arguments.update(kwargs)
+        for name, value in defaults:
+            if name not in arguments:
+                arguments[name] = value
+        return arguments
+    return _bind
+
+
+def _origin_type(typ)->type:
+    """list[dict]、dict[str, Any]等泛型取原始类型，不是类的注解(Optional、Union等)返回None"""
+    origin = get_origin(typ) or typ
+    return origin if isinstance(origin, type) else None
+
+def _may_hold(hint, cls:type)->bool:
+    """声明为hint的参数值可能是cls的实例：cls本身、父类或者子类，Any等不是类的注解，以及包含这样类型的Optional/Union"""
+    if get_origin(hint) in (Union, types.UnionType):
+        return any(_may_hold(one, cls) for one in get_args(hint))
+    if hint is Any:   # 3.11起Any是类
+        return True
+    origin = _origin_type(hint)
+    return origin is None or issubclass(cls, origin) or issubclass(origin, cls)
+
+def _first_value(row:dict):
+    return next(iter(row.values()))
+
+def _model_type(typ:type)->type:
+    """用户定义的类(包括pydantic模型和dataclass)，其他返回None"""
+    typ = _origin_type(typ)
+    if typ is None or not is_not_primitive(typ) or issubclass(typ, (dict, list)) or not is_user_defined(typ):
+        return None
+    return typ
+
+def _row_mapper(resultType:type, validate:bool)->callable:
+    """列表和分页结果每行的转换，None表示直接返回dict"""
+    typ = _origin_type(resultType)
+    if typ is None:
+        return None
+    if not is_not_primitive(typ):
+        return _first_value
+    if _model_type(typ) is not None:
+        return dict_mapper(typ, validate)
+    return None
+
+def _one_mapper(return_type:type, validate:bool)->callable:
+    """单行结果的转换，None表示直接返回dict"""
+    typ = _origin_type(return_type)
+    if typ is None:
+        return None
+    if not is_not_primitive(typ):
+        return _first_value
+    if issubclass(typ, dict):
+        return None
+    return dict_mapper(typ, validate)
+
+def _resolve_association(one:Association, ds:PydbcTools, namespace:str, statement:str, validate:bool)->tuple:
+    resultType = _get_result_type(one.resultType) if one.resultType is None or isinstance(one.resultType, str) else one.resultType
+    if one.sql:
+        name = f'{statement}.{one.property}'
+        return name, _renderer(name, _sql_template(name, one.sql), one.sql).render, resultType, []
+    ns, _, id = one.select.strip().rpartition('.')
+    ns = ns or namespace
+    item = XMLConfig.sqlItem(ns, id)
+    if one.resultType is None:
+        resultType = item.getReulstType()
+    return f'{ns}.{id}', item.build_sql, resultType, _association_loaders(item.options.get('associations'), ds, f'{ns}.{id}', validate)
+
+def _association_loaders(associations:list, ds:PydbcTools, statement:str, validate:bool=True)->list[BatchLoader]:
+    """<association>/<collection>(或者SELECT的associations)的批量加载，select引用的语句在第一次加载时查找，可以定义在之后加载的Mapper文件中"""
+    namespace = (statement or '').rpartition('.')[0]
+    loaders = []
+    for one in associations or ():
+        one = one if isinstance(one, Association) else Association.of(one)
+        loaders.append(BatchLoader(one, ds, functools.partial(_resolve_association, one, ds, namespace, statement, validate), validate))
+    return loaders
+
+def _select_plan(sig:inspect.Signature, type_hints:dict, resultType:type, return_type:type, ds:PydbcTools, options:dict, skip_self:bool, is_async:bool=False, statement:str=None)->callable:
+    """SELECT的执行计划：PageMode参数、queryPage/queryMany/queryOne和行转换在装饰时确定，is_async时生成使用a开头方法的协程
+    有关联时先按dict行批量加载关联属性，再转换为resultType"""
+    params = list(sig.parameters.values())[1 if skip_self else 0:]
+    # 可能传入PageMode的参数(没有声明类型、PageMode、Optional[PageMode]、Any等)，调用时只检查这些参数的值是不是PageMode
+    page_names = tuple(p.name for p in params if p.name not in type_hints or _may_hold(type_hints[p.name], PageMode))
+    origin = _origin_type(return_type)
+    always_page = origin is not None and issubclass(origin, PageResult)
+    is_list = origin is not None and issubclass(origin, list)
+    validate = options.get('validate', True)
+    row = _row_mapper(resultType, validate)
+    one = _one_mapper(return_type, validate)
+    cache = options.get('cache')
+    loaders = _association_loaders(options.get('associations'), ds, statement, validate)
+    # 列表结果转换为对象时直接取Row元组按列序号构造，不经过dict；使用结果缓存时缓存的是dict
+    model = _model_type(resultType) if cache is None and not loaders and hasattr(ds, 'queryRows') else None
+    _logger.DEBUG(f'SELECT执行计划 page参数={page_names} always_page={always_page} list={is_list} row={row} one={one} async={is_async}')
+
+    def _page_mode(arguments:dict)->PageMode:
+        for name in page_names:
+            value = arguments.get(name)
+            if isinstance(value, PageMode):
+                return value
+        return None
+
+    def _map_page(rtn:PageResult)->PageResult:
+        if rtn.list and row is not None:
+            rtn.list = [row(one) for one in rtn.list]
+        return rtn
+
+    def _map_many(rtn:list)->list:
+        if rtn and row is not None:
+            return [row(one) for one in rtn]
+        return rtn
+
+    def _map_one(rtn:dict):
+        if rtn is None or one is None:
+            return rtn
+        return one(rtn)
+
+    if is_async:
+        async def _load(rows:list, arguments:dict)->list:
+            if not loaders or not rows:
+                return rows
+            rows = [dict(one) for one in rows]   # 结果缓存中的行不修改
+            for loader in loaders:
+                await loader.aload(rows, arguments)
+            return rows
+
+        async def _query_page(sql:str, arguments:dict, page:PageMode)->PageResult:
+            page = page or PageMode(pageno=1)
+            rtn = await ds.aqueryPage(sql, arguments, page.pageno, page.pagesize, page.orderby, page.after, page.count, cache=cache)
+            rtn.list = await _load(rtn.list, arguments)
+            return _map_page(rtn)
+
+        async def _query_many(sql:str, arguments:dict)->list:
+            if model is not None:
+                columns, rows = await ds.aqueryRows(sql, arguments)
+                return map_rows(model, columns, rows, validate)
+            return _map_many(await _load(await ds.aqueryMany(sql, arguments, cache), arguments))
+
+        async def _query_one(sql:str, arguments:dict):
+            rtn = await ds.aqueryOne(sql, arguments, cache)
+            if loaders and rtn is not None:
+                rtn = (await _load([rtn], arguments))[0]
+            return _map_one(rtn)
+
+        async def _query_paged(sql:str, arguments:dict):
+            page = _page_mode(arguments)
+            if page is not None or always_page:
+                return await _query_page(sql, arguments, page)
+            return await query(sql, arguments)
+    else:
+        def _load(rows:list, arguments:dict)->list:
+            if not loaders or not rows:
+                return rows
+            rows = [dict(one) for one in rows]   # 结果缓存中的行不修改
+            for loader in loaders:
+                loader.load(rows, arguments)
+            return rows
+
+        def _query_page(sql:str, arguments:dict, page:PageMode)->PageResult:
+            page = page or PageMode(pageno=1)
+            rtn = ds.queryPage(sql, arguments, page.pageno, page.pagesize, page.orderby, page.after, page.count, cache=cache)
+            rtn.list = _load(rtn.list, arguments)
+            return _map_page(rtn)
+
+        def _query_many(sql:str, arguments:dict)->list:
+            if model is not None:
+                columns, rows = ds.queryRows(sql, arguments)
+                return map_rows(model, columns, rows, validate)
+            return _map_many(_load(ds.queryMany(sql, arguments, cache), arguments))
+
+        def _query_one(sql:str, arguments:dict):
+            rtn = ds.queryOne(sql, arguments, cache)
+            if loaders and rtn is not None:
+                rtn = _load([rtn], arguments)[0]
+            return _map_one(rtn)
+
+        def _query_paged(sql:str, arguments:dict):
+            page = _page_mode(arguments)
+            if page is not None or always_page:
+                return _query_page(sql, arguments, page)
+            return query(sql, arguments)
+
+    query = _query_many if is_list else _query_one
+    if not page_names and not always_page:
+        return query
+    return _query_paged
+
+def _async_fallback(execute:callable, sync_execute:callable, ds)->callable:
+    """协程存根的执行函数：数据源启用异步引擎时使用异步方法，否则(没有配置async_enabled、分片数据源)在共享线程池中执行同步方法，不阻塞事件循环"""
+    async def _execute(sql:str, arguments:dict):
+        if use_async_engine(ds):
+            return await execute(sql, arguments)
+        func = functools.partial(contextvars.copy_context().run, sync_execute, sql, arguments)
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), func)
+    return _execute
+
+_STREAMS = (abc.Iterator, abc.Iterable, abc.Generator)
+_ASYNC_STREAMS = (abc.AsyncIterator, abc.AsyncIterable, abc.AsyncGenerator)
+
+def _stream_kind(return_type)->str:
+    """返回类型为Iterator/Iterable/Generator时为'sync'，AsyncIterator/AsyncIterable/AsyncGenerator时为'async'，其他为None"""
+    origin = get_origin(return_type) or return_type
+    if origin in _STREAMS:
+        return 'sync'
+    if origin in _ASYNC_STREAMS:
+        return 'async'
+    return None
+
+def _is_stream(func:callable)->bool:
+    return _stream_kind(get_type_hints(func).get('return')) is not None
+
+def _iterate_in_context(context:contextvars.Context, chunks):
+    """在调用时的contextvars中逐批获取(分片路由、语句超时、SQL统计的语句名)，迭代结束、提前break(close)或者回收时关闭游标"""
+    try:
+        while True:
+            chunk = context.run(next, chunks, None)
+            if chunk is None:
+                return
+            yield from chunk
+    finally:
+        context.run(chunks.close)
+
+async def _aiterate_in_context(context:contextvars.Context, chunks):
+    """_iterate_in_context的异步版本，每批在使用调用时contextvars的Task中获取，取消时游标随Task一起关闭"""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            chunk = await loop.create_task(anext(chunks, None), context=context)
+            if chunk is None:
+                return
+            for one in chunk:
+                yield one
+    finally:
+        await loop.create_task(chunks.aclose(), context=context)
+
+# 没有异步驱动时同时执行的流式查询数，超过时等待
+_STREAM_WORKERS = 16
+
+class _StreamLanes:
+    """流式查询使用的单线程executor，每个流占用一个直到结束(游标始终在同一个线程中使用)，最多_STREAM_WORKERS个流同时执行"""
+    def __init__(self, max_workers:int):
+        self._free = [ThreadPoolExecutor(max_workers=1, thread_name_prefix='pybatis-stream') for i in range(max_workers)]
+        self._semaphore = asyncio.Semaphore(max_workers)
+
+    @contextlib.asynccontextmanager
+    async def lane(self):
+        async with self._semaphore:
+            executor = self._free.pop()
+            try:
+                yield executor
+            finally:
+                self._free.append(executor)
+
+_stream_lanes:weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()   # 事件循环 -> _StreamLanes
+
+def _get_stream_lanes()->_StreamLanes:
+    loop = asyncio.get_running_loop()
+    lanes = _stream_lanes.get(loop)
+    if lanes is None:
+        lanes = _stream_lanes[loop] = _StreamLanes(_STREAM_WORKERS)
+    return lanes
+
+async def _aiterate_in_thread(context:contextvars.Context, chunks):
+    """没有异步驱动时在流式查询线程中逐批获取，同一个游标始终在同一个线程中使用"""
+    loop = asyncio.get_running_loop()
+    async with _get_stream_lanes().lane() as executor:
+        try:
+            while True:
+                chunk = await loop.run_in_executor(executor, context.run, next, chunks, None)
+                if chunk is None:
+                    return
+                for one in chunk:
+                    yield one
+        finally:
+            await loop.run_in_executor(executor, context.run, chunks.close)
+
+def _stream_plan(resultType:type, return_type:type, ds:PydbcTools, options:dict, statement:str, kind:str)->callable:
+    """返回Iterator/AsyncIterator的SELECT：服务端游标按fetchSize逐批获取，逐行转换为resultType(为dict时使用Iterator[T]的T)，
+    有关联时每批按键批量加载；分片数据源没有流式查询，结果一次取回后再逐行返回"""
+    args = get_args(return_type)
+    if (resultType is None or resultType is dict) and args and _model_type(args[0]) is not None:
+        resultType = args[0]
+    typ = _origin_type(resultType) or dict
+    validate = options.get('validate', True)
+    fetch_size = options.get('fetchSize') or 1000
+    loaders = _association_loaders(options.get('associations'), ds, statement, validate)
+    model = _model_type(typ)
+    scalar = not is_not_primitive(typ)
+    mapper = dict_mapper(model, validate) if model is not None else None
+    _logger.DEBUG(f'流式SELECT执行计划 resultType={typ} fetchSize={fetch_size} {kind}')
+
+    def _convert(columns:tuple, rows:list):
+        # 不需要加载关联时逐行惰性转换
+        if scalar:
+            return (one[0] for one in rows)
+        if model is not None:
+            return map(row_mapper(model, columns, validate), rows)
+        return (dict(zip(columns, one)) for one in rows)
+
+    def _loaded(rows:list[dict])->list:
+        return [mapper(one) for one in rows] if mapper is not None else rows
+
+    def _parts(sql:str, arguments:dict):
+        if hasattr(ds, 'queryRowsStream'):
+            yield from ds.queryRowsStream(sql, arguments, fetch_size)
+            return
+        rows = ds.queryMany(sql, arguments)
+        yield (tuple(rows[0]) if rows else ()), [tuple(one.values()) for one in rows]
+
+    def _chunks(sql:str, arguments:dict):
+        parts = _parts(sql, arguments)
+        try:
+            for columns, rows in parts:
+                if not loaders:
+                    yield _convert(columns, rows)
+                    continue
+                rows = [dict(zip(columns, one)) for one in rows]
+                for loader in loaders:
+                    loader.load(rows, arguments)
+                yield _loaded(rows)
+        finally:
+            parts.close()
+
+    async def _achunks(sql:str, arguments:dict):
+        parts = ds.aqueryRowsStream(sql, arguments, fetch_size)
+        try:
+            async for columns, rows in parts:
+                if not loaders:
+                    yield _convert(columns, rows)
+                    continue
+                rows = [dict(zip(columns, one)) for one in rows]
+                for loader in loaders:
+                    await loader.aload(rows, arguments)
+                yield _loaded(rows)
+        finally:
+            await parts.aclose()
+
+    if kind == 'sync':
+        def _execute(sql:str, arguments:dict):
+            return _iterate_in_context(contextvars.copy_context(), _chunks(sql, arguments))
+        return _execute
+
+    def _aexecute(sql:str, arguments:dict):
+        context = contextvars.copy_context()
+        if use_async_engine(ds) and hasattr(ds, 'aqueryRowsStream'):
+            return _aiterate_in_context(context, _achunks(sql, arguments))
+        return _aiterate_in_thread(context, _chunks(sql, arguments))
+    return _aexecute
+
+def _tx_session(ds, use_async:bool):
+    getter = getattr(ds, 'getTxSession', None)
+    return getter(use_async) if getter is not None else None
+
+def _flush_after_commit(session, cache:NamespaceCache):
+    """事务提交后清空一次namespace缓存：每个Session只注册一次提交/回滚监听，同一个缓存在一个事务中的多次写只清空一次"""
+    pending:set = session.info.get('pybatis_cache_flush')
+    if pending is None:
+        pending = session.info['pybatis_cache_flush'] = set()
+
+        def _after_commit(session):
+            caches = list(pending)
+            pending.clear()
+            for one in caches:
+                one.flush()
+
+        event.listen(session, 'after_commit', _after_commit)
+        event.listen(session, 'after_rollback', lambda session: pending.clear())
+    pending.add(cache)
+
+def _with_namespace_cache(execute:callable, cache:NamespaceCache, sqlItem:SQLItem, ds:PydbcTools, statement:str, is_async:bool)->callable:
+    """namespace配置<cache>时：select(useCache不为false)的结果按(语句, SQL, 参数)缓存，事务中不使用缓存；
+    insert/update/delete执行后清空缓存，事务中的写在提交后再清空一次，避免提交前其他请求读到旧值再放入缓存"""
+    if sqlItem.type == SQLItem.SQLType.SELECT:
+        if sqlItem.options.get('useCache') is False:
+            return execute
+        if is_async:
+            async def _async_cached(sql:str, arguments:dict):
+                if _tx_session(ds, True) is not None:
+                    return await execute(sql, arguments)
+                return await cache.aload(statement, sql, arguments, lambda: execute(sql, arguments))
+            return _async_cached
+
+        def _cached(sql:str, arguments:dict):
+            if _tx_session(ds, False) is not None:
+                return execute(sql, arguments)
+            return cache.load(statement, sql, arguments, lambda: execute(sql, arguments))
+        return _cached
+    if sqlItem.type not in (SQLItem.SQLType.INSERT, SQLItem.SQLType.UPDATE, SQLItem.SQLType.DELETE):
+        return execute
+
+    def _flush(use_async:bool):
+        cache.flush()
+        session = _tx_session(ds, use_async)
+        if session is not None:
+            _flush_after_commit(getattr(session, 'sync_session', session), cache)
+
+    if is_async:
+        async def _async_flushing(sql:str, arguments:dict):
+            try:
+                return await execute(sql, arguments)
+            finally:
+                _flush(True)
+        return _async_flushing
+
+    def _flushing(sql:str, arguments:dict):
+        try:
+            return execute(sql, arguments)
+        finally:
+            _flush(False)
+    return _flushing
+
+def _call_plan(func:callable, sqlType:str, resultType:type, ds:PydbcTools, options:dict, skip_self:bool=False, is_async:bool=False, statement:str=None)->callable:
+    """装饰时生成(sql, arguments)->结果的执行函数，is_async时返回协程函数，不支持的类型返回None"""
+    sig = inspect.signature(func)
     type_hints = get_type_hints(func)
-    
-    # sqlType:str = sqlItem.type
-    # resultType:type = sqlItem.getReulstType()
-    return_type = type_hints.get('return') or resultType or dict 
-    _sqlTemplate = Template(sql, trim_blocks=True, lstrip_blocks=True)
-    # if sqlType == 'select':        
-
-    @functools.wraps(func)        
-    def _sql_proxy(*args, **kwargs)->any:
-        bound = sig.bind_partial(*args, **kwargs)
-        bound.apply_defaults()        
-        _logger.DEBUG(f'{bound.arguments}=>{return_type}')
-        # bound.arguments.pop('self')        
-        sql = _sqlTemplate.render(bound.arguments)
-        
-        if sqlType == SQLItem.SQLType.DELETE: 
-            return ds.delete(sql, bound.arguments)
-        elif sqlType == SQLItem.SQLType.UPDATE: 
-            return ds.update(sql, bound.arguments)
-        elif sqlType == SQLItem.SQLType.INSERT: 
-            autokey = None
-            if options and 'autoKey' in options:
-                autokey = options['autoKey']
-            return ds.insert(sql, bound.arguments, autokey)
+    return_type = type_hints.get('return') or resultType or dict
+    autokey = options.get('autoKey') if options else None
+    # ExecutorType.BATCH：事务中的写语句排队，分片数据源不支持
+    batch = bool(options) and options.get('executor') == ExecutorType.BATCH and isinstance(ds, PydbcTools)
+    if sqlType == SQLItem.SQLType.SELECT and _stream_kind(return_type) is not None:
+        return _stream_plan(resultType, return_type, ds, options or {}, statement, _stream_kind(return_type))
+    if is_async:
+        if sqlType == SQLItem.SQLType.DELETE:
+            execute = (functools.partial(ds.adelete, batch=True) if batch else ds.adelete) if hasattr(ds, 'adelete') else None
+        elif sqlType == SQLItem.SQLType.UPDATE:
+            execute = (functools.partial(ds.aupdate, batch=True) if batch else ds.aupdate) if hasattr(ds, 'aupdate') else None
+        elif sqlType == SQLItem.SQLType.INSERT:
+            execute = (lambda sql, arguments: ds.ainsert(sql, arguments, autokey, batch or None)) if hasattr(ds, 'ainsert') else None
         elif sqlType == SQLItem.SQLType.SELECT:
-            pageMode = None
-            for k,v in bound.arguments.items():
-                if isinstance(v, PageMode) or isinstance(sig.parameters[k], PageMode):
-                    pageMode = v
-            _isList = False
-            _isPage = False
-            if isList(return_type):
-                _isList = True                                                                        
-            if isType(return_type, PageResult) or pageMode:
-                _isList = True
-                _isPage = True
-                
-            print(f'================ _isPage={_isPage} _isList={_isList} return_type={return_type} resultType={resultType}')                                
-            if _isPage:
-                if pageMode is None:
-                    pageMode = PageMode(pageno=1)                    
-                rtn = ds.queryPage(sql, bound.arguments, pageMode.pageno, pageMode.pagesize)
-                
-                if not rtn.list:
-                    return rtn
-                
-                if is_not_primitive(resultType):                    
-                    if is_user_defined(resultType):
-                        _l = [getInstance(resultType, one) for one in rtn]
-                        rtn.list = _l
-                        return rtn
-                    else:
-                        return rtn
-                else:
-                    _l = [next(iter(one.values())) for one in rtn.list]
-                    rtn.list = _l
-                    return rtn
-            else:
-                if _isList:
-                    rtn = ds.queryMany(sql, bound.arguments)
-                    if not rtn :
-                        return rtn
-                    
-                    if is_not_primitive(resultType):
-                        if is_user_defined(resultType):
-                            _l = [getInstance(resultType, one) for one in rtn]
-                            return _l
-                        else:
-                            return rtn                        
-                    else:
-                        _l = [next(iter(one.values())) for one in rtn]
-                        return _l
-                else:
-                    rtn = ds.queryOne(sql, bound.arguments)
-                    if rtn is None:
-                        return rtn
-                    else:
-                        if is_not_primitive(return_type):
-                            if isType(return_type, dict):
-                                return rtn
-                            else:
-                                return getInstance(return_type, rtn)
-                        else:
-                            return next(iter(rtn.values()))
-                            
-        return func(*args, **kwargs)
-        
-    return _sql_proxy
+            execute = _select_plan(sig, type_hints, resultType, return_type, ds, options or {}, skip_self, True, statement) if hasattr(ds, 'aqueryMany') else None
+        else:
+            return None
+        return _async_fallback(execute, _call_plan(func, sqlType, resultType, ds, options, skip_self, statement=statement), ds)
+    if sqlType == SQLItem.SQLType.DELETE:
+        return functools.partial(ds.delete, batch=True) if batch else ds.delete
+    if sqlType == SQLItem.SQLType.UPDATE:
+        return functools.partial(ds.update, batch=True) if batch else ds.update
+    if sqlType == SQLItem.SQLType.INSERT:
+        if batch:
+            return lambda sql, arguments: ds.insert(sql, arguments, autokey, True)
+        return lambda sql, arguments: ds.insert(sql, arguments, autokey)
+    if sqlType == SQLItem.SQLType.SELECT:
+        return _select_plan(sig, type_hints, resultType, return_type, ds, options or {}, skip_self, statement=statement)
+    return None
+
+def _binding_sql_with_func(func:callable, sql:str, sqlType:str, resultType:type, ds:PydbcTools, options:dict={}):
+    bind = _arguments_binder(inspect.signature(func))
+    is_async = inspect.iscoroutinefunction(func) and not _is_stream(func)   # 流式查询的代理直接返回迭代器
+    name = f'{func.__module__}.{func.__qualname__}'
+    execute = _call_plan(func, sqlType, resultType, ds, options, is_async=is_async, statement=name)
+    render = _renderer(name, _sql_template(name, sql), sql).render
+
+    if is_async:
+        @functools.wraps(func)
+        async def _sql_proxy(*args, **kwargs)->any:
+            if execute is None:
+                return await func(*args, **kwargs)
+            count_statement(name)
+            arguments = bind(args, kwargs)
+            return await execute(render(arguments), arguments)
+    else:
+        @functools.wraps(func)
+        def _sql_proxy(*args, **kwargs)->any:
+            if execute is None:
+                return func(*args, **kwargs)
+            count_statement(name)
+            arguments = bind(args, kwargs)
+            return execute(render(arguments), arguments)
+
+    _sql_proxy = with_shard_key(_with_timeout(_sql_proxy, options.get('timeout')), ds, inspect.signature(func), options.get('shardKey'))
+    return _with_statement(_sql_proxy, ds, name)
+
+
+def _with_timeout(proxy:callable, seconds:float)->callable:
+    """语句声明timeout时，执行期间使用该超时秒数"""
+    if not seconds:
+        return proxy
+
+    if inspect.iscoroutinefunction(proxy):
+        @functools.wraps(proxy)
+        async def _async_timeout_proxy(*args, **kwargs):
+            with statement_timeout(seconds):
+                async with asyncio.timeout(seconds):   # 到期取消协程，正在执行的语句在数据库端取消
+                    return await proxy(*args, **kwargs)
+        return _async_timeout_proxy
+
+    @functools.wraps(proxy)
+    def _timeout_proxy(*args, **kwargs):
+        with statement_timeout(seconds):
+            return proxy(*args, **kwargs)
+    return _timeout_proxy
+
+
+def _with_statement(proxy:callable, ds:PydbcTools, statement:str)->callable:
+    """数据源启用sql_stats时，执行期间记录当前语句(namespace.id)，用于SQL统计和慢SQL日志"""
+    if ds.getSqlStats() is None:
+        return proxy
+
+    if inspect.iscoroutinefunction(proxy):
+        @functools.wraps(proxy)
+        async def _async_statement_proxy(*args, **kwargs):
+            with _sql_statement(statement):
+                return await proxy(*args, **kwargs)
+        return _async_statement_proxy
+
+    @functools.wraps(proxy)
+    def _statement_proxy(*args, **kwargs):
+        with _sql_statement(statement):
+            return proxy(*args, **kwargs)
+    return _statement_proxy
 
     
-def _binding_function_with_pybatis(cls, func_name:str, func:callable, xmlConfig:XMLConfig, ds:PydbcTools):
+def _binding_function_with_pybatis(cls, func_name:str, func:callable, xmlConfig:XMLConfig, ds:PydbcTools, validate:bool=True,
+                                   executor:ExecutorType=None):
     _logger.DEBUG(f'{func_name}.{func}')
-    
-    sig = inspect.signature(func)        
-    # params = sig.parameters               # 2. 有序参数字典
-    # return_ann = sig.return_annotation  
-    type_hints = get_type_hints(func)
-    
+
     sqlItem:SQLItem = xmlConfig.getSql(func_name)
-    sqlType:str = sqlItem.type
-    resultType:type = sqlItem.getReulstType()
-    return_type = type_hints.get('return') or resultType or dict 
-    
-    # if sqlType == 'select':        
-        
-    def _sql_proxy(self, *args, **kwargs)->any:
-        bound = sig.bind_partial(self, *args, **kwargs)
-        bound.apply_defaults()        
-        _logger.DEBUG(f'{bound.arguments}=>{return_type}')
-        bound.arguments.pop('self')
-        
-        sql = sqlItem.build_sql(bound.arguments)
-        
-        if sqlType == SQLItem.SQLType.DELETE: 
-            return ds.delete(sql, bound.arguments)
-        elif sqlType == SQLItem.SQLType.UPDATE: 
-            return ds.update(sql, bound.arguments)
-        elif sqlType == SQLItem.SQLType.INSERT: 
-            autokey = None
-            if sqlItem.options and 'autoKey' in sqlItem.options:
-                autokey = sqlItem.options['autoKey']
-            return ds.insert(sql, bound.arguments, autokey)
-        elif sqlType == SQLItem.SQLType.SELECT:
-            pageMode = None
-            for k,v in bound.arguments.items():
-                if isinstance(v, PageMode) or isinstance(sig.parameters[k], PageMode):
-                    pageMode = v
-            _isList = False
-            _isPage = False
-            if isList(return_type):
-                _isList = True                                                                        
-            if isType(return_type, PageResult) or pageMode:
-                _isList = True
-                _isPage = True
-                
-            print(f'================ _isPage={_isPage} _isList={_isList} return_type={return_type} resultType={resultType}')                                
-            if _isPage:
-                if pageMode is None:
-                    pageMode = PageMode(pageno=1)                    
-                rtn = ds.queryPage(sql, bound.arguments, pageMode.pageno, pageMode.pagesize)
-                
-                if not rtn.list:
-                    return rtn
-                
-                if is_not_primitive(resultType):                    
-                    if is_user_defined(resultType):
-                        _l = [getInstance(resultType, one) for one in rtn]
-                        rtn.list = _l
-                        return rtn
-                    else:
-                        return rtn
-                else:
-                    _l = [next(iter(one.values())) for one in rtn.list]
-                    rtn.list = _l
-                    return rtn
-            else:
-                if _isList:
-                    rtn = ds.queryMany(sql, bound.arguments)
-                    if not rtn :
-                        return rtn
-                    
-                    if is_not_primitive(resultType):
-                        if is_user_defined(resultType):
-                            _l = [getInstance(resultType, one) for one in rtn]
-                            return _l
-                        else:
-                            return rtn                        
-                    else:
-                        _l = [next(iter(one.values())) for one in rtn]
-                        return _l
-                else:
-                    rtn = ds.queryOne(sql, bound.arguments)
-                    if rtn is None:
-                        return rtn
-                    else:
-                        if is_not_primitive(return_type):
-                            if isType(return_type, dict):
-                                return rtn
-                            else:
-                                return getInstance(return_type, rtn)
-                        else:
-                            return next(iter(rtn.values()))
-                            
-        return func(self, *args, **kwargs)
-        
-    setattr(cls, func_name, _sql_proxy)
+    sig = inspect.signature(func)
+    bind = _arguments_binder(sig, skip_self=True)
+    options = sqlItem.options if validate else {**sqlItem.options, 'validate': False}
+    if executor is not None:
+        options = {**options, 'executor': executor}
+    stream = _is_stream(func)
+    is_async = inspect.iscoroutinefunction(func) and not stream   # 流式查询的代理直接返回迭代器
+    name = f'{xmlConfig.namespace}.{func_name}'
+    execute = _call_plan(func, sqlItem.type, sqlItem.getReulstType(), ds, options, skip_self=True, is_async=is_async, statement=name)
+    cache = xmlConfig.getCache()
+    if cache is not None and execute is not None and not stream:
+        execute = _with_namespace_cache(execute, cache, sqlItem, ds, name, is_async)
 
-def Mapper(datasource:PydbcTools, *, namespace:str=None, table:str=None,id_col='id'):
+    if is_async:
+        async def _sql_proxy(self, *args, **kwargs)->any:
+            if execute is None:
+                return await func(self, *args, **kwargs)
+            count_statement(name)
+            arguments = bind(args, kwargs)
+            return await execute(sqlItem.build_sql(arguments), arguments)
+    else:
+        def _sql_proxy(self, *args, **kwargs)->any:
+            if execute is None:
+                return func(self, *args, **kwargs)
+            count_statement(name)
+            arguments = bind(args, kwargs)
+            return execute(sqlItem.build_sql(arguments), arguments)
+
+    _sql_proxy = with_shard_key(_with_timeout(_sql_proxy, sqlItem.options.get('timeout')), ds, sig, sqlItem.options.get('shardKey'))
+    setattr(cls, func_name, _with_statement(_sql_proxy, ds, name))
+
+def Mapper(datasource:PydbcTools, *, namespace:str=None, table:str=None,id_col='id', validate:bool=True, executor:ExecutorType=None):
+    """validate=False时resultType为pydantic模型的查询使用model_construct构造结果，不做校验
+    executor=ExecutorType.BATCH时Mapper的insert/update/delete在事务中排队，用executemany批量执行，返回-1"""
+    executor = ExecutorType(executor.value) if executor is not None else None
     def mapper_decorator(cls):
         _table = table
         _id_col = id_col
@@ -492,6 +1091,13 @@ def Mapper(datasource:PydbcTools, *, namespace:str=None, table:str=None,id_col='
                 
         def getDataSource()->PydbcTools:
             return datasource
+
+        def _flush_cache(rtn):
+            # 表的写操作同时清空namespace缓存
+            cache = xmlCOnfig.getCache()
+            if cache is not None:
+                cache.flush()
+            return rtn
         
         # ---------- CRUD 方法 ----------
         @classmethod
@@ -508,15 +1114,15 @@ def Mapper(datasource:PydbcTools, *, namespace:str=None, table:str=None,id_col='
 
         @classmethod
         def insert(cls, entity:dict)->int:
-            return getDataSource().insertT(_table, entity)
+            return _flush_cache(getDataSource().insertT(_table, entity))
 
         @classmethod
         def update_by_id(cls, entity:dict)->int:
-            return getDataSource().updateT(_table, entity,{_id_col:entity['id']})
+            return _flush_cache(getDataSource().updateT(_table, entity,{_id_col:entity['id']}))
 
         @classmethod
         def delete_by_id(cls, pk:any)->int:
-            return getDataSource().deleteT(_table, {_id_col:pk})
+            return _flush_cache(getDataSource().deleteT(_table, {_id_col:pk}))
             
         # def say(self, pk:any)->int:
         #     print(f'=========={dir(self)} {self.name}{_id_col}={pk}')
@@ -528,7 +1134,7 @@ def Mapper(datasource:PydbcTools, *, namespace:str=None, table:str=None,id_col='
         
         funcs = inspect_own_method(cls)        
         for func in funcs:            
-            _binding_function_with_pybatis(cls, func[0], func[1], xmlCOnfig, getDataSource())
+            _binding_function_with_pybatis(cls, func[0], func[1], xmlCOnfig, getDataSource(), validate, executor)
 
         # 把方法挂到类上
         cls.select_by_id = select_by_id
@@ -542,17 +1148,31 @@ def Mapper(datasource:PydbcTools, *, namespace:str=None, table:str=None,id_col='
     return mapper_decorator
 
 
-def SELECT(datasource:PydbcTools, sql:str=None, *, resultType:type|str=dict):
+def SELECT(datasource:PydbcTools|ShardingTools, sql:str=None, *, resultType:type|str=dict, cache:bool|int=None, shardKey:str=None, timeout:float=None, validate:bool=True,
+           associations:list[Association]=None, fetchSize:int=None):
+    """cache=True或者缓存秒数时使用数据源的查询结果缓存，SQL读取的表有写操作时自动失效
+    shardKey为分片数据源的路由参数名，timeout为语句超时秒数，validate=False时pydantic模型结果不做校验
+    associations为Association/Collection列表，等同于Mapper XML中的<association>/<collection>，关联结果按键批量查询后拼接
+    返回类型为Iterator[T]/AsyncIterator[T]时使用服务端游标流式查询，fetchSize为每批获取的行数"""
     if isinstance(resultType, str):
         resultType = _get_result_type(resultType)
+    options = {k: v for k, v in (('cache', cache), ('shardKey', shardKey), ('timeout', timeout), ('associations', associations),
+                                 ('fetchSize', fetchSize)) if v}
+    if not validate:
+        options['validate'] = False
     
     def decorator(func:callable)->callable:        
-        return _binding_sql_with_func(func, sql, SQLItem.SQLType.SELECT, resultType=resultType, ds=datasource, options={})
+        return _binding_sql_with_func(func, sql, SQLItem.SQLType.SELECT, resultType=resultType, ds=datasource, options=options)
     return decorator
 
-def UPDATE(datasource:PydbcTools, *, sql:str=None):
+def UPDATE(datasource:PydbcTools|ShardingTools, *, sql:str=None, shardKey:str=None, timeout:float=None, executor:ExecutorType=None):
+    """executor=ExecutorType.BATCH时事务中的语句排队，相邻的相同SQL用executemany批量执行，返回-1"""
+    options = {k: v for k, v in (('shardKey', shardKey), ('timeout', timeout)) if v}
+    if executor is not None:
+        options['executor'] = ExecutorType(executor.value)
+
     def decorator(func:callable)->callable:        
-        return _binding_sql_with_func(func, sql, SQLItem.SQLType.UPDATE, resultType=int, ds=datasource, options={})
+        return _binding_sql_with_func(func, sql, SQLItem.SQLType.UPDATE, resultType=int, ds=datasource, options=options)
     return decorator
 
 
@@ -1,20 +1,126 @@
-from sqlalchemy import create_engine, Engine, text, event, make_url, inspect
-from sqlalchemy.pool import QueuePool
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import create_engine, Engine, text, TextClause, event, make_url, inspect
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.exc import SQLAlchemyError, OperationalError, InterfaceError, DisconnectionError, TimeoutError as PoolTimeoutError
 from dataflow.utils.log import Logger
 from dataflow.utils.utils import PageResult
+from dataflow.utils.dbtools.querycache import QueryCache, write_tables
+from dataflow.utils.dbtools.sqlstats import SqlStats
 from dataflow.utils.utils import json_to_str, str_isEmpty, get_unique_seq,current_millsecond
-from typing import Any, Dict, Optional,Self,Callable,Union,Type,Tuple
-from cachetools import Cache
+from typing import Any, Dict, Optional,Self,Callable,Union,Type,Tuple,Iterable
+from cachetools import Cache, TTLCache, LRUCache
 from enum import Enum
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, async_sessionmaker, AsyncSession
 import functools
+import itertools
+import csv
+import io
+import time
+import asyncio
+import threading
+import base64
+import datetime
+import decimal
+import json
+import re
 import contextvars
+import contextlib
+import hashlib
+import os
 import sys
+import importlib.util
 import inspect as inspectoin
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
 
 _logger = Logger('dataflow.utils.dbtools.pydbc')
 
+def _cursor_value(v):
+    if isinstance(v, datetime.datetime):
+        return {'$dt': v.isoformat()}
+    if isinstance(v, datetime.date):
+        return {'$d': v.isoformat()}
+    if isinstance(v, decimal.Decimal):
+        return {'$n': str(v)}
+    return v
+
+def _cursor_origin(v):
+    if isinstance(v, dict):
+        if '$dt' in v:
+            return datetime.datetime.fromisoformat(v['$dt'])
+        if '$d' in v:
+            return datetime.date.fromisoformat(v['$d'])
+        if '$n' in v:
+            return decimal.Decimal(v['$n'])
+    return v
+
+def _encode_cursor(token:dict)->str:
+    """keyset分页游标，排序列值和总数编码为url安全的base64，日期和Decimal保留原类型"""
+    token = {'k': [_cursor_value(v) for v in token['k']], 't': token['t']}
+    return base64.urlsafe_b64encode(json.dumps(token, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor:str)->dict:
+    try:
+        token = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return {'k': [_cursor_origin(v) for v in token['k']], 't': token.get('t', -1)}
+    except Exception as e:
+        raise SQLAlchemyError(f'keyset分页游标{cursor}不合法') from e
+
+
+def _iter_batches(rows, batchsize:int, named:bool=False):
+    """把list、生成器或者DataFrame按batchsize切成list，DataFrame的NaN转为None，named时DataFrame行为dict"""
+    if isinstance(rows, pd.DataFrame):
+        columns = [str(c) for c in rows.columns]
+        for i in range(0, len(rows), batchsize):
+            chunk = rows.iloc[i:i+batchsize].astype(object)
+            chunk = chunk.where(chunk.notna(), None)
+            if named:
+                yield [dict(zip(columns, one)) for one in chunk.itertuples(index=False, name=None)]
+            else:
+                yield list(chunk.itertuples(index=False, name=None))
+        return
+    iterator = iter(rows)
+    while True:
+        datas = list(itertools.islice(iterator, batchsize))
+        if not datas:
+            return
+        yield datas
+
+# 表结构版本，结构变化(DDL)后值改变，用于判断持久化的表信息缓存是否可用
+_SCHEMA_VERSION_SQL = {
+    'sqlite': 'PRAGMA schema_version',
+    'postgresql': """select md5(string_agg(table_name || '.' || column_name || ':' || data_type || ':' || is_nullable || ':' || coalesce(column_default, ''), ',' order by table_name, ordinal_position))
+                     from information_schema.columns where table_schema = coalesce(:schema, current_schema())""",
+    'mysql': """select md5(group_concat(concat_ws(':', table_name, column_name, column_type, is_nullable, column_key, extra) order by table_name, ordinal_position separator ','))
+                from information_schema.columns where table_schema = coalesce(:schema, database())""",
+    'mariadb': """select md5(group_concat(concat_ws(':', table_name, column_name, column_type, is_nullable, column_key, extra) order by table_name, ordinal_position separator ','))
+                  from information_schema.columns where table_schema = coalesce(:schema, database())""",
+    'oracle': """select to_char(max(last_ddl_time), 'YYYYMMDDHH24MISS') || count(1) from all_objects
+                 where object_type in ('TABLE', 'VIEW') and owner = coalesce(:schema, sys_context('USERENV', 'CURRENT_SCHEMA'))""",
+    'mssql': """select convert(varchar(32), max(modify_date), 126) + cast(count(1) as varchar(16)) from sys.objects
+                where type in ('U', 'V') and schema_id = schema_id(coalesce(:schema, schema_name()))""",
+}
+_DDL_TABLE = re.compile(r'^\s*(?:ALTER|DROP|CREATE|RENAME|TRUNCATE)\s+(?:TABLE|VIEW)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?([`"\[\]\w.$]+)', re.IGNORECASE)
+
+def _fetchall(result)->list:
+    rows = result.fetchall()
+    stat = getattr(result.context, '_sqlstats_entry', None)
+    if stat is not None:
+        stat[0].add_rows(stat[1], len(rows))
+    return rows
+
+def _fetchone(result):
+    row = result.fetchone()
+    stat = getattr(result.context, '_sqlstats_entry', None)
+    if stat is not None and row is not None:
+        stat[0].add_rows(stat[1], 1)
+    return row
+
+def _log_throughput(name:str, rows:int, seconds:float):
+    _logger.INFO(f'{name}完成{rows}条记录，耗时{seconds:.3f}秒，{rows / seconds if seconds > 0 else 0:.1f}行/秒')
+
+
 class SimpleExpression:
     class ExpressionException(Exception):
         pass
@@ -106,24 +212,112 @@ class SimpleExpression:
         return self
         
 
-def _setup_monitoring(engine:Engine):
+class _Histogram:
+    """累计分桶的直方图，只记录计数，导出时转换为Prometheus的histogram"""
+    def __init__(self, buckets:tuple):
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value:float):
+        with self._lock:
+            self._sum += value
+            for i, le in enumerate(self.buckets):
+                if value <= le:
+                    self._counts[i] += 1
+                    break
+
+    def snapshot(self)->dict:
+        with self._lock:
+            counts = list(itertools.accumulate(self._counts))
+            return {'buckets': list(zip(self.buckets, counts)), 'sum': self._sum, 'count': counts[-1]}
+
+
+class _PoolTelemetry:
+    """连接池事件统计，_setup_monitoring的事件和_MonitoredQueuePool.connect写入"""
+    WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+    LIFETIME_BUCKETS = (1, 10, 60, 300, 900, 1800, 3600, 7200, 14400)
+
+    def __init__(self):
+        self.wait = _Histogram(self.WAIT_BUCKETS)          # 取连接等待秒数(含新建连接和pre_ping)
+        self.lifetime = _Histogram(self.LIFETIME_BUCKETS)  # 连接从创建到关闭的秒数
+        self._counters = {'connect': 0, 'close': 0, 'checkout': 0, 'checkin': 0,
+                          'invalidate': 0, 'soft_invalidate': 0, 'timeout': 0}
+        self._lock = threading.Lock()
+
+    def inc(self, name:str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def counters(self)->dict:
+        with self._lock:
+            return dict(self._counters)
+
+
+class _MonitoredPoolMixin:
+    """记录取连接的等待时间和超时次数，recreate(engine.dispose)后保留统计对象"""
+    _telemetry:_PoolTelemetry = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            if self._telemetry is not None:
+                self._telemetry.inc('timeout')
+            raise
+        finally:
+            if self._telemetry is not None:
+                self._telemetry.wait.observe(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool._telemetry = self._telemetry
+        return pool
+
+
+class _MonitoredQueuePool(_MonitoredPoolMixin, QueuePool):
+    pass
+
+
+class _MonitoredAsyncQueuePool(_MonitoredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _setup_monitoring(engine:Engine, telemetry:_PoolTelemetry=None):
     """设置连接池监控"""        
+    if telemetry is not None and isinstance(engine.pool, _MonitoredPoolMixin):
+        engine.pool._telemetry = telemetry
+
+    def _inc(name:str):
+        if telemetry is not None:
+            telemetry.inc(name)
+
     # 连接创建和关闭    
     @event.listens_for(engine, "connect")
     def on_connect(dbapi_conn, connection_record):
+        connection_record.info['_created'] = time.monotonic()
+        _inc('connect')
         _logger.DEBUG(f"🆕 CONNECT - 新建连接: {id(dbapi_conn)}")
     
     @event.listens_for(engine, "close")
     def on_close(dbapi_conn, connection_record):
+        created = connection_record.info.pop('_created', None)
+        if telemetry is not None and created is not None:
+            telemetry.lifetime.observe(time.monotonic() - created)
+        _inc('close')
         _logger.DEBUG(f"❌ CLOSE - 关闭连接: {id(dbapi_conn)}")
     
     # 连接取出和放回
     @event.listens_for(engine, "checkout")
     def on_checkout(dbapi_conn, connection_record, connection_proxy):
+        _inc('checkout')
         _logger.DEBUG(f"📥 CHECKOUT - 取出连接: {id(dbapi_conn)}")
     
     @event.listens_for(engine, "checkin")
     def on_checkin(dbapi_conn, connection_record):
+        _inc('checkin')
         _logger.DEBUG(f"📤 CHECKIN - 放回连接: {id(dbapi_conn)}")
     
     # 连接验证和失效
@@ -133,6 +327,7 @@ def _setup_monitoring(engine:Engine):
     
     @event.listens_for(engine, "invalidate")
     def on_invalidate(dbapi_conn, connection_record, exception):
+        _inc('invalidate')
         _logger.DEBUG(f"🚫 INVALIDATE - 连接失效: {id(dbapi_conn)}, 错误: {exception}")
     
     # 连接池调整
@@ -142,9 +337,141 @@ def _setup_monitoring(engine:Engine):
     
     @event.listens_for(engine, "soft_invalidate")
     def on_soft_invalidate(dbapi_conn, connection_record, exception):
+        _inc('soft_invalidate')
         _logger.DEBUG(f"⚠️ SOFT_INVALIDATE - 软失效: {id(dbapi_conn)}")
 
 
+# 当前语句超时秒数，statement_timeout()或者方法的timeout=参数设置
+_statement_timeout:contextvars.ContextVar[float] = contextvars.ContextVar('statement_timeout', default=None)
+
+@contextlib.contextmanager
+def statement_timeout(seconds:float|None):
+    """with内执行的语句超过seconds秒时由数据库中止，seconds为None时不改变"""
+    if seconds is None:
+        yield
+        return
+    token = _statement_timeout.set(seconds)
+    try:
+        yield
+    finally:
+        _statement_timeout.reset(token)
+
+def _with_timeout(func:Callable)->Callable:
+    """方法增加timeout=秒数关键字参数，调用期间设置语句超时；异步方法同时在客户端计时，到期取消协程(触发数据库端取消)"""
+    if inspectoin.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def _async_wrapper(self, *args, timeout:float=None, **kwargs):
+            if timeout is None:
+                return await func(self, *args, **kwargs)
+            with statement_timeout(timeout):
+                async with asyncio.timeout(timeout):
+                    return await func(self, *args, **kwargs)
+        return _async_wrapper
+
+    @functools.wraps(func)
+    def _wrapper(self, *args, timeout:float=None, **kwargs):
+        if timeout is None:
+            return func(self, *args, **kwargs)
+        with statement_timeout(timeout):
+            return func(self, *args, **kwargs)
+    return _wrapper
+
+_MYSQL_SELECT = re.compile(r'^(\s*SELECT)\b', re.IGNORECASE)
+
+def _setup_statement_timeout(engine:Engine, default:float=None):
+    """按数据库设置语句超时：postgresql SET LOCAL statement_timeout(事务内值变化时才设置)，mysql SELECT加MAX_EXECUTION_TIME提示，
+    mariadb SET STATEMENT max_statement_time FOR，oracle连接call_timeout，mssql(pyodbc)连接timeout，sqlite使用progress handler中断
+    default为数据源statement_timeout配置的默认超时秒数"""
+    dialect = engine.dialect.name
+    mariadb = getattr(engine.dialect, 'is_mariadb', False)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = _statement_timeout.get() or default
+        if dialect == 'postgresql':
+            if conn.info.get('_statement_timeout') != seconds:
+                setter = conn.connection.dbapi_connection.cursor()
+                try:
+                    setter.execute(f'SET LOCAL statement_timeout = {int(seconds * 1000)}' if seconds else 'SET LOCAL statement_timeout = DEFAULT')
+                finally:
+                    setter.close()
+                conn.info['_statement_timeout'] = seconds
+            return statement, parameters
+        if not seconds:
+            return statement, parameters
+        dbapi_conn = conn.connection.dbapi_connection
+        if dialect in ('mysql', 'mariadb'):
+            if mariadb:
+                statement = f'SET STATEMENT max_statement_time={seconds} FOR {statement}'
+            else:
+                statement = _MYSQL_SELECT.sub(f'\\1 /*+ MAX_EXECUTION_TIME({int(seconds * 1000)}) */', statement, count=1)
+        elif dialect == 'oracle' and hasattr(dbapi_conn, 'call_timeout'):
+            context._timeout_restore = ('call_timeout', dbapi_conn.call_timeout)
+            dbapi_conn.call_timeout = int(seconds * 1000)
+        elif dialect == 'mssql' and hasattr(dbapi_conn, 'timeout'):
+            context._timeout_restore = ('timeout', dbapi_conn.timeout)
+            dbapi_conn.timeout = max(int(seconds + 0.999), 1)
+        elif dialect == 'sqlite' and hasattr(dbapi_conn, 'set_progress_handler'):
+            deadline = time.monotonic() + seconds
+            dbapi_conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 1000)
+            context._timeout_restore = ('progress', None)
+        return statement, parameters
+
+    def _restore(context):
+        restore = getattr(context, '_timeout_restore', None)
+        if restore is None:
+            return
+        context._timeout_restore = None
+        dbapi_conn = context.root_connection.connection.dbapi_connection
+        if restore[0] == 'progress':
+            dbapi_conn.set_progress_handler(None, 0)
+        else:
+            setattr(dbapi_conn, restore[0], restore[1])
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _restore(context)
+
+    def handle_error(exception_context):
+        if exception_context.execution_context is not None:
+            _restore(exception_context.execution_context)
+
+    def end_transaction(conn):
+        if not conn.invalidated:
+            conn.info.pop('_statement_timeout', None)   # SET LOCAL在事务结束时失效
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute, retval=True)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(engine, 'handle_error', handle_error)
+    event.listen(engine, 'commit', end_transaction)
+    event.listen(engine, 'rollback', end_transaction)
+
+
+_BACKEND_PID_SQL = {'postgresql': 'select pg_backend_pid()', 'mysql': 'select connection_id()', 'mariadb': 'select connection_id()'}
+
+def _setup_backend_pid(engine:Engine):
+    """新建连接时记录数据库端的连接id，异步语句被取消时用于pg_cancel_backend/KILL QUERY"""
+    sql = _BACKEND_PID_SQL.get(engine.dialect.name)
+    if sql is None:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        try:
+            cursor.execute(sql)
+            connection_record.info['backend_pid'] = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+
+def _sqlite3_connection(dbapi_connection):
+    """aiosqlite连接内部的sqlite3连接，用于interrupt()。依赖私有属性：SQLAlchemy 2.0 AsyncAdapt_aiosqlite_connection._connection
+    和aiosqlite(0.17~0.22) Connection._conn，版本变化取不到时返回None，只等待语句自己结束"""
+    try:
+        return dbapi_connection._connection._conn
+    except AttributeError:
+        return None
+
+
 INNER_PLACEHOLDER = '_$inner$_'
 INNER_UPDATE_PLACEHOLDER = '_update__'
 
@@ -157,11 +484,130 @@ NULL = _NULLObj()
 def _is_null(obj):
     return NULL == obj
 
+# 同步URL对应的异步驱动，没有配置async_url时按照url的数据库类型自动选择
+_ASYNC_DRIVERS = {
+    'mysql': 'asyncmy',
+    'mariadb': 'asyncmy',
+    'postgresql': 'asyncpg',
+    'sqlite': 'aiosqlite',
+    'oracle': 'oracledb_async',
+    'mssql': 'aioodbc',
+}
+
+
+def use_async_engine(ds)->bool:
+    """数据源配置了async_enabled并且有异步驱动时使用a开头的异步方法，否则在线程池中执行同步方法；
+    不按异步引擎是否已经创建判断，也不为此创建异步引擎，和async函数上的TX使用同样的判断。pybatis协程存根和gather共用"""
+    enabled = getattr(ds, 'isAsyncEnabled', None)
+    return enabled is not None and enabled() and ds.isAsyncSupported()
+
+
+class _ReplicaSet:
+    """只读副本，按round_robin或least_outstanding选择健康的副本，副本连接失败后标记为不可用，超过check_interval秒后重新检查"""
+    _ERRORS = (OperationalError, InterfaceError, DisconnectionError)
+
+    @staticmethod
+    def lost(e:Exception)->bool:
+        """是否为副本连接断开/连接失败，SQL错误、语句超时等OperationalError不切换副本"""
+        if isinstance(e, (DisconnectionError, InterfaceError)):
+            return True
+        if isinstance(e, OperationalError):
+            # statement为空是建立连接时的错误
+            return bool(e.connection_invalidated) or e.statement is None
+        return False
+
+    def __init__(self, replicas:list, policy:str='round_robin', check_interval:int=30, test:str='select 1'):
+        if policy not in ('round_robin', 'least_outstanding'):
+            raise SQLAlchemyError(f'不支持的副本选择策略{policy}，可选round_robin、least_outstanding')
+        self.replicas = replicas
+        self.policy = policy
+        self.check_interval = check_interval
+        self.test = test
+        self._lock = threading.Lock()
+        self._next = 0
+        self._outstanding = [0] * len(replicas)
+        self._reads = [0] * len(replicas)
+        self._errors = [0] * len(replicas)
+        self._healthy = [True] * len(replicas)
+        self._checked = [0.0] * len(replicas)
+
+    def pick(self)->int|None:
+        for i in range(len(self.replicas)):
+            if not self._healthy[i] and time.monotonic() - self._checked[i] >= self.check_interval:
+                self.check(i)
+        with self._lock:
+            healthy = [i for i in range(len(self.replicas)) if self._healthy[i]]
+            if not healthy:
+                return None
+            if self.policy == 'least_outstanding':
+                return min(healthy, key=lambda i: (self._outstanding[i], self._reads[i]))
+            self._next = (self._next + 1) % len(healthy)
+            return healthy[self._next]
+
+    def check(self, index:int)->bool:
+        """副本健康检查，执行test语句"""
+        replica = self.replicas[index]
+        try:
+            with replica.engine.connect() as connection:
+                connection.execute(text(self.test))
+            healthy = True
+        except Exception as e:
+            _logger.WARN(f'只读副本{replica.engine.url}健康检查失败:{e}')
+            healthy = False
+        with self._lock:
+            if healthy and not self._healthy[index]:
+                _logger.INFO(f'只读副本{replica.engine.url}恢复可用')
+            self._healthy[index] = healthy
+            self._checked[index] = time.monotonic()
+        return healthy
+
+    def checkAll(self)->list[bool]:
+        return [self.check(i) for i in range(len(self.replicas))]
+
+    @contextlib.contextmanager
+    def use(self, index:int):
+        with self._lock:
+            self._outstanding[index] += 1
+            self._reads[index] += 1
+        try:
+            yield self.replicas[index]
+        except self._ERRORS as e:
+            if not self.lost(e):
+                raise
+            with self._lock:
+                self._errors[index] += 1
+                self._healthy[index] = False
+                self._checked[index] = time.monotonic()
+            _logger.WARN(f'只读副本{self.replicas[index].engine.url}不可用:{e}')
+            raise
+        finally:
+            with self._lock:
+                self._outstanding[index] -= 1
+
+    def stats(self)->list[dict]:
+        with self._lock:
+            return [{
+                'url': one.engine.url.render_as_string(hide_password=True),
+                'healthy': self._healthy[i],
+                'outstanding': self._outstanding[i],
+                'reads': self._reads[i],
+                'errors': self._errors[i],
+                'pool': one.getPoolStats(),
+            } for i, one in enumerate(self.replicas)]
+
 
 class PydbcTools:
     def __init__(self, **kwargs):
         self._table_cache = Cache(maxsize=10000000)
         self.__config__ = kwargs
+        self._count_cache = TTLCache(maxsize=self.__config__.get('count_cache_size', 1024),
+                                     ttl=self.__config__.get('count_cache_ttl', 60))   # count='cached'的总数缓存
+        self._count_cache_lock = threading.Lock()
+        self._text_cache_size = self.__config__.get('statement_cache_size', 1024)   # text()语句LRU大小，0不缓存
+        self._text_cache = LRUCache(maxsize=max(self._text_cache_size, 1))
+        self._text_cache_lock = threading.Lock()
+        self._text_cache_hits = 0
+        self._text_cache_misses = 0
         self.__url = make_url(
                 self.__config__['url']
             )
@@ -171,30 +617,409 @@ class PydbcTools:
             self.__url = self.__url.set(password=self.__config__['password'])        
         self.engine = create_engine(
             url=self.__url,
-            poolclass=QueuePool,            
+            poolclass=_MonitoredQueuePool,            
             pool_size=self.__config__['pool_size'] if 'pool_size' in self.__config__ else 20,      # 常驻连接数
             max_overflow=self.__config__['max_overflow'] if 'max_overflow' in self.__config__ else 10 ,          # 超出池后可再建多少连接
             pool_timeout=self.__config__['pool_timeout'] if 'pool_timeout' in self.__config__ else 30 ,          # 获取连接最大等待秒数
             pool_recycle=self.__config__['pool_recycle'] if 'pool_recycle' in self.__config__ else 3600 ,        # 连接回收时间（防 MySQL 8h 断开）
             pool_pre_ping=self.__config__['ping'] if 'pool_pre_ping' in self.__config__ else True ,       # 使用前 ping，防“连接已死”
-            
-            future=True            
+            connect_args=self._connect_args(self.__url),
+            future=True
         )
+        self.async_engine = None
+        self._cancel_engine = None
+        self._async_supported:bool = None
         self._sessoin_factory = SessionFactory(self)
-        _setup_monitoring(self.engine)        
-        # _logger.INFO(f'创建数据库连接:{self.__url}')               
+        self._pool_telemetry = _PoolTelemetry()
+        self._async_pool_telemetry = _PoolTelemetry()
+        _setup_monitoring(self.engine, self._pool_telemetry)
+        _setup_statement_timeout(self.engine, self.__config__.get('statement_timeout'))
+        self._sql_stats:SqlStats = None
+        config = self.__config__.get('sql_stats')
+        if config:
+            config = config if isinstance(config, dict) else {}
+            self._use_sql_stats(SqlStats(self.__url.render_as_string(hide_password=True),
+                                         config.get('size', 500), config.get('slow_ms', 1000)))
+        self._replicas = self._create_replicas()
+        self._result_cache:QueryCache = None
+        self._result_cache_lock = threading.Lock()
+        self._result_cache_redis = None
+        if self.__config__.get('result_cache'):
+            self.getResultCache()
+        # _logger.INFO(f'创建数据库连接:{self.__url}')
         if 'test' in self.__config__:
             test = self.__config__['test']
             if test.strip() != '':
                 self.queryOne(test)
+        if self.__config__.get('async_enabled', False):
+            self.isAsyncSupported()     # 创建异步引擎，没有异步驱动时退回线程池执行
+        if self.__config__.get('table_cache'):
+            self._init_table_cache()
         _logger.INFO(f'创建数据库连接:{self.__url}成功')
-    
+
     def getConfig(self):
         return self.__config__
-    
+
+    def _create_replicas(self)->_ReplicaSet|None:
+        """replicas配置的只读副本，每个副本是独立连接池的PydbcTools，未配置的参数(用户名、密码、连接池等)继承主库"""
+        replicas = self.__config__.get('replicas')
+        if not replicas:
+            return None
+        base = {k: v for k, v in self.__config__.items() if k not in ('url', 'async_url', 'replicas', 'test', 'result_cache', 'sql_stats', 'table_cache')}
+        instances = []
+        for one in replicas:
+            one = {'url': one} if isinstance(one, str) else one
+            instances.append(PydbcTools(**{**base, **one}))
+            if self._sql_stats is not None:
+                instances[-1]._use_sql_stats(self._sql_stats)   # 副本的SQL统计计入主库
+            _logger.INFO(f'创建只读副本:{instances[-1].engine.url}')
+        test = self.__config__.get('test') or 'select 1'
+        return _ReplicaSet(instances, self.__config__.get('replica_policy', 'round_robin'),
+                           self.__config__.get('replica_check_interval', 30), test)
+
+    def setResultCacheRedis(self, redis):
+        """结果缓存的Redis二级缓存，RedisTools或者返回RedisTools的函数(首次使用时获取)"""
+        self._result_cache_redis = redis
+        if self._result_cache is not None:
+            self._result_cache._redis = redis
+
+    def getResultCache(self)->QueryCache:
+        """查询结果缓存，result_cache配置{size, ttl, redis, prefix}，没有配置时第一次使用cache参数查询时按默认值创建
+        通过引擎事件监听写语句(包括TX内的提交)，按表失效"""
+        if self._result_cache is not None:
+            return self._result_cache
+        with self._result_cache_lock:
+            if self._result_cache is None:
+                config = self.__config__.get('result_cache')
+                config = config if isinstance(config, dict) else {}
+                cache = QueryCache(str(self.engine.url.render_as_string(hide_password=True)),
+                                   config.get('size', 10000), config.get('ttl', 60),
+                                   self._result_cache_redis if config.get('redis', False) else None,
+                                   config.get('prefix', 'pydbc:cache'))
+                self._listen_writes(self.engine, cache)
+                if self.async_engine is not None:
+                    self._listen_writes(self.async_engine.sync_engine, cache)
+                self._result_cache = cache
+                _logger.INFO(f'启用查询结果缓存{cache.name}[{config}]')
+        return self._result_cache
+
+    @staticmethod
+    def _listen_writes(engine:Engine, cache:QueryCache):
+        """写语句执行后失效对应表；事务内的写在提交时再失效一次，避免提交前其他连接读到旧值再放入缓存"""
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            tables = write_tables(statement)
+            if tables:
+                cache.invalidate(tables)
+                conn.info.setdefault('_result_cache_tables', set()).update(tables)
+
+        def commit(conn):
+            cache.invalidate(conn.info.pop('_result_cache_tables', None))
+
+        def rollback(conn):
+            conn.info.pop('_result_cache_tables', None)
+
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(engine, 'commit', commit)
+        event.listen(engine, 'rollback', rollback)
+
+    def _invalidate_result_cache(self, tables:set[str]|frozenset[str]):
+        """直接使用DBAPI游标执行的写(batch、bulkLoad)不经过引擎事件，需要手动失效"""
+        if self._result_cache is not None:
+            self._result_cache.invalidate(tables)
+
+    def _use_result_cache(self, cache:bool|int, use_async:bool=False)->bool:
+        if not cache:
+            return False
+        # 事务内读取可能包含未提交的写，不使用缓存
+        if use_async:
+            return self._sessoin_factory.getAsyncSession() is None
+        return not self._sessoin_factory.getSession()
+
+    def getTxSession(self, use_async:bool=False):
+        """当前事务(TX)的Session，use_async时为AsyncSession，不在事务中时返回None"""
+        if use_async:
+            return self._sessoin_factory.getAsyncSession()
+        return self._sessoin_factory.getSession() or None
+
+    def _batch_queue(self, session, create:bool=False)->'_BatchQueue':
+        """事务Session上BATCH方式排队的写语句，create时没有则创建(只在Mapper/UPDATE的语句上使用BATCH)"""
+        if not session:
+            return None
+        session = getattr(session, 'sync_session', session)
+        queue = session.info.get(_BatchQueue.KEY)
+        if queue is None and create:
+            queue = _BatchQueue(self, session, self.__config__.get('batch_size', 1000))
+            session.info[_BatchQueue.KEY] = queue
+        return queue
+
+    def _flush_batch(self, session):
+        queue = self._batch_queue(session)
+        if queue is not None:
+            queue.flush()
+
+    async def _aflush_batch(self, session):
+        queue = self._batch_queue(session)
+        if queue is not None and queue.pending:
+            await session.run_sync(lambda _: queue.flush())
+
+    def setExecutorType(self, executor:'ExecutorType', use_async:bool=False):
+        """设置当前事务Session的写语句执行方式，BATCH时insert/update/delete排队，相邻的相同SQL合并为一次executemany，
+        在提交前、排队语句数达到batch_size(默认1000)时、同一Session执行其他语句(包括查询)前执行；SIMPLE时后续语句立即执行"""
+        session = self.getTxSession(use_async)
+        if session is None:
+            raise Exception('没有启动事务，ExecutorType只能在事务中设置')
+        queue = self._batch_queue(session, True)
+        queue.enabled = ExecutorType(executor.value) == ExecutorType.BATCH
+
+    def flushStatements(self)->list['BatchResult']:
+        """执行当前事务Session中排队的写语句，返回自上次调用以来每次executemany的BatchResult(包括自动执行的)"""
+        queue = self._batch_queue(self._sessoin_factory.getSession())
+        if queue is None:
+            return []
+        queue.flush()
+        return queue.take_results()
+
+    async def aflushStatements(self)->list['BatchResult']:
+        session = self._sessoin_factory.getAsyncSession()
+        queue = self._batch_queue(session)
+        if queue is None:
+            return []
+        await self._aflush_batch(session)
+        return queue.take_results()
+
+    def _use_sql_stats(self, stats:SqlStats):
+        self._sql_stats = stats
+        self._listen_sql_stats(self.engine, stats)
+        if self.async_engine is not None:
+            self._listen_sql_stats(self.async_engine.sync_engine, stats)
+
+    @staticmethod
+    def _listen_sql_stats(engine:Engine, stats:SqlStats):
+        """通过引擎事件统计所有经过SQLAlchemy执行的语句(查询、update、T方法、异步方法)，SELECT的行数在取完结果后由_fetchall/_fetchone补充"""
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._sqlstats_start = time.perf_counter()
+
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, '_sqlstats_start', None)
+            if start is None:
+                return
+            select = cursor.description is not None
+            entry = stats.record(statement, time.perf_counter() - start, 0 if select else cursor.rowcount, params=parameters)
+            if select:
+                context._sqlstats_entry = (stats, entry)
+
+        def handle_error(exception_context):
+            context = exception_context.execution_context
+            start = getattr(context, '_sqlstats_start', None)
+            if start is not None and exception_context.statement:
+                stats.record(exception_context.statement, time.perf_counter() - start, error=True, params=exception_context.parameters)
+
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(engine, 'handle_error', handle_error)
+
+    def _record_sql(self, sql:str, seconds:float, rows:int):
+        """直接使用DBAPI游标执行的写(batch、bulkLoad)不经过引擎事件，手动记录"""
+        if self._sql_stats is not None:
+            self._sql_stats.record(sql, seconds, rows)
+
+    def getSqlStats(self)->SqlStats|None:
+        return self._sql_stats
+
+    def getSqlTop(self, n:int=20, order:str='total')->list[dict]:
+        """按SQL指纹统计的前n条语句，sql_stats配置{size, slow_ms}启用，order为total/calls/avg/max/rows/errors"""
+        return self._sql_stats.top(n, order) if self._sql_stats is not None else []
+
+    def getReplicas(self)->list[Self]:
+        return self._replicas.replicas if self._replicas else []
+
+    def getReplicaStats(self)->list[dict]:
+        return self._replicas.stats() if self._replicas else []
+
+    def checkReplicas(self)->list[bool]:
+        return self._replicas.checkAll() if self._replicas else []
+
+    def getPoolStats(self)->dict:
+        return self._pool_stats(self.engine, self._pool_telemetry)
+
+    def getAsyncPoolStats(self)->dict|None:
+        if self.async_engine is None:
+            return None
+        return self._pool_stats(self.async_engine.sync_engine, self._async_pool_telemetry)
+
+    def getPoolTelemetry(self)->dict:
+        """连接池事件计数、等待时间和连接存活时间直方图，{'sync': {...}, 'async': {...}}，没有异步引擎时没有async"""
+        rtn = {'sync': self._pool_telemetry}
+        if self.async_engine is not None:
+            rtn['async'] = self._async_pool_telemetry
+        return {k: {'pool': self._pool_stats(self.engine if k == 'sync' else self.async_engine.sync_engine, v),
+                    'counters': v.counters(),
+                    'wait': v.wait.snapshot(),
+                    'lifetime': v.lifetime.snapshot()} for k, v in rtn.items()}
+
+    @staticmethod
+    def _pool_stats(engine:Engine, telemetry:_PoolTelemetry)->dict:
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            return {'class': type(pool).__name__}
+        counters = telemetry.counters()
+        wait = telemetry.wait.snapshot()
+        return {
+            'size': pool.size(),
+            'checkedin': pool.checkedin(),
+            'checkedout': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),   # 超出pool_size新建的连接数，QueuePool内部计数从-pool_size开始
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+            'timeouts': counters['timeout'],
+            'invalidations': counters['invalidate'],
+            'wait_avg_ms': round(wait['sum'] * 1000 / wait['count'], 3) if wait['count'] else 0.0,
+        }
+
+    def _read_replica(self, use_async:bool=False)->int|None:
+        """只读查询使用的副本序号，没有副本、事务内(事务固定在主库)或者副本都不可用时返回None"""
+        if self._replicas is None:
+            return None
+        if use_async:
+            if self._sessoin_factory.getAsyncSession() is not None:
+                return None
+        elif self._sessoin_factory.getSession():
+            return None
+        return self._replicas.pick()
+
+    def _replica_read(self, index:int, method:str, *args):
+        """在副本上执行只读查询，副本连接失败或断开时标记不可用并重新路由(其他副本或主库)，其他错误直接抛出"""
+        try:
+            with self._replicas.use(index) as replica:
+                return getattr(replica, method)(*args)
+        except _ReplicaSet._ERRORS as e:
+            if not _ReplicaSet.lost(e):
+                raise
+            return getattr(self, method)(*args)
+
+    async def _areplica_read(self, index:int, method:str, *args):
+        try:
+            with self._replicas.use(index) as replica:
+                return await getattr(replica, method)(*args)
+        except _ReplicaSet._ERRORS as e:
+            if not _ReplicaSet.lost(e):
+                raise
+            return await getattr(self, method)(*args)
+
+    def _connect_args(self, url)->dict:
+        """驱动的服务端预编译语句参数，psycopg3按prepare_threshold次执行后自动prepare，oracledb/cx_oracle使用语句缓存stmtcachesize，
+        asyncpg使用statement_cache_size"""
+        driver = url.get_driver_name()
+        if driver == 'psycopg' or driver == 'psycopg_async':
+            return {'prepare_threshold': self.__config__.get('prepare_threshold', 5)}
+        elif driver in ('oracledb', 'oracledb_async', 'cx_oracle'):
+            return {'stmtcachesize': self.__config__.get('server_statement_cache_size', 100)}
+        elif driver == 'asyncpg':
+            return {'statement_cache_size': self.__config__.get('server_statement_cache_size', 100)}
+        return {}
+
+    def _text(self, sql:str)->TextClause:
+        """按SQL文本缓存编译后的TextClause，避免每次调用重新解析绑定参数"""
+        if self._text_cache_size <= 0:
+            return text(sql)
+        with self._text_cache_lock:
+            clause = self._text_cache.get(sql)
+            if clause is not None:
+                self._text_cache_hits += 1
+                return clause
+            self._text_cache_misses += 1
+        clause = text(sql)
+        with self._text_cache_lock:
+            self._text_cache[sql] = clause
+        return clause
+
+    def getStatementCacheStats(self)->dict:
+        with self._text_cache_lock:
+            total = self._text_cache_hits + self._text_cache_misses
+            return {
+                'size': len(self._text_cache) if self._text_cache_size > 0 else 0,
+                'maxsize': self._text_cache_size,
+                'hits': self._text_cache_hits,
+                'misses': self._text_cache_misses,
+                'hit_ratio': round(self._text_cache_hits / total, 4) if total else 0.0,
+            }
+
+    def clearStatementCache(self):
+        with self._text_cache_lock:
+            self._text_cache.clear()
+            self._text_cache_hits = 0
+            self._text_cache_misses = 0
+
     def getEnginee(self)->Engine:
         return self.engine
-    
+
+    def isAsyncSupported(self)->bool:
+        """是否可以使用异步引擎，没有对应的异步驱动或者驱动没有安装时返回False，结果在第一次调用后保存"""
+        if self._async_supported is None:
+            try:
+                self.getAsyncEngine()
+                self._async_supported = True
+            except (SQLAlchemyError, ImportError) as e:
+                _logger.WARN(f'数据源不支持异步驱动，异步调用使用线程池执行:{e}')
+                self._async_supported = False
+        return self._async_supported
+
+    def _async_url(self):
+        if 'async_url' in self.__config__ and not str_isEmpty(self.__config__['async_url']):
+            url = make_url(self.__config__['async_url'])
+            if 'username' in self.__config__:
+                url = url.set(username=self.__config__['username'])
+            if 'password' in self.__config__:
+                url = url.set(password=self.__config__['password'])
+            return url
+        backend = self.__url.get_backend_name()
+        if backend not in _ASYNC_DRIVERS:
+            raise SQLAlchemyError(f'数据库{backend}没有对应的异步驱动，请配置async_url')
+        return self.__url.set(drivername=f'{backend}+{_ASYNC_DRIVERS[backend]}')
+
+    def getAsyncEngine(self)->AsyncEngine:
+        """获取异步引擎，没有创建时按照配置的url选择asyncmy/asyncpg/aiosqlite等异步驱动创建"""
+        if self.async_engine is None:
+            url = self._async_url()
+            self.async_engine = create_async_engine(
+                url=url,
+                poolclass=_MonitoredAsyncQueuePool,
+                pool_size=self.__config__['pool_size'] if 'pool_size' in self.__config__ else 20,
+                max_overflow=self.__config__['max_overflow'] if 'max_overflow' in self.__config__ else 10,
+                pool_timeout=self.__config__['pool_timeout'] if 'pool_timeout' in self.__config__ else 30,
+                pool_recycle=self.__config__['pool_recycle'] if 'pool_recycle' in self.__config__ else 3600,
+                pool_pre_ping=self.__config__['ping'] if 'pool_pre_ping' in self.__config__ else True,
+                connect_args=self._connect_args(url),
+            )
+            _setup_monitoring(self.async_engine.sync_engine, self._async_pool_telemetry)
+            _setup_statement_timeout(self.async_engine.sync_engine, self.__config__.get('statement_timeout'))
+            _setup_backend_pid(self.async_engine.sync_engine)
+            if self._sql_stats is not None:
+                self._listen_sql_stats(self.async_engine.sync_engine, self._sql_stats)
+            if self._result_cache is not None:
+                self._listen_writes(self.async_engine.sync_engine, self._result_cache)
+            _logger.INFO(f'创建异步数据库连接:{url}成功')
+        return self.async_engine
+
+    def isAsync(self)->bool:
+        """已经创建了异步引擎(async_enabled、aqueryX等异步方法第一次调用时创建)"""
+        return self.async_engine is not None
+
+    def isAsyncEnabled(self)->bool:
+        """配置了async_enabled并且有异步驱动时(见use_async_engine)：async函数上的TX使用AsyncSession，pybatis协程存根使用异步引擎，
+        否则TX使用同步Session，协程存根在线程池中执行同步方法，不随异步引擎是否已经创建变化"""
+        return bool(self.__config__.get('async_enabled', False))
+
+    async def adispose(self):
+        """关闭异步引擎的连接池，事件循环结束前调用"""
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+        if self._cancel_engine is not None:
+            await self._cancel_engine.dispose()
+        for replica in self.getReplicas():
+            await replica.adispose()
+
     def getDbType(self)->str:
         return self.engine.dialect.name.lower()
     # @overload
@@ -209,7 +1034,14 @@ class PydbcTools:
     #         _logger.ERROR("[Exception]", e)
     #         raise e
     
-    def queryMany(self, sql, params:dict=None):
+    @_with_timeout
+    def queryMany(self, sql, params:dict=None, cache:bool|int=None):
+        """cache=True或者缓存秒数时使用查询结果缓存，SQL读取的表有写操作时自动失效"""
+        if self._use_result_cache(cache):
+            return self.getResultCache().load(sql, params, lambda: self.queryMany(sql, params), None if cache is True else cache)
+        replica = self._read_replica()
+        if replica is not None:
+            return self._replica_read(replica, 'queryMany', sql, params)
         _logger.DEBUG(f"[SQL]:{sql}")
         _logger.DEBUG(f"[Parameter]:{params}")
         try:
@@ -217,7 +1049,7 @@ class PydbcTools:
             if not self._sessoin_factory.getSession():
                 _logger.DEBUG('自省事务处理')
                 with self.engine.begin() as connection:
-                    results = connection.execute(text(sql), params).fetchall()   # 参数为Dict    
+                    results = _fetchall(connection.execute(self._text(sql), params))   # 参数为Dict    
                     rtn = []
                     for one in results:
                         if one:
@@ -228,7 +1060,7 @@ class PydbcTools:
             else:
                 session = self._sessoin_factory.getSession() 
                 _logger.DEBUG('事务管理器事务处理')
-                results = session.execute(text(sql), params).fetchall()   # 参数为Dict    
+                results = _fetchall(session.execute(self._text(sql), params))   # 参数为Dict    
                 rtn = []
                 for one in results:
                     if one:
@@ -240,14 +1072,36 @@ class PydbcTools:
             # _logger.ERROR("[Exception]", e)
             raise e
 
-    def queryOne(self, sql, params:dict=None)->dict:
+    @_with_timeout
+    def queryRows(self, sql, params:dict=None)->tuple[tuple[str, ...], list]:
+        """返回(列名元组, Row元组列表)，不转换为dict，pybatis按列序号把行直接转换为resultType对象；不使用结果缓存"""
+        replica = self._read_replica()
+        if replica is not None:
+            return self._replica_read(replica, 'queryRows', sql, params)
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        session = self._sessoin_factory.getSession()
+        if not session:
+            with self.engine.begin() as connection:
+                results = connection.execute(self._text(sql), params)
+                return tuple(results.keys()), _fetchall(results)
+        results = session.execute(self._text(sql), params)
+        return tuple(results.keys()), _fetchall(results)
+
+    @_with_timeout
+    def queryOne(self, sql, params:dict=None, cache:bool|int=None)->dict:
+        if self._use_result_cache(cache):
+            return self.getResultCache().load(sql, params, lambda: self.queryOne(sql, params), None if cache is True else cache)
+        replica = self._read_replica()
+        if replica is not None:
+            return self._replica_read(replica, 'queryOne', sql, params)
         _logger.DEBUG(f"[SQL]:{sql}")
         _logger.DEBUG(f"[Parameter]:{params}")
         try:
             if not self._sessoin_factory.getSession():
                 _logger.DEBUG('自省事务处理')
                 with self.engine.begin() as connection:
-                    results = connection.execute(text(sql), params).fetchone()   # 参数为Dict                    
+                    results = _fetchone(connection.execute(self._text(sql), params))   # 参数为Dict                    
                     if results:
                         return results._asdict()
                     else:
@@ -255,7 +1109,7 @@ class PydbcTools:
             else:
                 session = self._sessoin_factory.getSession()
                 _logger.DEBUG('事务管理器事务处理')
-                results = session.execute(text(sql), params).fetchone()   # 参数为Dict                    
+                results = _fetchone(session.execute(self._text(sql), params))   # 参数为Dict                    
                 if results:
                     return results._asdict()
                 else:
@@ -264,19 +1118,34 @@ class PydbcTools:
             _logger.ERROR("[Exception]", e)
             raise e
 
-    def queryCount(self, sql, params:dict=None)->int:
-        result = self.queryOne(f'select count(1) cnt from ( {sql} ) a', params)  # 获取行
+    @_with_timeout
+    def queryCount(self, sql, params:dict=None, cache:bool|int=None)->int:
+        result = self.queryOne(f'select count(1) cnt from ( {sql} ) a', params, cache)  # 获取行
         return result['cnt']
             
-    def queryPage(self, sql, params:dict=None, page=1, pagesize=10) -> PageResult:
-        total = self.queryCount(sql, params)
+    @_with_timeout
+    def queryPage(self, sql, params:dict=None, page=1, pagesize=10, order_by:list[str]|str=None, after:str=None, count:bool|str=None, cache:bool|int=None) -> PageResult:
+        """分页查询，order_by指定排序列(如['create_time desc', 'id'])时使用keyset分页，按上一页最后一行的排序列值定位，不使用OFFSET扫描，
+        after为上一页返回的PageResult.cursor，最后一页cursor为None；没有after并且page>1时按OFFSET定位该页，之后可以用返回的cursor继续翻页。排序列需为查询的输出列且组合唯一(最后加上主键等唯一列)，
+        排序列值相同的行跨页时抛出异常；排序列可以为NULL，按数据库默认的NULL排序位置翻页
+        count总数统计方式：'exact'(True)每次count(1)；'cached'按SQL和参数缓存count结果(count_cache_ttl秒)；'estimate'使用执行计划的估算行数，
+        不支持估算的数据库退回exact；'none'(False)不统计，total=-1。count=None时OFFSET分页为exact，keyset分页只在首页统计并通过cursor带到后续页"""
+        mode = self._count_mode(count)
+        if order_by and pagesize > 0:
+            keys, values, kparams, total, need_count = self._keyset_plan(params, pagesize, order_by, after, mode, page)
+            if need_count:
+                total = self._count(sql, params, mode, cache)
+            list = self.queryMany(self._keyset_sql(sql, keys, values, '_offset_' in kparams), kparams, cache)
+            return self._keyset_result(list, keys, pagesize, page, total)
+
+        total = self._count(sql, params, mode, cache)
         if pagesize <= 0:
-            list = self.queryMany(sql, params)
-            return PageResult(total, pagesize, 1, 1 if total>0 else 0, list)            
+            list = self.queryMany(sql, params, cache)
+            return PageResult(total, pagesize, 1, (1 if total>0 else 0) if total >= 0 else -1, list)            
         else:
             if page <= 0:
                 page = 1
-            if total <= 0:
+            if total == 0:
                 return PageResult(total, pagesize, 1, (total + pagesize - 1)//pagesize, None)
             else:
                 offset = (page - 1) * pagesize                
@@ -285,33 +1154,336 @@ class PydbcTools:
                 
                 params['_offset_'] = offset
                 params['_pagesize_'] = pagesize
-                sql_wrap = sql + ' LIMIT :_pagesize_  OFFSET :_offset_ '
-                if self.getDbType() == "postgresql": # ("postgresql", "mysql", "sqlite", "clickhouse", "openGauss", "dm", "kingbase")
-                    sql_wrap = sql + ' LIMIT :_pagesize_  OFFSET :_offset_ '
-                elif self.getDbType() == "mysql":
-                    # sql_wrap = sql + ' LIMIT :_pagesize_  OFFSET :_offset_ '
-                    sql_wrap = sql + ' LIMIT :_offset_, :_pagesize_  '
-                elif self.getDbType() == "oracle":
-                    sql_wrap = f'SELECT * FROM (SELECT t.*, ROWNUM rn FROM ({sql}) t) WHERE rn BETWEEN :_offset_ + 1 AND :_offset_ + :_pagesize_ '
-                elif self.getDbType() == "mssql":
-                    sql_wrap = sql + ' OFFSET :_offset_ ROWS FETCH NEXT :_pagesize_ ROWS ONLY'
-                elif self.getDbType() == "hive":
-                    sql_wrap = f'SELECT * FROM (SELECT t.*, ROW_NUMBER() OVER (ORDER BY 1) AS rn FROM ({sql}) t) WHERE rn BETWEEN :_offset_ + 1 AND :_offset_ + :_pagesize_ '                                        
-                    
+                sql_wrap = self._page_sql(sql)
                 
-                list = self.queryMany(sql_wrap, params)
+                list = self.queryMany(sql_wrap, params, cache)
                         
-                return PageResult(total, pagesize, 1, (total + pagesize - 1)//pagesize, list)
+                return PageResult(total, pagesize, 1, (total + pagesize - 1)//pagesize if total >= 0 else -1, list)
+
+    _COUNT_MODES = ('exact', 'cached', 'estimate', 'none')
+
+    @classmethod
+    def _count_mode(cls, count:bool|str)->str:
+        if count is None:
+            return None
+        if count is True:
+            return 'exact'
+        if count is False:
+            return 'none'
+        if count not in cls._COUNT_MODES:
+            raise SQLAlchemyError(f'不支持的count方式{count}，可选{cls._COUNT_MODES}')
+        return count
+
+    @staticmethod
+    def _count_key(sql:str, params:dict)->tuple:
+        """count缓存的key，SQL空白归一化，忽略分页参数"""
+        items = sorted((k, repr(v)) for k, v in (params or {}).items() if k not in ('_offset_', '_pagesize_'))
+        return ' '.join(sql.split()), tuple(items)
+
+    def clearCountCache(self):
+        with self._count_cache_lock:
+            self._count_cache.clear()
+
+    def _count(self, sql, params:dict, mode:str, cache:bool|int=None)->int:
+        if mode == 'none':
+            return -1
+        if mode == 'cached':
+            key = self._count_key(sql, params)
+            with self._count_cache_lock:
+                total = self._count_cache.get(key)
+            if total is None:
+                total = self.queryCount(sql, params, cache)
+                with self._count_cache_lock:
+                    self._count_cache[key] = total
+            return total
+        if mode == 'estimate':
+            estimate_sql = self._estimate_sql(sql)
+            if estimate_sql:
+                try:
+                    return self._estimate_rows(self.queryMany(estimate_sql, params))
+                except Exception as e:
+                    _logger.WARN(f'估算总数失败，使用count(1)统计:{e}')
+        return self.queryCount(sql, params, cache)
+
+    def _estimate_sql(self, sql:str)->str:
+        """执行计划估算行数的SQL，postgresql使用EXPLAIN (FORMAT JSON)的Plan Rows(来自pg_class.reltuples统计)，mysql使用EXPLAIN的rows*filtered，
+        其他数据库返回None(使用count(1))"""
+        if self.getDbType() == "postgresql":
+            return f'EXPLAIN (FORMAT JSON) {sql}'
+        elif self.getDbType() in ("mysql", "mariadb"):
+            return f'EXPLAIN {sql}'
+        return None
+
+    def _estimate_rows(self, rows:list[dict])->int:
+        if self.getDbType() == "postgresql":
+            plan = next(iter(rows[0].values()))
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        total = 1.0
+        for one in rows:
+            if one.get('rows') is None:
+                continue
+            total *= float(one['rows']) * float(one.get('filtered') or 100) / 100
+        return int(total)
+
+    def queryStream(self, sql, params:dict=None, chunk_size:int=1000, chunked:bool=False):
+        """流式查询，使用服务端游标(stream_results/yield_per)按chunk_size分批获取，逐行返回dict，chunked=True时逐批返回list[dict]
+        迭代结束、提前break或者close时关闭游标并归还连接，在TX内迭代时使用当前事务Session"""
+        replica = self._read_replica()
+        if replica is not None:
+            with self._replicas.use(replica) as target:
+                yield from target.queryStream(sql, params, chunk_size, chunked)
+            return
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        options = {'stream_results': True, 'yield_per': chunk_size}
+        session = self._sessoin_factory.getSession()
+        if not session:
+            _logger.DEBUG('自省事务处理')
+            with self.engine.connect() as connection:
+                results = connection.execution_options(**options).execute(self._text(sql), params)
+                yield from self._stream_rows(results, chunked)
+        else:
+            _logger.DEBUG('事务管理器事务处理')
+            results = session.execute(self._text(sql), params, execution_options=options)
+            yield from self._stream_rows(results, chunked)
+
+    def queryRowsStream(self, sql, params:dict=None, chunk_size:int=1000):
+        """queryStream的Row元组版本，按chunk_size逐批返回(列名元组, 行元组列表)，不生成每行的dict，用于按列序号转换对象"""
+        replica = self._read_replica()
+        if replica is not None:
+            with self._replicas.use(replica) as target:
+                yield from target.queryRowsStream(sql, params, chunk_size)
+            return
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        options = {'stream_results': True, 'yield_per': chunk_size}
+        session = self._sessoin_factory.getSession()
+        if not session:
+            with self.engine.connect() as connection:
+                yield from self._stream_partitions(connection.execution_options(**options).execute(self._text(sql), params))
+        else:
+            yield from self._stream_partitions(session.execute(self._text(sql), params, execution_options=options))
+
+    @staticmethod
+    def _stream_partitions(results):
+        keys = tuple(results.keys())
+        try:
+            for partition in results.partitions():
+                yield keys, partition
+        finally:
+            results.close()
+
+    @staticmethod
+    def _stream_rows(results, chunked:bool):
+        try:
+            for partition in results.partitions():
+                if chunked:
+                    yield [one._asdict() for one in partition]
+                else:
+                    for one in partition:
+                        yield one._asdict()
+        finally:
+            results.close()
+
+    @_with_timeout
+    def queryColumns(self, sql, params:dict=None, dtypes:dict=None, chunk_size:int=10000)->dict[str, np.ndarray]:
+        """列式查询，按chunk_size分批从游标获取并直接转置到列数组，不生成每行的dict，返回{列名: numpy数组}"""
+        replica = self._read_replica()
+        if replica is not None:
+            return self._replica_read(replica, 'queryColumns', sql, params, dtypes, chunk_size)
+        columns = self._query_columns(sql, params, chunk_size)
+        dtypes = dtypes or {}
+        return {k: np.asarray(v, dtype=dtypes.get(k)) for k, v in columns.items()}
+
+    @_with_timeout
+    def queryFrame(self, sql, params:dict=None, dtypes:dict=None, chunk_size:int=10000, arrow:bool=False)->pd.DataFrame:
+        """列式查询直接返回DataFrame，驱动支持Arrow(oracledb)时使用驱动的Arrow批量获取，arrow=True时返回pyarrow存储的DataFrame"""
+        replica = self._read_replica()
+        if replica is not None:
+            return self._replica_read(replica, 'queryFrame', sql, params, dtypes, chunk_size, arrow)
+        table = self._query_arrow(sql, params, chunk_size)
+        if table is not None:
+            df = table.to_pandas(types_mapper=pd.ArrowDtype if arrow else None)
+        else:
+            columns = self._query_columns(sql, params, chunk_size)
+            if arrow:
+                import pyarrow
+                df = pyarrow.table(columns).to_pandas(types_mapper=pd.ArrowDtype)
+            else:
+                df = pd.DataFrame(columns, copy=False)
+        if dtypes:
+            df = df.astype(dtypes)
+        return df
+
+    def _query_columns(self, sql, params:dict, chunk_size:int)->dict[str, list]:
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        options = {'stream_results': True, 'yield_per': chunk_size}
+        session = self._sessoin_factory.getSession()
+        if not session:
+            _logger.DEBUG('自省事务处理')
+            with self.engine.connect() as connection:
+                return self._collect_columns(connection.execution_options(**options).execute(self._text(sql), params))
+        else:
+            _logger.DEBUG('事务管理器事务处理')
+            return self._collect_columns(session.execute(self._text(sql), params, execution_options=options))
+
+    @staticmethod
+    def _collect_columns(results)->dict[str, list]:
+        keys = list(results.keys())
+        columns = [[] for _ in keys]
+        try:
+            for partition in results.partitions():
+                for column, values in zip(columns, zip(*partition)):
+                    column.extend(values)
+        finally:
+            results.close()
+        return dict(zip(keys, columns))
+
+    def _query_arrow(self, sql, params:dict, chunk_size:int):
+        """驱动原生的Arrow获取，目前支持python-oracledb(fetch_df_all)，其他驱动返回None"""
+        if self.getDbType() != 'oracle' or importlib.util.find_spec('pyarrow') is None:
+            return None
+        import pyarrow
+        session = self._sessoin_factory.getSession()
+        connection = session.connection() if session else self.engine.connect()
+        try:
+            dbapi_conn = connection.connection.dbapi_connection
+            if not hasattr(dbapi_conn, 'fetch_df_all'):
+                return None
+            _logger.DEBUG(f"[SQL-ARROW]:{sql}")
+            table = pyarrow.table(dbapi_conn.fetch_df_all(statement=sql, parameters=params or {}, arraysize=chunk_size))
+            return table.rename_columns([self.engine.dialect.normalize_name(c) for c in table.column_names])
+        finally:
+            if not session:
+                connection.close()
+
+    def _page_sql(self, sql:str)->str:
+        sql_wrap = sql + ' LIMIT :_pagesize_  OFFSET :_offset_ '
+        if self.getDbType() == "postgresql": # ("postgresql", "mysql", "sqlite", "clickhouse", "openGauss", "dm", "kingbase")
+            sql_wrap = sql + ' LIMIT :_pagesize_  OFFSET :_offset_ '
+        elif self.getDbType() == "mysql":
+            # sql_wrap = sql + ' LIMIT :_pagesize_  OFFSET :_offset_ '
+            sql_wrap = sql + ' LIMIT :_offset_, :_pagesize_  '
+        elif self.getDbType() == "oracle":
+            sql_wrap = f'SELECT * FROM (SELECT t.*, ROWNUM rn FROM ({sql}) t) WHERE rn BETWEEN :_offset_ + 1 AND :_offset_ + :_pagesize_ '
+        elif self.getDbType() == "mssql":
+            sql_wrap = sql + ' OFFSET :_offset_ ROWS FETCH NEXT :_pagesize_ ROWS ONLY'
+        elif self.getDbType() == "hive":
+            sql_wrap = f'SELECT * FROM (SELECT t.*, ROW_NUMBER() OVER (ORDER BY 1) AS rn FROM ({sql}) t) WHERE rn BETWEEN :_offset_ + 1 AND :_offset_ + :_pagesize_ '
+        return sql_wrap
+
+    _KEYSET_COLUMN = re.compile(r'^\s*([A-Za-z_][\w.]*)(?:\s+(ASC|DESC))?\s*$', re.IGNORECASE)
+
+    @classmethod
+    def _keyset_keys(cls, order_by:list[str]|str)->list[tuple[str, bool]]:
+        """解析keyset排序列，返回[(列名, 是否DESC)]，带表前缀的列取列名部分(外层按子查询输出列引用)"""
+        if isinstance(order_by, str):
+            order_by = order_by.split(',')
+        keys = []
+        for one in order_by:
+            m = cls._KEYSET_COLUMN.match(one)
+            if not m:
+                raise SQLAlchemyError(f'keyset分页排序列{one}不合法，格式为"列名 [ASC|DESC]"')
+            keys.append((m.group(1).split('.')[-1], (m.group(2) or '').upper() == 'DESC'))
+        return keys
+
+    def _keyset_plan(self, params:dict, pagesize:int, order_by:list[str]|str, after:str, mode:str, page:int=1):
+        """keyset分页参数准备，返回(排序列, 游标值, 查询参数, 游标中的总数, 是否需要统计总数)
+        没有游标并且page>1时(直接跳页)按排序列OFFSET定位该页，返回的cursor可以继续keyset翻页"""
+        keys = self._keyset_keys(order_by)
+        token = _decode_cursor(after) if after else {}
+        values = token.get('k')
+        if values is not None and len(values) != len(keys):
+            raise SQLAlchemyError(f'keyset分页游标与排序列{order_by}不匹配')
+        kparams = dict(params or {})
+        for i, v in enumerate(values or []):
+            kparams[f'_k{i}_'] = v
+        kparams['_pagesize_'] = pagesize + 1  # 多取一行判断是否还有下一页
+        if values is None and page > 1:
+            kparams['_offset_'] = (page - 1) * pagesize
+        total = token.get('t', -1) if mode != 'none' else -1
+        need_count = mode != 'none' and (mode is not None or values is None)
+        return keys, values, kparams, total, need_count
+
+    # NULL按最大值排序(ASC时在最后)的数据库，其余数据库NULL按最小值排序
+    _NULLS_HIGH_DBTYPES = ('postgresql', 'oracle', 'openGauss', 'kingbase')
+
+    def _keyset_sql(self, sql:str, keys:list[tuple[str, bool]], values:list, offset:bool=False)->str:
+        where = ''
+        if values is not None:
+            dbtype = self.getDbType()
+            nulls_high = dbtype in self._NULLS_HIGH_DBTYPES
+            # 排序方向上NULL是否排在非NULL值之后
+            nulls_after = [nulls_high != desc for _, desc in keys]
+            if len(keys) > 1 and len({desc for _, desc in keys}) == 1 and dbtype in ('postgresql', 'mysql', 'sqlite') \
+                    and not any(nulls_after) and all(v is not None for v in values):
+                # 同向排序使用行值比较，可以直接走组合索引；NULL排在游标之前时行值比较的NULL结果正好排除这些行
+                cols = ', '.join(f't.{c}' for c, _ in keys)
+                binds = ', '.join(f':_k{i}_' for i in range(len(keys)))
+                where = f' WHERE ({cols}) {"<" if keys[0][1] else ">"} ({binds})'
+            else:
+                # 展开形式 a > :k0 OR (a = :k0 AND b > :k1) ...，oracle/mssql/hive不支持行值比较；
+                # 游标值为NULL或者NULL排在后面时使用IS NULL/IS NOT NULL分支，NULL和任何值比较都不成立
+                ors = []
+                for i, (c, desc) in enumerate(keys):
+                    ands = [f't.{keys[j][0]} IS NULL' if values[j] is None else f't.{keys[j][0]} = :_k{j}_' for j in range(i)]
+                    if values[i] is None:
+                        if nulls_after[i]:
+                            continue  # 游标已经在NULL中，该列上没有更后面的值
+                        ands.append(f't.{c} IS NOT NULL')
+                    elif nulls_after[i]:
+                        ands.append(f'(t.{c} {"<" if desc else ">"} :_k{i}_ OR t.{c} IS NULL)')
+                    else:
+                        ands.append(f't.{c} {"<" if desc else ">"} :_k{i}_')
+                    ors.append('(' + ' AND '.join(ands) + ')')
+                where = ' WHERE ' + (' OR '.join(ors) if ors else '1 = 0')
+        order = ', '.join(f't.{c} {"DESC" if desc else "ASC"}' for c, desc in keys)
+        sql_wrap = f'SELECT t.* FROM ({sql}) t{where} ORDER BY {order}'
+        if offset:
+            return self._page_sql(sql_wrap)
+        if self.getDbType() == "oracle":
+            sql_wrap = f'SELECT * FROM ({sql_wrap}) WHERE ROWNUM <= :_pagesize_ '
+        elif self.getDbType() == "mssql":
+            sql_wrap = sql_wrap + ' OFFSET 0 ROWS FETCH NEXT :_pagesize_ ROWS ONLY'
+        else:
+            sql_wrap = sql_wrap + ' LIMIT :_pagesize_ '
+        return sql_wrap
+
+    @staticmethod
+    def _keyset_result(list:list[dict], keys:list[tuple[str, bool]], pagesize:int, page:int, total:int)->PageResult:
+        cursor = None
+        if len(list) > pagesize:
+            last = [list[pagesize - 1][c] for c, _ in keys]
+            if last == [list[pagesize][c] for c, _ in keys]:
+                # 排序列值相同的行跨页时按游标翻页会丢掉后面的行
+                raise SQLAlchemyError(f'keyset分页排序列{[c for c, _ in keys]}的组合不唯一，请在order_by最后加上主键等唯一列')
+            list = list[:pagesize]
+            cursor = _encode_cursor({'k': last, 't': total})
+        totalPage = (total + pagesize - 1)//pagesize if total >= 0 else -1
+        return PageResult(total, pagesize, page if page > 0 else 1, totalPage, list, cursor)
 
-    def update(self, sql, params=None, autokey=None):
+    @_with_timeout
+    def update(self, sql, params=None, autokey=None, batch:bool=None):
+        """batch为True时(Mapper/UPDATE使用ExecutorType.BATCH)，或者当前事务Session使用BATCH方式时，事务中的语句排队，
+        返回-1，实际的更新行数由flushStatements返回；batch=False总是立即执行，autokey需要自增ID时也立即执行"""
         _logger.DEBUG(f"[SQL]:{sql}")
         _logger.DEBUG(f"[Parameter]:{params}")
         
-        if not self._sessoin_factory.getSession():
+        session = self._sessoin_factory.getSession()
+        queue = self._batch_queue(session, batch is True)
+        if queue is not None and queue.use(batch) and str_isEmpty(autokey):
+            if queue.add(sql, params):
+                queue.flush()
+            return -1
+
+        if not session:
             with self.engine.begin() as connection:
                 _logger.DEBUG('自省事务处理')
                 try:
-                    results = connection.execute(text(sql), params)                    
+                    results = connection.execute(self._text(sql), params)                    
                     connection.commit()    
                     if not str_isEmpty(autokey):
                         inserted_id = self._get_last_insert_id(connection, "", autokey)
@@ -326,17 +1498,19 @@ class PydbcTools:
             connection = self._sessoin_factory.getSession()
             _logger.DEBUG('事务管理器事务处理')
             try:
-                results = connection.execute(text(sql), params)                
+                results = connection.execute(self._text(sql), params)                
                 return results.rowcount
             except Exception as e:
                 _logger.ERROR("[Exception]", e)
                 raise e
             
-    def insert(self, sql, params=None, autokey:str=None):
-        return self.update(sql, params, autokey)
+    @_with_timeout
+    def insert(self, sql, params=None, autokey:str=None, batch:bool=None):
+        return self.update(sql, params, autokey, batch)
 
-    def delete(self, sql, params=None):
-        return self.update(sql, params)
+    @_with_timeout
+    def delete(self, sql, params=None, batch:bool=None):
+        return self.update(sql, params, batch=batch)
         
     def insertT(self, tablename:str, params:dict=None)->int:
         if not params:
@@ -349,40 +1523,15 @@ class PydbcTools:
             _logger.ERROR(f"无法获取表 {tablename} 的结构信息")
             return 0        
                 
-        columns_info = table_info['columns']
-        auto_increment_column = table_info['auto_increment_column']
-        
-        valided_data = {}
-        
-        for field_name, field_value in params.items():
-            if field_name in columns_info:
-                # 跳过自增主键（通常由数据库自动生成）
-                if field_name == auto_increment_column:
-                    continue
-                if _is_null(field_value):
-                    valided_data[field_name] = None
-                else:                
-                    valided_data[field_name] = field_value            
-        
-        if not valided_data:
-            _logger.ERROR("没有有效的字段可以插入")
+        sql, valided_data, auto_increment_column = self._build_insertT(tablename, table_info, params)
+        if sql is None:
             return 0
         
-        # 构建列名和值
-        quoted_columns = [self._quote_identifier(col) for col in valided_data.keys()]
-        columns = ', '.join(quoted_columns)
-        placeholders = ', '.join([f':{col}' for col in valided_data.keys()])
-        
-        # 构建 SQL 语句
-        sql = f'INSERT INTO {tablename} ({columns}) VALUES ({placeholders})'
-        _logger.DEBUG(f'SQL={sql}')
-        _logger.DEBUG(f'Paramters={valided_data}')
-        
         if not self._sessoin_factory.getSession():
             with self.engine.begin() as connection:
                 _logger.DEBUG('自省事务处理')
                 try:
-                    results = connection.execute(text(sql), valided_data)                    
+                    results = connection.execute(self._text(sql), valided_data)                    
                     # 获取自增长ID
                     inserted_id = None
                     if auto_increment_column:
@@ -400,7 +1549,7 @@ class PydbcTools:
             connection = self._sessoin_factory.getSession()
             _logger.DEBUG('事务管理器事务处理')
             try:
-                results = connection.execute(text(sql), valided_data)                    
+                results = connection.execute(self._text(sql), valided_data)                    
                 # 获取自增长ID
                 inserted_id = None
                 if auto_increment_column:
@@ -423,53 +1572,10 @@ class PydbcTools:
             _logger.ERROR(f"无法获取表 {tablename} 的结构信息")
             return 0        
                 
-        columns_info = table_info['columns']
-        
-        valided_data = {}
-        
-        for field_name, field_value in obj.items():
-            if field_name in columns_info:                
-                if _is_null(field_value):
-                    valided_data[field_name] = None                    
-                else:                
-                    valided_data[field_name] = field_value            
-        
-        if not valided_data:
-            _logger.ERROR("没有有效的字段可以更新")
+        sql, sql_params = self._build_updateT2(tablename, table_info, obj, where)
+        if sql is None:
             return 0
         
-        # 构建列名和值
-        quoted_columns_placeholders = [f'{self._quote_identifier(col)}=:{INNER_UPDATE_PLACEHOLDER}{col}' for col in valided_data.keys()]
-        columns = ', '.join(quoted_columns_placeholders)         
-        
-        sql_params = {}
-        for field_name, field_value in valided_data.items():
-            sql_params[f'{INNER_UPDATE_PLACEHOLDER}{field_name}'] = field_value
-        
-        sql_params.update(where)
-                    
-        where_sql = ''
-        
-        where_data = {}
-        for field_name, field_value in where.items():
-            if field_name in columns_info:                
-                if _is_null(field_value):
-                    where_data[field_name] = None                    
-                else:                
-                    where_data[field_name] = field_value  
-        
-        if where_data:
-            where_columns_placeholders = [f'{self._quote_identifier(col)}=:{col}' for col in where_data.keys()]
-            where_sql = ' AND '.join(where_columns_placeholders)
-                
-        if not str_isEmpty(where_sql):
-            where_sql = ' WHERE ' + where_sql
-        
-        # 构建 SQL 语句
-        sql = f'UPDATE {tablename} SET {columns} {where_sql}'
-        _logger.DEBUG(f'SQL={sql}')
-        _logger.DEBUG(f'Paramters={sql_params}')
-        
         # with self.engine.begin() as connection:
         #     try:
         #         results = connection.execute(text(sql), sql_params)
@@ -494,6 +1600,329 @@ class PydbcTools:
             _logger.ERROR(f"无法获取表 {tablename} 的结构信息")
             return 0        
                 
+        sql, sql_params = self._build_updateT(tablename, table_info, obj, condiftion, sql)
+        if sql is None:
+            return 0
+        
+        # with self.engine.begin() as connection:
+        #     try:
+        #         results = connection.execute(text(sql), sql_params)
+                
+        #         connection.commit()
+        #         return results.rowcount
+        #     except Exception as e:
+        #         connection.rollback()
+        #         _logger.ERROR("[Exception]", e)
+        #         raise e
+        
+        return self.update(sql, sql_params) 
+    
+    def deleteT(self, tablename:str, condiftion:dict=None, sql:SimpleExpression=None):
+        
+        # 获取表结构信息
+        table_info = self.get_table_info(tablename)
+        if not table_info:
+            _logger.ERROR(f"无法获取表 {tablename} 的结构信息")
+            return 0        
+                
+        sql, sql_params = self._build_deleteT(tablename, table_info, condiftion, sql)
+        
+        # with self.engine.begin() as connection:
+        #     try:
+        #         results = connection.execute(text(sql), sql_params)
+                
+        #         connection.commit()
+        #         return results.rowcount
+        #     except Exception as e:
+        #         connection.rollback()
+        #         _logger.ERROR("[Exception]", e)
+        #         raise e
+                
+        return self.update(sql, sql_params) 
+    
+    def insertManyT(self, tablename:str, rows:Iterable[dict], batchsize:int=1000)->int:
+        """批量insertT，表结构只取一次，按行的字段组合分组，每组按batchsize生成多行INSERT ... VALUES
+        自增长主键回填到每行dict：postgresql/sqlite/mariadb使用RETURNING，mssql使用OUTPUT，oracle使用executemany不回填；
+        mysql按LAST_INSERT_ID()和auto_increment_increment步长推算，只在ID连续分配时正确，innodb_autoinc_lock_mode=2(mysql8默认)时多行不回填"""
+        plans = self._plan_manyT(tablename, self.get_table_info(tablename), rows, batchsize)
+        return self._run_manyT(plans)
+
+    def upsertManyT(self, tablename:str, rows:Iterable[dict], conflict_cols:list[str]=None, update_cols:list[str]=None, batchsize:int=1000)->int:
+        """批量插入，冲突时更新：mysql ON DUPLICATE KEY UPDATE，postgresql/sqlite ON CONFLICT DO UPDATE，oracle/mssql MERGE
+        conflict_cols缺省为主键，update_cols缺省为冲突列以外的全部字段"""
+        plans = self._plan_manyT(tablename, self.get_table_info(tablename), rows, batchsize, conflict_cols, update_cols, upsert=True)
+        return self._run_manyT(plans)
+
+    def _run_manyT(self, plans:list[tuple])->int:
+        if not plans:
+            return 0
+        if not self._sessoin_factory.getSession():
+            with self.engine.begin() as connection:
+                _logger.DEBUG('自省事务处理')
+                try:
+                    total = 0
+                    for plan in plans:
+                        total += self._apply_manyT(connection, plan, connection.execute(self._text(plan[0]), plan[1]))
+                    connection.commit()
+                    return total
+                except Exception as e:
+                    connection.rollback()
+                    _logger.ERROR("[Exception]", e)
+                    raise e
+        else:
+            connection = self._sessoin_factory.getSession()
+            _logger.DEBUG('事务管理器事务处理')
+            try:
+                total = 0
+                for plan in plans:
+                    total += self._apply_manyT(connection, plan, connection.execute(self._text(plan[0]), plan[1]))
+                return total
+            except Exception as e:
+                _logger.ERROR("[Exception]", e)
+                raise e
+
+    def _apply_manyT(self, connection, plan:tuple, results)->int:
+        """回填自增长主键，返回影响行数"""
+        sql, params, chunk, auto_increment_column, returning = plan
+        if returning == 'returning':
+            ids = [one[0] for one in results.fetchall()]
+            if len(ids) == len(chunk):
+                for row, id in zip(chunk, ids):
+                    row[auto_increment_column] = id
+            return len(ids) if results.rowcount < 0 else results.rowcount
+        if returning == 'lastid':
+            self._backfill_lastid(chunk, auto_increment_column, connection.execute(self._text(self._LASTID_SQL)).first())
+        return results.rowcount
+
+    # mysql多行INSERT的第一个自增长ID，以及计算后续ID需要的步长和innodb自增锁模式
+    _LASTID_SQL = 'SELECT LAST_INSERT_ID(), @@auto_increment_increment, @@innodb_autoinc_lock_mode'
+
+    @staticmethod
+    def _backfill_lastid(chunk:list[dict], auto_increment_column:str, row:tuple):
+        """按LAST_INSERT_ID()和auto_increment_increment步长回填；innodb_autoinc_lock_mode=2(交错，mysql8默认)时
+        同一语句的ID在并发插入下不保证连续，多行时不回填"""
+        first, increment, lock_mode = row
+        if not first:
+            return
+        if len(chunk) > 1 and int(lock_mode or 0) == 2:
+            _logger.WARN(f'innodb_autoinc_lock_mode=2时多行INSERT的自增长ID不保证连续，不回填{auto_increment_column}')
+            return
+        for i, one in enumerate(chunk):
+            one[auto_increment_column] = first + i * int(increment or 1)
+
+    _MAX_BINDS = {'sqlite': 32766, 'mssql': 2000, 'postgresql': 32767, 'mysql': 32767, 'mariadb': 32767}
+
+    def _plan_manyT(self, tablename:str, table_info:dict, rows:Iterable[dict], batchsize:int, conflict_cols:list[str]=None, update_cols:list[str]=None, upsert:bool=False)->list[tuple]:
+        """按字段组合分组并分块，返回[(sql, 参数, 行, 自增长字段, 回填方式)]"""
+        if not table_info:
+            _logger.ERROR(f"无法获取表 {tablename} 的结构信息")
+            return []
+        columns_info = table_info['columns']
+        auto_increment_column = table_info['auto_increment_column']
+        if upsert:
+            conflict_cols = conflict_cols or table_info['primary_keys']
+            if not conflict_cols:
+                raise SQLAlchemyError(f'表{tablename}没有主键，upsertManyT需要指定conflict_cols')
+            if self.getDbType() not in ('mysql', 'mariadb', 'postgresql', 'sqlite', 'oracle', 'mssql'):
+                raise SQLAlchemyError(f'数据库{self.getDbType()}不支持upsertManyT')
+
+        signatures = {}
+        groups:dict[tuple, list[dict]] = {}
+        for row in rows:
+            signature = tuple(row.keys())
+            columns = signatures.get(signature)
+            if columns is None:
+                # 每种字段组合只过滤一次
+                columns = tuple(c for c in signature if c in columns_info and (upsert or c != auto_increment_column))
+                signatures[signature] = columns
+            if not columns:
+                _logger.WARN(f"没有有效的字段可以插入:{row}")
+                continue
+            groups.setdefault(columns, []).append(row)
+
+        plans = []
+        for columns, group in groups.items():
+            if upsert:
+                group = self._dedup_upsert(group, conflict_cols)
+            size = max(1, min(batchsize, self._MAX_BINDS.get(self.getDbType(), 30000) // len(columns)))
+            for i in range(0, len(group), size):
+                chunk = group[i:i+size]
+                if upsert:
+                    plans.append(self._build_upsertManyT(tablename, columns, chunk, auto_increment_column, conflict_cols, update_cols))
+                else:
+                    plans.append(self._build_insertManyT(tablename, columns, chunk, auto_increment_column))
+        return plans
+
+    @staticmethod
+    def _dedup_upsert(group:list[dict], conflict_cols:list[str])->list[dict]:
+        """同一语句中冲突列值相同的行只保留最后一行，postgresql的ON CONFLICT DO UPDATE不能更新同一行两次，MERGE同样不允许；
+        冲突列有NULL的行不会冲突，原样保留"""
+        rows = {}
+        for i, row in enumerate(group):
+            key = tuple(row.get(c) for c in conflict_cols)
+            if any(v is None or _is_null(v) for v in key):
+                key = (None, i, None)   # 不参与去重
+            rows.pop(key, None)
+            rows[key] = row
+        return list(rows.values())
+
+    @staticmethod
+    def _many_params(columns:tuple, chunk:list[dict], multi:bool):
+        """multi=True时多行VALUES的参数dict(:p行_列)，否则executemany的参数list"""
+        if multi:
+            return {f'p{i}_{j}': None if _is_null(row[c]) else row[c] for i, row in enumerate(chunk) for j, c in enumerate(columns)}
+        return [{f'p{j}': None if _is_null(row[c]) else row[c] for j, c in enumerate(columns)} for row in chunk]
+
+    @staticmethod
+    def _many_values(columns:tuple, count:int)->str:
+        return ', '.join('(' + ', '.join(f':p{i}_{j}' for j in range(len(columns))) + ')' for i in range(count))
+
+    def _build_insertManyT(self, tablename:str, columns:tuple, chunk:list[dict], auto_increment_column:str)->tuple:
+        quoted = ', '.join(self._quote_identifier(c) for c in columns)
+        db_type = self.getDbType()
+        if db_type == 'oracle':
+            # oracle使用executemany数组绑定
+            sql = f'INSERT INTO {tablename} ({quoted}) VALUES (' + ', '.join(f':p{j}' for j in range(len(columns))) + ')'
+            return sql, self._many_params(columns, chunk, False), chunk, auto_increment_column, None
+
+        values = self._many_values(columns, len(chunk))
+        returning = None
+        if not auto_increment_column:
+            sql = f'INSERT INTO {tablename} ({quoted}) VALUES {values}'
+        elif db_type == 'mssql':
+            sql = f'INSERT INTO {tablename} ({quoted}) OUTPUT INSERTED.{self._quote_identifier(auto_increment_column)} VALUES {values}'
+            returning = 'returning'
+        elif self.engine.dialect.insert_returning and db_type in ('postgresql', 'sqlite', 'mysql', 'mariadb'):
+            sql = f'INSERT INTO {tablename} ({quoted}) VALUES {values} RETURNING {self._quote_identifier(auto_increment_column)}'
+            returning = 'returning'
+        else:
+            sql = f'INSERT INTO {tablename} ({quoted}) VALUES {values}'
+            returning = 'lastid' if db_type in ('mysql', 'mariadb') else None
+        return sql, self._many_params(columns, chunk, True), chunk, auto_increment_column, returning
+
+    def _build_upsertManyT(self, tablename:str, columns:tuple, chunk:list[dict], auto_increment_column:str, conflict_cols:list[str], update_cols:list[str])->tuple:
+        q = self._quote_identifier
+        if update_cols is None:
+            updates = [c for c in columns if c not in conflict_cols and c != auto_increment_column]
+        else:
+            updates = [c for c in update_cols if c in columns and c not in conflict_cols]
+        db_type = self.getDbType()
+
+        if db_type in ('oracle', 'mssql'):
+            inserts = [c for c in columns if c != auto_increment_column]  # 自增长(identity)字段不能显式插入
+            on = ' AND '.join(f't.{q(c)} = s.{q(c)}' for c in conflict_cols)
+            merge = f' ON ({on})'
+            if updates:
+                merge += ' WHEN MATCHED THEN UPDATE SET ' + ', '.join(f't.{q(c)} = s.{q(c)}' for c in updates)
+            merge += f' WHEN NOT MATCHED THEN INSERT ({", ".join(q(c) for c in inserts)}) VALUES ({", ".join(f"s.{q(c)}" for c in inserts)})'
+            if db_type == 'oracle':
+                using = ', '.join(f':p{j} AS {q(c)}' for j, c in enumerate(columns))
+                sql = f'MERGE INTO {tablename} t USING (SELECT {using} FROM DUAL) s' + merge
+                return sql, self._many_params(columns, chunk, False), chunk, auto_increment_column, None
+            sql = (f'MERGE INTO {tablename} WITH (HOLDLOCK) AS t USING (VALUES {self._many_values(columns, len(chunk))}) '
+                   f'AS s ({", ".join(q(c) for c in columns)})' + merge + ';')
+            return sql, self._many_params(columns, chunk, True), chunk, auto_increment_column, None
+
+        sql = f'INSERT INTO {tablename} ({", ".join(q(c) for c in columns)}) VALUES {self._many_values(columns, len(chunk))}'
+        returning = None
+        if db_type in ('mysql', 'mariadb'):
+            if updates:
+                sql += ' ON DUPLICATE KEY UPDATE ' + ', '.join(f'{q(c)} = VALUES({q(c)})' for c in updates)
+            else:
+                sql += f' ON DUPLICATE KEY UPDATE {q(columns[0])} = {q(columns[0])}'
+        else:
+            sql += f' ON CONFLICT ({", ".join(q(c) for c in conflict_cols)})'
+            if updates:
+                sql += ' DO UPDATE SET ' + ', '.join(f'{q(c)} = EXCLUDED.{q(c)}' for c in updates)
+                if auto_increment_column and self.engine.dialect.insert_returning:
+                    sql += f' RETURNING {q(auto_increment_column)}'
+                    returning = 'returning'
+            else:
+                sql += ' DO NOTHING'
+        return sql, self._many_params(columns, chunk, True), chunk, auto_increment_column, returning
+
+    def _build_insertT(self, tablename:str, table_info:dict, params:dict)->tuple[str, dict, str]:
+        columns_info = table_info['columns']
+        auto_increment_column = table_info['auto_increment_column']
+        
+        valided_data = {}
+        
+        for field_name, field_value in params.items():
+            if field_name in columns_info:
+                # 跳过自增主键（通常由数据库自动生成）
+                if field_name == auto_increment_column:
+                    continue
+                if _is_null(field_value):
+                    valided_data[field_name] = None
+                else:                
+                    valided_data[field_name] = field_value            
+        
+        if not valided_data:
+            _logger.ERROR("没有有效的字段可以插入")
+            return None, None, None
+        
+        # 构建列名和值
+        quoted_columns = [self._quote_identifier(col) for col in valided_data.keys()]
+        columns = ', '.join(quoted_columns)
+        placeholders = ', '.join([f':{col}' for col in valided_data.keys()])
+        
+        # 构建 SQL 语句
+        sql = f'INSERT INTO {tablename} ({columns}) VALUES ({placeholders})'
+        _logger.DEBUG(f'SQL={sql}')
+        _logger.DEBUG(f'Paramters={valided_data}')
+        
+        return sql, valided_data, auto_increment_column
+
+    def _build_updateT2(self, tablename:str, table_info:dict, obj:dict, where:dict)->tuple[str, dict]:
+        columns_info = table_info['columns']
+        
+        valided_data = {}
+        
+        for field_name, field_value in obj.items():
+            if field_name in columns_info:                
+                if _is_null(field_value):
+                    valided_data[field_name] = None                    
+                else:                
+                    valided_data[field_name] = field_value            
+        
+        if not valided_data:
+            _logger.ERROR("没有有效的字段可以更新")
+            return None, None
+        
+        # 构建列名和值
+        quoted_columns_placeholders = [f'{self._quote_identifier(col)}=:{INNER_UPDATE_PLACEHOLDER}{col}' for col in valided_data.keys()]
+        columns = ', '.join(quoted_columns_placeholders)         
+        
+        sql_params = {}
+        for field_name, field_value in valided_data.items():
+            sql_params[f'{INNER_UPDATE_PLACEHOLDER}{field_name}'] = field_value
+        
+        sql_params.update(where)
+                    
+        where_sql = ''
+        
+        where_data = {}
+        for field_name, field_value in where.items():
+            if field_name in columns_info:                
+                if _is_null(field_value):
+                    where_data[field_name] = None                    
+                else:                
+                    where_data[field_name] = field_value  
+        
+        if where_data:
+            where_columns_placeholders = [f'{self._quote_identifier(col)}=:{col}' for col in where_data.keys()]
+            where_sql = ' AND '.join(where_columns_placeholders)
+                
+        if not str_isEmpty(where_sql):
+            where_sql = ' WHERE ' + where_sql
+        
+        # 构建 SQL 语句
+        sql = f'UPDATE {tablename} SET {columns} {where_sql}'
+        _logger.DEBUG(f'SQL={sql}')
+        _logger.DEBUG(f'Paramters={sql_params}')
+        return sql, sql_params
+
+    def _build_updateT(self, tablename:str, table_info:dict, obj:dict, condiftion:dict, sql:SimpleExpression)->tuple[str, dict]:
         columns_info = table_info['columns']
         
         valided_data = {}        
@@ -508,7 +1937,7 @@ class PydbcTools:
         
         if not valided_data:
             _logger.ERROR("没有有效的字段可以更新")
-            return 0
+            return None, None
         
         # 构建列名和值
         quoted_columns_placeholders = [f'{self._quote_identifier(col)}=:{INNER_UPDATE_PLACEHOLDER}{col}' for col in valided_data.keys()]
@@ -551,28 +1980,9 @@ class PydbcTools:
         sql = f'UPDATE {tablename} SET {columns} {where_sql}'
         _logger.DEBUG(f'SQL={sql}')
         _logger.DEBUG(f'Paramters={sql_params}')
-        
-        # with self.engine.begin() as connection:
-        #     try:
-        #         results = connection.execute(text(sql), sql_params)
-                
-        #         connection.commit()
-        #         return results.rowcount
-        #     except Exception as e:
-        #         connection.rollback()
-        #         _logger.ERROR("[Exception]", e)
-        #         raise e
-        
-        return self.update(sql, sql_params) 
-    
-    def deleteT(self, tablename:str, condiftion:dict=None, sql:SimpleExpression=None):
-        
-        # 获取表结构信息
-        table_info = self.get_table_info(tablename)
-        if not table_info:
-            _logger.ERROR(f"无法获取表 {tablename} 的结构信息")
-            return 0        
-                
+        return sql, sql_params
+
+    def _build_deleteT(self, tablename:str, table_info:dict, condiftion:dict, sql:SimpleExpression)->tuple[str, dict]:
         columns_info = table_info['columns']
         sql_params = {}
         condiftion_data = {}
@@ -604,61 +2014,64 @@ class PydbcTools:
         sql = f'delete from {tablename} {where_sql}'
         _logger.DEBUG(f'SQL={sql}')
         _logger.DEBUG(f'Paramters={sql_params}')
+        return sql, sql_params
+
+    def _last_insert_id_sql(self, table_name: str, auto_increment_column: str) -> Optional[str]:
+        """获取最后插入的自增长ID的SQL"""
+        db_type = self.getDbType()
         
-        # with self.engine.begin() as connection:
-        #     try:
-        #         results = connection.execute(text(sql), sql_params)
-                
-        #         connection.commit()
-        #         return results.rowcount
-        #     except Exception as e:
-        #         connection.rollback()
-        #         _logger.ERROR("[Exception]", e)
-        #         raise e
-                
-        return self.update(sql, sql_params) 
+        if db_type in ("mysql", "mariadb"):
+            # MySQL 使用 LAST_INSERT_ID()
+            return "SELECT LAST_INSERT_ID()"
+        
+        elif db_type == "postgresql":
+            # PostgreSQL 使用 RETURNING 子句或 currval
+            # 这里我们使用 currval，需要知道序列名
+            # 注意：这需要序列名遵循命名约定
+            sequence_name = f"{table_name}_{auto_increment_column}_seq"
+            return f"SELECT currval('{sequence_name}')"
+        
+        elif db_type == "sqlite":
+            # SQLite 使用 last_insert_rowid()
+            return "SELECT last_insert_rowid()"
+        
+        elif db_type == "mssql":
+            # SQL Server 使用 SCOPE_IDENTITY()
+            return "SELECT SCOPE_IDENTITY()"
+        
+        elif db_type == "oracle":
+            # Oracle 使用 RETURNING 子句，但这里我们使用序列的 currval
+            # 注意：这需要知道序列名
+            sequence_name = f"SEQ_{table_name}"
+            return f"SELECT {sequence_name}.CURRVAL FROM DUAL"
+        
+        else:
+            # 其他数据库的通用方法
+            _logger.WARN(f"数据库{db_type}的自增长ID获取方法未实现")
+            return None
     
     def _get_last_insert_id(self, connection, table_name: str, 
                            auto_increment_column: str) -> Optional[Any]:
         """获取最后插入的自增长ID"""        
-        db_type = self.getDbType()
-        
         try:
-            if db_type == "mysql":
-                # MySQL 使用 LAST_INSERT_ID()
-                result = connection.execute(text("SELECT LAST_INSERT_ID()"))
-                return result.scalar()
-            
-            elif db_type == "postgresql":
-                # PostgreSQL 使用 RETURNING 子句或 currval
-                # 这里我们使用 currval，需要知道序列名
-                # 注意：这需要序列名遵循命名约定
-                sequence_name = f"{table_name}_{auto_increment_column}_seq"
-                result = connection.execute(text(f"SELECT currval('{sequence_name}')"))
-                return result.scalar()
-            
-            elif db_type == "sqlite":
-                # SQLite 使用 last_insert_rowid()
-                result = connection.execute(text("SELECT last_insert_rowid()"))
-                return result.scalar()
-            
-            elif db_type == "mssql":
-                # SQL Server 使用 SCOPE_IDENTITY()
-                result = connection.execute(text("SELECT SCOPE_IDENTITY()"))
-                return result.scalar()
-            
-            elif db_type == "oracle":
-                # Oracle 使用 RETURNING 子句，但这里我们使用序列的 currval
-                # 注意：这需要知道序列名
-                sequence_name = f"SEQ_{table_name}"
-                result = connection.execute(text(f"SELECT {sequence_name}.CURRVAL FROM DUAL"))
-                return result.scalar()
-            
-            else:
-                # 其他数据库的通用方法
-                _logger.WARN(f"数据库{db_type}的自增长ID获取方法未实现")
+            sql = self._last_insert_id_sql(table_name, auto_increment_column)
+            if sql is None:
                 return None
-                
+            result = connection.execute(self._text(sql))
+            return result.scalar()
+        except Exception as e:
+            _logger.WARN(f"获取自增长ID失败: {e}")
+            return None
+    
+    async def _aget_last_insert_id(self, connection, table_name: str, 
+                           auto_increment_column: str) -> Optional[Any]:
+        """异步获取最后插入的自增长ID"""        
+        try:
+            sql = self._last_insert_id_sql(table_name, auto_increment_column)
+            if sql is None:
+                return None
+            result = await connection.execute(self._text(sql))
+            return result.scalar()
         except Exception as e:
             _logger.WARN(f"获取自增长ID失败: {e}")
             return None
@@ -667,7 +2080,7 @@ class PydbcTools:
         """根据数据库类型引用标识符"""
         # 大多数数据库使用双引号，但有些数据库使用其他符号
         db_type = self.getDbType()
-        if db_type in ['mysql', 'sqlite']:
+        if db_type in ['mysql', 'mariadb', 'sqlite']:
             return f"`{identifier}`"
         elif db_type in ['mssql']:
             return f"[{identifier}]"
@@ -693,43 +2106,28 @@ class PydbcTools:
         try:            
             # 使用 SQLAlchemy 的 inspect 功能获取表结构
             inspector = inspect(engine)
+            table_info = self._reflect_table_info(inspector, table_name)
             
-            arr = table_name.split('.')
-            if len(arr) == 1:
-                infos = inspector.get_columns(table_name)
-            else:
-                infos = inspector.get_columns(arr[1], arr[0])
-            # 获取列信息
-            columns_info = {}
-            
-            
-            for column in infos:
-                col_name = column['name']
-                columns_info[col_name] = {
-                    'type': str(column['type']),
-                    'nullable': column['nullable'],
-                    'default': column['default'],
-                    'autoincrement': column.get('autoincrement', False),
-                    'primary_key': False
-                }
-            
-            # 获取主键信息
-            
-            if len(arr) == 1:
-                primary_keys = inspector.get_pk_constraint(table_name)
-            else:
-                primary_keys = inspector.get_pk_constraint(arr[1], arr[0])
-                
-            if primary_keys and 'constrained_columns' in primary_keys:
-                for pk_col in primary_keys['constrained_columns']:
-                    if pk_col in columns_info:
-                        columns_info[pk_col]['primary_key'] = True
+            # 缓存表信息
+            self._table_cache[cache_key] = table_info
+            _logger.DEBUG(f'缓存{table_name}表信息到Cache={table_info}')
+            return table_info
             
-            table_info = {
-                'columns': columns_info,
-                'primary_keys': primary_keys.get('constrained_columns', []) if primary_keys else [],
-                'auto_increment_column': self._find_auto_increment_column(columns_info)
-            }
+        except SQLAlchemyError as e:
+            _logger.ERROR(f"获取表结构失败: {e}")
+            raise e
+    
+    async def aget_table_info(self, table_name: str, **kwargs) -> Dict[str, Any]:
+        """异步获取表的字段信息，和get_table_info共用缓存"""        
+        cache_key = table_name
+        
+        if cache_key in self._table_cache:
+            _logger.DEBUG(f'从Cache里找到{table_name}表信息')
+            return self._table_cache[cache_key]
+        
+        try:            
+            async with self.getAsyncEngine().connect() as connection:
+                table_info = await connection.run_sync(lambda conn: self._reflect_table_info(inspect(conn), table_name))
             
             # 缓存表信息
             self._table_cache[cache_key] = table_info
@@ -740,66 +2138,773 @@ class PydbcTools:
             _logger.ERROR(f"获取表结构失败: {e}")
             raise e
     
-    def batch(self, sql, paramsList:list[dict|tuple]=None, batchsize:int=100):
+    def _reflect_table_info(self, inspector, table_name: str) -> Dict[str, Any]:
+        arr = table_name.split('.')
+        if len(arr) == 1:
+            infos = inspector.get_columns(table_name)
+        else:
+            infos = inspector.get_columns(arr[1], arr[0])
+        
+        # 获取主键信息
+        
+        if len(arr) == 1:
+            primary_keys = inspector.get_pk_constraint(table_name)
+        else:
+            primary_keys = inspector.get_pk_constraint(arr[1], arr[0])
+        return self._build_table_info(infos, primary_keys)
+
+    def _build_table_info(self, infos:list[dict], primary_keys:dict) -> Dict[str, Any]:
+        # 获取列信息
+        columns_info = {}
+        
+        
+        for column in infos:
+            col_name = column['name']
+            columns_info[col_name] = {
+                'type': str(column['type']),
+                'nullable': column['nullable'],
+                'default': column['default'],
+                'autoincrement': column.get('autoincrement', False),
+                'primary_key': False
+            }
+            
+        if primary_keys and 'constrained_columns' in primary_keys:
+            for pk_col in primary_keys['constrained_columns']:
+                if pk_col in columns_info:
+                    columns_info[pk_col]['primary_key'] = True
+        
+        table_info = {
+            'columns': columns_info,
+            'primary_keys': primary_keys.get('constrained_columns', []) if primary_keys else [],
+            'auto_increment_column': self._find_auto_increment_column(columns_info)
+        }
+        return table_info
+    
+    def warmTableCache(self, schema:str=None, tables:list[str]=None)->int:
+        """一次inspector批量反射schema下全部表(或者tables指定的表)的字段和主键，放入get_table_info的缓存，返回表数量
+        schema为空时为默认schema，缓存key为表名；指定schema时同时缓存schema.表名"""
+        start = time.perf_counter()
+        names = [one.split('.')[-1] for one in tables] if tables else None
+        inspector = inspect(self.engine)
+        columns = inspector.get_multi_columns(schema=schema, filter_names=names)
+        primary_keys = inspector.get_multi_pk_constraint(schema=schema, filter_names=names)
+        for (owner, name), infos in columns.items():
+            table_info = self._build_table_info(infos, primary_keys.get((owner, name)))
+            if schema is None:
+                self._table_cache[name] = table_info
+            else:
+                self._table_cache[f'{schema}.{name}'] = table_info
+                if schema == inspector.default_schema_name:
+                    self._table_cache[name] = table_info
+        _logger.INFO(f'预加载{self.engine.url.database}表结构{len(columns)}个，耗时{(time.perf_counter() - start)*1000:.1f}ms')
+        return len(columns)
+
+    def getSchemaVersion(self, schema:str=None)->str|None:
+        """表结构版本，DDL后改变；数据库不支持时返回None"""
+        sql = _SCHEMA_VERSION_SQL.get(self.getDbType())
+        if sql is None:
+            return None
+        with self.engine.connect() as connection:
+            statement = self._text(sql)
+            row = connection.execute(statement, {'schema': schema} if statement._bindparams else {}).fetchone()
+            return None if row is None or row[0] is None else str(row[0])
+
+    def _table_cache_file(self, schema:str=None)->str:
+        config = self.__config__.get('table_cache')
+        config = config if isinstance(config, dict) else {}
+        path = config.get('path') or os.path.join('.cache', 'pydbc')
+        key = hashlib.sha1(f'{self.engine.url.render_as_string(hide_password=True)}|{schema or ""}'.encode()).hexdigest()[:16]
+        return os.path.join(path, f'tables-{key}.json')
+
+    def _init_table_cache(self):
+        """table_cache配置{path, schema, tables, check_ddl}，启动时读取本地缓存文件，表结构版本一致时直接使用，
+        否则批量反射后写入缓存文件，多个worker和重启后共用；check_ddl=false时不比较版本，只能通过clearTableCache失效"""
+        config = self.__config__.get('table_cache')
+        config = config if isinstance(config, dict) else {}
+        schema = config.get('schema')
+        tables = config.get('tables')
+        check = config.get('check_ddl', True)
+        self._listen_ddl()
+        try:
+            version = self.getSchemaVersion(schema) if check else None
+            if self._load_table_cache(schema, version, check):
+                return
+            self.warmTableCache(schema, tables)
+            self._save_table_cache(schema, version)
+        except Exception as e:
+            _logger.WARN(f'预加载表结构失败，使用时再获取:{e}')
+
+    def _load_table_cache(self, schema:str, version:str|None, check:bool)->bool:
+        file = self._table_cache_file(schema)
+        if not os.path.exists(file):
+            return False
+        try:
+            with open(file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            _logger.WARN(f'读取表结构缓存文件{file}失败:{e}')
+            return False
+        if check and (version is None or data.get('version') != version):
+            _logger.INFO(f'表结构版本变化{data.get("version")}->{version}，重新加载表结构')
+            return False
+        self._table_cache.update(data.get('tables', {}))
+        _logger.INFO(f'从{file}加载表结构{len(data.get("tables", {}))}个')
+        return True
+
+    def _save_table_cache(self, schema:str, version:str|None):
+        file = self._table_cache_file(schema)
+        try:
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            tmp = f'{file}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'url': self.engine.url.render_as_string(hide_password=True), 'schema': schema,
+                           'version': version, 'tables': dict(self._table_cache.items())}, f, ensure_ascii=False, default=str)
+            os.replace(tmp, file)   # 多个worker同时写时保证文件完整
+        except OSError as e:
+            _logger.WARN(f'写入表结构缓存文件{file}失败:{e}')
+
+    def _listen_ddl(self):
+        """通过本数据源执行的DDL失效对应表的缓存和缓存文件"""
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            m = _DDL_TABLE.match(statement)
+            if m:
+                self.clearTableCache([re.sub(r'[`"\[\]]', '', m.group(1))])
+
+        event.listen(self.engine, 'after_cursor_execute', after_cursor_execute)
+
+    def clearTableCache(self, tables:list[str]=None):
+        """失效表结构缓存，tables为空时清除全部；同时删除持久化的缓存文件，下次启动重新加载"""
+        if tables:
+            for one in tables:
+                for key in [k for k in self._table_cache.keys() if k == one or k.split('.')[-1] == one.split('.')[-1]]:
+                    self._table_cache.pop(key, None)
+        else:
+            self._table_cache.clear()
+        if self.__config__.get('table_cache'):
+            config = self.__config__['table_cache']
+            file = self._table_cache_file(config.get('schema') if isinstance(config, dict) else None)
+            if os.path.exists(file):
+                try:
+                    os.remove(file)
+                except OSError as e:
+                    _logger.WARN(f'删除表结构缓存文件{file}失败:{e}')
+        _logger.INFO(f'失效表结构缓存{tables or "全部"}')
+
+    def checkTableCache(self)->bool:
+        """比较表结构版本，变化时重新批量加载并写入缓存文件，返回是否重新加载"""
+        config = self.__config__.get('table_cache')
+        config = config if isinstance(config, dict) else {}
+        schema = config.get('schema')
+        file = self._table_cache_file(schema)
+        version = self.getSchemaVersion(schema)
+        saved = None
+        if os.path.exists(file):
+            with open(file, 'r', encoding='utf-8') as f:
+                saved = json.load(f).get('version')
+        if version is not None and version == saved:
+            return False
+        self._table_cache.clear()
+        self.warmTableCache(schema, config.get('tables'))
+        self._save_table_cache(schema, version)
+        return True
+
+    @_with_timeout
+    def batch(self, sql, paramsList:Iterable[dict|tuple]|pd.DataFrame=None, batchsize:int=100):
+        """批处理，paramsList可以是list、生成器等任意可迭代对象或者DataFrame，按batchsize分批执行，不一次性生成全部参数
+        sql使用:name参数时通过SQLAlchemy绑定参数(行为dict)，否则按驱动的参数格式(%s、?等)直接executemany"""
         _logger.DEBUG(f"[SQL]:{sql}")
-        _logger.DEBUG(f"[Parameters]:{paramsList}")
         results = 0
-        
-        if paramsList is None or len(paramsList)==0:
+        if paramsList is None:
             return 0
-        
-        if not self._sessoin_factory.getSession():
-            with self.engine.begin() as connection:
+
+        statement = self._text(sql)
+        named = bool(statement._bindparams)
+        start = time.perf_counter()
+        rows = 0
+
+        def _execute(connection, datas):
+            if named:
+                return connection.execute(statement, datas).rowcount
+            cursor = connection.connection.cursor()
+            try:
+                begin = time.perf_counter()
+                cursor.executemany(sql, datas)  # 参数为元组
+                self._record_sql(sql, time.perf_counter() - begin, cursor.rowcount)
+                return cursor.rowcount
+            finally:
+                cursor.close()
+
+        session = self._sessoin_factory.getSession()
+        if not session:
+            with self.engine.connect() as connection:
                 _logger.DEBUG('自省事务处理')
                 try:
-                    datas = []
-                    for params in paramsList:                                            
-                        datas.append(params)
-                        if len(datas) >= batchsize:
-                            count = connection.connection.cursor().executemany(sql, datas)  # 参数为元组    
-                            results += count
-                            _logger.DEBUG(f'批处理执行{len(datas)}条记录，更新数据{count}')                            
-                            
-                            connection.commit()
-                            # self.commit(connection)                            
-                            datas.clear()
-                    if len(datas) > 0:
-                        count = connection.connection.cursor().executemany(sql, datas)  # 参数为元组    
-                        results += count
-                        _logger.DEBUG(f'批处理执行{len(datas)}条记录，更新数据{count}')                        
-                        
+                    for datas in _iter_batches(paramsList, batchsize, named):
+                        if not connection.in_transaction():
+                            connection.begin()  # 直接使用DBAPI游标时SQLAlchemy不会自动开始事务
+                        count = _execute(connection, datas)
                         connection.commit()
-                        # self.commit(connection)
-                        
-                    return results
+                        results += count
+                        rows += len(datas)
+                        _logger.DEBUG(f'批处理执行{len(datas)}条记录，更新数据{count}')
                 except Exception as e:
                     connection.rollback()
-                    # self.rollback(connection)
                     _logger.ERROR("[Exception]", e)
                     raise e
-        else:    
-            connection = self._sessoin_factory.getSession()
+        else:
+            self._flush_batch(session)   # 直接使用连接执行，不触发Session事件
+            connection = session.connection()
             _logger.DEBUG('事务管理器事务处理')
             try:
-                datas = []
-                for params in paramsList:                                            
-                    datas.append(params)
-                    if len(datas) >= batchsize:
-                        count = connection.connection().connection.cursor().executemany(sql, datas)  # 参数为元组    
-                        results += count
-                        _logger.DEBUG(f'批处理执行{len(datas)}条记录，更新数据{count}')                        
-                        # self.commit(connection)                            
-                        datas.clear()
-                if len(datas) > 0:
-                    count = connection.connection().connection.cursor().executemany(sql, datas)  # 参数为元组    
+                for datas in _iter_batches(paramsList, batchsize, named):
+                    count = _execute(connection, datas)
                     results += count
-                    _logger.DEBUG(f'批处理执行{len(datas)}条记录，更新数据{count}')                                            
-                    # self.commit(connection)                    
-                return results
+                    rows += len(datas)
+                    _logger.DEBUG(f'批处理执行{len(datas)}条记录，更新数据{count}')
             except Exception as e:
-                # self.rollback(connection)
                 _logger.ERROR("[Exception]", e)
                 raise e
+        if not named:
+            self._invalidate_result_cache(write_tables(sql))
+        _log_throughput('批处理', rows, time.perf_counter() - start)
+        return results
+
+    def bulkLoad(self, tablename:str, rows:Iterable[dict|tuple]|pd.DataFrame, columns:list[str]=None, batchsize:int=10000)->dict:
+        """按数据库选择批量装载方式写入表：postgresql使用COPY FROM STDIN，mysql改写成多行INSERT ... VALUES，
+        oracle使用executemany数组绑定，mssql使用pyodbc fast_executemany，sqlite等每batchsize行一个事务executemany
+        rows可以是dict/tuple的任意可迭代对象(生成器)或者DataFrame，按批读取不会一次性物化；tuple行需要columns，缺省使用表的字段顺序
+        返回{'rows': 行数, 'seconds': 耗时, 'rows_per_sec': 每秒行数}"""
+        if isinstance(rows, pd.DataFrame) and columns is None:
+            columns = [str(c) for c in rows.columns]
+        batches = _iter_batches(rows, batchsize)
+        first = next(batches, None)
+        if first is None:
+            return {'rows': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+        if columns is None:
+            columns = list(first[0].keys()) if isinstance(first[0], dict) else list(self.get_table_info(tablename)['columns'].keys())
+        load = self._bulk_loader(tablename, columns)
+
+        start = time.perf_counter()
+        total = 0
+        session = self._sessoin_factory.getSession()
+        self._flush_batch(session)
+        connection = session.connection() if session else self.engine.connect()
+        _logger.DEBUG('事务管理器事务处理' if session else '自省事务处理')
+        try:
+            for datas in itertools.chain([first], batches):
+                datas = [tuple(one.get(c) for c in columns) if isinstance(one, dict) else one for one in datas]
+                if not session and not connection.in_transaction():
+                    connection.begin()  # 直接使用DBAPI游标时SQLAlchemy不会自动开始事务
+                cursor = connection.connection.cursor()
+                try:
+                    begin = time.perf_counter()
+                    load(cursor, datas)
+                    self._record_sql(f'/* bulkLoad */ INSERT INTO {tablename}({", ".join(columns)})', time.perf_counter() - begin, len(datas))
+                finally:
+                    cursor.close()
+                if not session:
+                    connection.commit()
+                total += len(datas)
+                _logger.DEBUG(f'批量装载{tablename} {len(datas)}条记录，累计{total}')
+        except Exception as e:
+            if not session:
+                connection.rollback()
+            _logger.ERROR("[Exception]", e)
+            raise e
+        finally:
+            if not session:
+                connection.close()
+        self._invalidate_result_cache(write_tables(f'INSERT INTO {tablename}'))
+        seconds = time.perf_counter() - start
+        _log_throughput(f'批量装载{tablename}', total, seconds)
+        return {'rows': total, 'seconds': round(seconds, 3), 'rows_per_sec': round(total / seconds, 1) if seconds > 0 else 0.0}
+
+    def _bulk_loader(self, tablename:str, columns:list[str])->Callable:
+        """返回(cursor, rows:list[tuple])的装载函数"""
+        preparer = self.engine.dialect.identifier_preparer
+        table = '.'.join(preparer.quote(one) for one in tablename.split('.'))
+        cols = ', '.join(preparer.quote(c) for c in columns)
+        dbtype = self.getDbType()
+        driver = self.engine.dialect.driver
+
+        if dbtype == 'postgresql' and driver == 'psycopg2':
+            copy_sql = f'COPY {table} ({cols}) FROM STDIN WITH (FORMAT csv)'
+            def _copy_expert(cursor, datas):
+                buffer = io.StringIO()
+                csv.writer(buffer, quoting=csv.QUOTE_NOTNULL).writerows(datas)  # None不加引号即NULL，空串为""
+                buffer.seek(0)
+                cursor.copy_expert(copy_sql, buffer)
+            return _copy_expert
+        if dbtype == 'postgresql' and driver == 'psycopg':
+            copy_sql = f'COPY {table} ({cols}) FROM STDIN'
+            def _copy(cursor, datas):
+                with cursor.copy(copy_sql) as copy:
+                    for one in datas:
+                        copy.write_row(one)
+            return _copy
+
+        style = self.engine.dialect.paramstyle
+        if style == 'qmark':
+            marks = ['?'] * len(columns)
+        elif style in ('format', 'pyformat'):
+            marks = ['%s'] * len(columns)
+        else:
+            marks = [f':{i+1}' for i in range(len(columns))]
+        row_sql = '(' + ', '.join(marks) + ')'
+        insert_sql = f'INSERT INTO {table} ({cols}) VALUES {row_sql}'
+
+        if dbtype in ('mysql', 'mariadb'):
+            @functools.lru_cache(maxsize=4)
+            def _multi_values(count:int)->str:
+                return f'INSERT INTO {table} ({cols}) VALUES ' + ', '.join([row_sql] * count)
+            def _values(cursor, datas):
+                cursor.execute(_multi_values(len(datas)), [v for one in datas for v in one])
+            return _values
+        if dbtype == 'mssql' and driver == 'pyodbc':
+            def _fast_executemany(cursor, datas):
+                cursor.fast_executemany = True
+                cursor.executemany(insert_sql, datas)
+            return _fast_executemany
+
+        def _executemany(cursor, datas):
+            cursor.executemany(insert_sql, datas)  # oracle数组绑定，sqlite单事务
+        return _executemany
+
+    # ---------- 异步方法，使用AsyncEngine执行，TX在async函数上时共用同一个AsyncSession ----------
+    @contextlib.asynccontextmanager
+    async def _aconnection(self):
+        session = self._sessoin_factory.getAsyncSession()
+        if session is None:
+            _logger.DEBUG('自省事务处理')
+            async with self.getAsyncEngine().begin() as connection:
+                yield connection
+        else:
+            _logger.DEBUG('事务管理器事务处理')
+            yield session
+
+    def timeout(self, seconds:float|None):
+        """with内的语句使用seconds秒超时，等同于方法的timeout=参数"""
+        return statement_timeout(seconds)
+
+    async def _aexecute(self, connection, statement, params=None):
+        """语句在独立的任务中执行，等待的协程被取消(客户端断开、超时)时先在数据库端取消语句，
+        等语句结束后再抛出CancelledError，连接正常回滚后放回连接池，不会带着执行中的语句被复用"""
+        task = asyncio.ensure_future(connection.execute(statement, params))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            await asyncio.shield(self._acancel(connection, task))
+            raise
+
+    def _get_cancel_engine(self)->AsyncEngine:
+        """取消语句使用的引擎(NullPool)，不从异步连接池取连接，连接池耗尽时也可以立即连接数据库取消语句"""
+        if self._cancel_engine is None:
+            url = self.getAsyncEngine().url
+            self._cancel_engine = create_async_engine(url=url, poolclass=NullPool, connect_args=self._connect_args(url))
+        return self._cancel_engine
+
+    async def _acancel(self, connection, task:asyncio.Future, wait:float=5):
+        """数据库端取消正在执行的语句：postgresql pg_cancel_backend，mysql KILL QUERY，sqlite interrupt"""
+        dbtype = self.getDbType()
+        pid = None
+        try:
+            if isinstance(connection, AsyncSession):
+                connection = await connection.connection()
+            raw = connection.sync_connection.connection
+            pid = raw.info.get('backend_pid')
+            if dbtype == 'postgresql' and pid:
+                async with self._get_cancel_engine().connect() as other:
+                    await other.execute(text('select pg_cancel_backend(:pid)'), {'pid': pid})
+            elif dbtype in ('mysql', 'mariadb') and pid:
+                async with self._get_cancel_engine().connect() as other:
+                    await other.exec_driver_sql(f'KILL QUERY {int(pid)}')
+            elif dbtype == 'sqlite':
+                inner = _sqlite3_connection(raw.dbapi_connection)
+                if inner is not None:
+                    inner.interrupt()
+            _logger.WARN(f'语句被取消，数据库端取消执行{dbtype}[{pid}]')
+        except Exception as e:
+            _logger.WARN(f'数据库端取消语句失败:{e}')
+        done, _ = await asyncio.wait([task], timeout=wait)
+        if not done:
+            _logger.WARN(f'语句取消后{wait}秒仍未结束{dbtype}[{pid}]')
+        elif not task.cancelled():
+            task.exception()
+
+    @_with_timeout
+    async def aqueryMany(self, sql, params:dict=None, cache:bool|int=None):
+        if self._use_result_cache(cache, True):
+            return await self.getResultCache().aload(sql, params, lambda: self.aqueryMany(sql, params), None if cache is True else cache)
+        replica = self._read_replica(True)
+        if replica is not None:
+            return await self._areplica_read(replica, 'aqueryMany', sql, params)
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        async with self._aconnection() as connection:
+            results = _fetchall(await self._aexecute(connection, self._text(sql), params))   # 参数为Dict
+            rtn = []
+            for one in results:
+                if one:
+                    rtn.append(one._asdict())
+                else:
+                    rtn.append(None)
+            return rtn
+
+    @_with_timeout
+    async def aqueryRows(self, sql, params:dict=None)->tuple[tuple[str, ...], list]:
+        replica = self._read_replica(True)
+        if replica is not None:
+            return await self._areplica_read(replica, 'aqueryRows', sql, params)
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        async with self._aconnection() as connection:
+            results = await self._aexecute(connection, self._text(sql), params)
+            return tuple(results.keys()), _fetchall(results)
+
+    @_with_timeout
+    async def aqueryOne(self, sql, params:dict=None, cache:bool|int=None)->dict:
+        if self._use_result_cache(cache, True):
+            return await self.getResultCache().aload(sql, params, lambda: self.aqueryOne(sql, params), None if cache is True else cache)
+        replica = self._read_replica(True)
+        if replica is not None:
+            return await self._areplica_read(replica, 'aqueryOne', sql, params)
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        try:
+            async with self._aconnection() as connection:
+                results = _fetchone(await self._aexecute(connection, self._text(sql), params))   # 参数为Dict
+                if results:
+                    return results._asdict()
+                else:
+                    return None
+        except Exception as e:
+            _logger.ERROR("[Exception]", e)
+            raise e
+
+    @_with_timeout
+    async def aqueryCount(self, sql, params:dict=None, cache:bool|int=None)->int:
+        result = await self.aqueryOne(f'select count(1) cnt from ( {sql} ) a', params, cache)  # 获取行
+        return result['cnt']
+
+    @_with_timeout
+    async def aqueryPage(self, sql, params:dict=None, page=1, pagesize=10, order_by:list[str]|str=None, after:str=None, count:bool|str=None, cache:bool|int=None) -> PageResult:
+        """queryPage的异步版本，不在AsyncSession事务内时总数统计和分页查询在两个连接上并发执行"""
+        mode = self._count_mode(count)
+        if order_by and pagesize > 0:
+            keys, values, kparams, total, need_count = self._keyset_plan(params, pagesize, order_by, after, mode, page)
+            page_sql = self._keyset_sql(sql, keys, values, '_offset_' in kparams)
+            if need_count:
+                total, list = await self._acount_and_fetch(sql, params, mode, page_sql, kparams, cache)
+            else:
+                list = await self.aqueryMany(page_sql, kparams, cache)
+            return self._keyset_result(list, keys, pagesize, page, total)
+
+        if pagesize <= 0:
+            total, list = await self._acount_and_fetch(sql, params, mode, sql, params, cache)
+            return PageResult(total, pagesize, 1, (1 if total>0 else 0) if total >= 0 else -1, list)
+        else:
+            if page <= 0:
+                page = 1
+            page_params = dict(params or {})
+            page_params['_offset_'] = (page - 1) * pagesize
+            page_params['_pagesize_'] = pagesize
+            total, list = await self._acount_and_fetch(sql, params, mode, self._page_sql(sql), page_params, cache)
+            if total == 0:
+                return PageResult(total, pagesize, 1, (total + pagesize - 1)//pagesize, None)
+            return PageResult(total, pagesize, 1, (total + pagesize - 1)//pagesize if total >= 0 else -1, list)
+
+    async def _acount_and_fetch(self, sql, params:dict, mode:str, page_sql:str, page_params:dict, cache:bool|int=None)->tuple[int, list]:
+        if mode == 'none':
+            return -1, await self.aqueryMany(page_sql, page_params, cache)
+        if self._sessoin_factory.getAsyncSession() is not None:
+            # 同一个AsyncSession不能并发执行
+            return await self._acount(sql, params, mode, cache), await self.aqueryMany(page_sql, page_params, cache)
+        total, list = await asyncio.gather(self._acount(sql, params, mode, cache), self.aqueryMany(page_sql, page_params, cache))
+        return total, list
+
+    async def _acount(self, sql, params:dict, mode:str, cache:bool|int=None)->int:
+        if mode == 'none':
+            return -1
+        if mode == 'cached':
+            key = self._count_key(sql, params)
+            with self._count_cache_lock:
+                total = self._count_cache.get(key)
+            if total is None:
+                total = await self.aqueryCount(sql, params, cache)
+                with self._count_cache_lock:
+                    self._count_cache[key] = total
+            return total
+        if mode == 'estimate':
+            estimate_sql = self._estimate_sql(sql)
+            if estimate_sql:
+                try:
+                    return self._estimate_rows(await self.aqueryMany(estimate_sql, params))
+                except Exception as e:
+                    _logger.WARN(f'估算总数失败，使用count(1)统计:{e}')
+        return await self.aqueryCount(sql, params, cache)
+
+    async def aqueryStream(self, sql, params:dict=None, chunk_size:int=1000, chunked:bool=False):
+        """queryStream的异步版本，async for逐行(chunked=True时逐批)返回，AsyncSession事务内使用当前Session"""
+        replica = self._read_replica(True)
+        if replica is not None:
+            with self._replicas.use(replica) as target:
+                async for one in target.aqueryStream(sql, params, chunk_size, chunked):
+                    yield one
+            return
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        options = {'stream_results': True, 'yield_per': chunk_size}
+        session = self._sessoin_factory.getAsyncSession()
+        if session is None:
+            _logger.DEBUG('自省事务处理')
+            async with self.getAsyncEngine().connect() as connection:
+                results = await connection.stream(self._text(sql), params, execution_options=options)
+                async for one in self._astream_rows(results, chunked):
+                    yield one
+        else:
+            _logger.DEBUG('事务管理器事务处理')
+            results = await session.stream(self._text(sql), params, execution_options=options)
+            async for one in self._astream_rows(results, chunked):
+                yield one
+
+    async def aqueryRowsStream(self, sql, params:dict=None, chunk_size:int=1000):
+        """queryRowsStream的异步版本，async for逐批返回(列名元组, 行元组列表)"""
+        replica = self._read_replica(True)
+        if replica is not None:
+            with self._replicas.use(replica) as target:
+                async for one in target.aqueryRowsStream(sql, params, chunk_size):
+                    yield one
+            return
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        options = {'stream_results': True, 'yield_per': chunk_size}
+        session = self._sessoin_factory.getAsyncSession()
+        if session is None:
+            async with self.getAsyncEngine().connect() as connection:
+                results = await connection.stream(self._text(sql), params, execution_options=options)
+                async for one in self._astream_partitions(results):
+                    yield one
+        else:
+            results = await session.stream(self._text(sql), params, execution_options=options)
+            async for one in self._astream_partitions(results):
+                yield one
+
+    @staticmethod
+    async def _astream_partitions(results):
+        keys = tuple(results.keys())
+        try:
+            async for partition in results.partitions():
+                yield keys, partition
+        finally:
+            await results.close()
+
+    @staticmethod
+    async def _astream_rows(results, chunked:bool):
+        try:
+            async for partition in results.partitions():
+                if chunked:
+                    yield [one._asdict() for one in partition]
+                else:
+                    for one in partition:
+                        yield one._asdict()
+        finally:
+            await results.close()
+
+    @_with_timeout
+    async def aqueryColumns(self, sql, params:dict=None, dtypes:dict=None, chunk_size:int=10000)->dict[str, np.ndarray]:
+        replica = self._read_replica(True)
+        if replica is not None:
+            return await self._areplica_read(replica, 'aqueryColumns', sql, params, dtypes, chunk_size)
+        columns = await self._aquery_columns(sql, params, chunk_size)
+        dtypes = dtypes or {}
+        return {k: np.asarray(v, dtype=dtypes.get(k)) for k, v in columns.items()}
+
+    @_with_timeout
+    async def aqueryFrame(self, sql, params:dict=None, dtypes:dict=None, chunk_size:int=10000, arrow:bool=False)->pd.DataFrame:
+        replica = self._read_replica(True)
+        if replica is not None:
+            return await self._areplica_read(replica, 'aqueryFrame', sql, params, dtypes, chunk_size, arrow)
+        columns = await self._aquery_columns(sql, params, chunk_size)
+        if arrow:
+            import pyarrow
+            df = pyarrow.table(columns).to_pandas(types_mapper=pd.ArrowDtype)
+        else:
+            df = pd.DataFrame(columns, copy=False)
+        if dtypes:
+            df = df.astype(dtypes)
+        return df
+
+    async def _aquery_columns(self, sql, params:dict, chunk_size:int)->dict[str, list]:
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        options = {'stream_results': True, 'yield_per': chunk_size}
+        session = self._sessoin_factory.getAsyncSession()
+        if session is None:
+            async with self.getAsyncEngine().connect() as connection:
+                results = await connection.stream(self._text(sql), params, execution_options=options)
+                return await self._acollect_columns(results)
+        else:
+            results = await session.stream(self._text(sql), params, execution_options=options)
+            return await self._acollect_columns(results)
+
+    @staticmethod
+    async def _acollect_columns(results)->dict[str, list]:
+        keys = list(results.keys())
+        columns = [[] for _ in keys]
+        try:
+            async for partition in results.partitions():
+                for column, values in zip(columns, zip(*partition)):
+                    column.extend(values)
+        finally:
+            await results.close()
+        return dict(zip(keys, columns))
+
+    @_with_timeout
+    async def aupdate(self, sql, params=None, autokey=None, batch:bool=None):
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameter]:{params}")
+        session = self._sessoin_factory.getAsyncSession()
+        queue = self._batch_queue(session, batch is True)
+        if queue is not None and queue.use(batch) and str_isEmpty(autokey):
+            if queue.add(sql, params):
+                await self._aflush_batch(session)
+            return -1
+        try:
+            async with self._aconnection() as connection:
+                results = await self._aexecute(connection, self._text(sql), params)
+                if not str_isEmpty(autokey):
+                    inserted_id = await self._aget_last_insert_id(connection, "", autokey)
+                    if params is not None:
+                        params[autokey] = inserted_id
+                return results.rowcount
+        except Exception as e:
+            _logger.ERROR("[Exception]", e)
+            raise e
+
+    @_with_timeout
+    async def ainsert(self, sql, params=None, autokey:str=None, batch:bool=None):
+        return await self.aupdate(sql, params, autokey, batch)
+
+    @_with_timeout
+    async def adelete(self, sql, params=None, batch:bool=None):
+        return await self.aupdate(sql, params, batch=batch)
+
+    async def ainsertT(self, tablename:str, params:dict=None)->int:
+        if not params:
+            _logger.WARN("插入对象不能为空")
+            return 0
+
+        table_info = await self.aget_table_info(tablename)
+        if not table_info:
+            _logger.ERROR(f"无法获取表 {tablename} 的结构信息")
+            return 0
+
+        sql, valided_data, auto_increment_column = self._build_insertT(tablename, table_info, params)
+        if sql is None:
+            return 0
+
+        try:
+            async with self._aconnection() as connection:
+                results = await connection.execute(self._text(sql), valided_data)
+                # 获取自增长ID
+                if auto_increment_column:
+                    params[auto_increment_column] = await self._aget_last_insert_id(connection, tablename, auto_increment_column)
+                return results.rowcount
+        except Exception as e:
+            _logger.ERROR("[Exception]", e)
+            raise e
+
+    async def ainsertManyT(self, tablename:str, rows:Iterable[dict], batchsize:int=1000)->int:
+        plans = self._plan_manyT(tablename, await self.aget_table_info(tablename), rows, batchsize)
+        return await self._arun_manyT(plans)
+
+    async def aupsertManyT(self, tablename:str, rows:Iterable[dict], conflict_cols:list[str]=None, update_cols:list[str]=None, batchsize:int=1000)->int:
+        plans = self._plan_manyT(tablename, await self.aget_table_info(tablename), rows, batchsize, conflict_cols, update_cols, upsert=True)
+        return await self._arun_manyT(plans)
+
+    async def _arun_manyT(self, plans:list[tuple])->int:
+        if not plans:
+            return 0
+        try:
+            async with self._aconnection() as connection:
+                total = 0
+                for sql, params, chunk, auto_increment_column, returning in plans:
+                    results = await connection.execute(self._text(sql), params)
+                    if returning == 'returning':
+                        ids = [one[0] for one in results.fetchall()]
+                        if len(ids) == len(chunk):
+                            for row, id in zip(chunk, ids):
+                                row[auto_increment_column] = id
+                        total += len(ids) if results.rowcount < 0 else results.rowcount
+                        continue
+                    if returning == 'lastid':
+                        self._backfill_lastid(chunk, auto_increment_column, (await connection.execute(self._text(self._LASTID_SQL))).first())
+                    total += results.rowcount
+                return total
+        except Exception as e:
+            _logger.ERROR("[Exception]", e)
+            raise e
+
+    async def aupdateT2(self, tablename:str, obj:dict=None, where:dict=None, condiftion:str=None):
+        if not obj:
+            _logger.WARN("更新对象不能为空")
+            return 0
+
+        table_info = await self.aget_table_info(tablename)
+        if not table_info:
+            _logger.ERROR(f"无法获取表 {tablename} 的结构信息")
+            return 0
+
+        sql, sql_params = self._build_updateT2(tablename, table_info, obj, where)
+        if sql is None:
+            return 0
+        return await self.aupdate(sql, sql_params)
+
+    async def aupdateT(self, tablename:str, obj:dict=None, condiftion:dict=None,sql:SimpleExpression=None):
+        if not obj:
+            _logger.WARN("更新对象不能为空")
+            return 0
+
+        table_info = await self.aget_table_info(tablename)
+        if not table_info:
+            _logger.ERROR(f"无法获取表 {tablename} 的结构信息")
+            return 0
+
+        sql, sql_params = self._build_updateT(tablename, table_info, obj, condiftion, sql)
+        if sql is None:
+            return 0
+        return await self.aupdate(sql, sql_params)
+
+    async def adeleteT(self, tablename:str, condiftion:dict=None, sql:SimpleExpression=None):
+        table_info = await self.aget_table_info(tablename)
+        if not table_info:
+            _logger.ERROR(f"无法获取表 {tablename} 的结构信息")
+            return 0
+
+        sql, sql_params = self._build_deleteT(tablename, table_info, condiftion, sql)
+        return await self.aupdate(sql, sql_params)
+
+    async def abatch(self, sql, paramsList:list[dict]=None, batchsize:int=100):
+        """异步批处理，sql使用:name参数，paramsList为dict列表，按batchsize分批executemany"""
+        _logger.DEBUG(f"[SQL]:{sql}")
+        _logger.DEBUG(f"[Parameters]:{paramsList}")
+        results = 0
+
+        if paramsList is None or len(paramsList)==0:
+            return 0
+
+        statement = self._text(sql)
+        try:
+            async with self._aconnection() as connection:
+                for i in range(0, len(paramsList), batchsize):
+                    datas = paramsList[i:i+batchsize]
+                    count = (await self._aexecute(connection, statement, datas)).rowcount
+                    results += count
+                    _logger.DEBUG(f'批处理执行{len(datas)}条记录，更新数据{count}')
+            return results
+        except Exception as e:
+            _logger.ERROR("[Exception]", e)
+            raise e
 
 
 class Propagation(Enum):
@@ -811,12 +2916,92 @@ class Propagation(Enum):
     MANDATORY = "MANDATORY"      # 必须存在当前事务，否则抛出异常
     NEVER = "NEVER"              # 必须不存在事务，否则抛出异常
 
+class ExecutorType(Enum):
+    """事务中写语句的执行方式"""
+    SIMPLE = "SIMPLE"   # 每条语句立即执行
+    BATCH = "BATCH"     # 语句排队，相邻的相同SQL合并为一次executemany，提交前、达到batch_size或者执行其他语句前执行
+
+@dataclass
+class BatchResult:
+    """BATCH方式一次executemany的结果"""
+    sql: str
+    size: int       # 参数组数
+    rowcount: int   # 更新行数合计，驱动不返回时为-1
+
+class _BatchQueue:
+    """一个事务Session上排队的写语句，只合并相邻的相同SQL，保持语句的执行顺序；
+    同一Session执行其他语句前、提交(包括释放保存点)前执行，回滚时丢弃，使用begin_nested的TX在创建保存点之前执行"""
+    KEY = 'pydbc_batch'
+
+    def __init__(self, pydbc:PydbcTools, session, size:int):
+        self._pydbc = pydbc
+        self._session = session     # 同步Session，AsyncSession时为sync_session
+        self.size = max(int(size), 1)
+        self.enabled = False        # Session使用BATCH方式，False时只有batch=True的语句排队
+        self.pending:list[tuple[str, list]] = []
+        self.count = 0
+        self.results:list[BatchResult] = []
+        self._flushing = False
+        event.listen(session, 'do_orm_execute', self._before_execute)
+        event.listen(session, 'before_commit', self._before_commit)
+        event.listen(session, 'after_soft_rollback', self._after_rollback)
+
+    def use(self, batch:bool)->bool:
+        return self.enabled if batch is None else batch
+
+    def add(self, sql:str, params)->bool:
+        """排队一条语句，排队数达到batch_size时返回True"""
+        params = dict(params) if isinstance(params, dict) else (params or {})
+        if self.pending and self.pending[-1][0] == sql:
+            self.pending[-1][1].append(params)
+        else:
+            self.pending.append((sql, [params]))
+        self.count += 1
+        return self.count >= self.size
+
+    def flush(self)->list[BatchResult]:
+        if not self.pending or self._flushing:
+            return []
+        pending, self.pending, self.count = self.pending, [], 0
+        results = []
+        self._flushing = True
+        try:
+            connection = self._session.connection()
+            for sql, params in pending:
+                rowcount = connection.execute(self._pydbc._text(sql), params).rowcount
+                results.append(BatchResult(sql, len(params), rowcount))
+                _logger.DEBUG(f'BATCH执行{len(params)}条语句，更新数据{rowcount}\n[SQL]:{sql}')
+        except Exception as e:
+            _logger.ERROR("[Exception]", e)
+            raise e
+        finally:
+            self._flushing = False
+        self.results.extend(results)
+        return results
+
+    def take_results(self)->list[BatchResult]:
+        results, self.results = self.results, []
+        return results
+
+    def _before_execute(self, orm_execute_state):
+        self.flush()
+
+    def _before_commit(self, session):
+        self.flush()
+
+    def _after_rollback(self, session, previous_transaction):
+        if self.pending:
+            _logger.DEBUG(f'事务回滚，丢弃BATCH排队的{self.count}条语句')
+        self.pending, self.count = [], 0
+
 class SessionFactory:
     def __init__(self,pydbc:PydbcTools):
         self._pydbc = pydbc
         self._session_factory = sessionmaker(bind=self._pydbc.engine, expire_on_commit=False)
         self._session_stack = contextvars.ContextVar('_current_requst_context', default=None)
         self._session_stack.set([])
+        self._async_session_factory = None
+        self._async_session_stack = contextvars.ContextVar('_current_async_session_context', default=())
     def createSession(self):
         return self._session_factory()
     def getSession(self, create:bool=False):
@@ -824,6 +3009,9 @@ class SessionFactory:
         _session = None
         if _s:
             _session = _s[-1]
+        elif self._async_session_stack.get():
+            # 同步方法不能在协程中等待AsyncSession，直接使用引擎会脱离事务(回滚时丢失)
+            raise Exception('当前在异步事务(AsyncSession)中，同步方法不能加入该事务，请使用aupdate、aqueryMany等异步方法')
         else:
             if create:
                 _session = self._session_factory()
@@ -840,26 +3028,79 @@ class SessionFactory:
             return _s
         else:
             raise Exception('Session栈已经空，栈溢出')
+    def isAsync(self)->bool:
+        return use_async_engine(self._pydbc)
+    def createAsyncSession(self):
+        if self._async_session_factory is None:
+            self._async_session_factory = async_sessionmaker(bind=self._pydbc.getAsyncEngine(), expire_on_commit=False)
+        return self._async_session_factory()
+    def getAsyncSession(self):
+        _s:tuple = self._async_session_stack.get()
+        return _s[-1] if _s else None
+    def beginAsyncSession(self, session):
+        # 使用不可变tuple，保证每个Task里的Session栈互相独立
+        _logger.DEBUG(f'新异步事物开始{session}')
+        self._async_session_stack.set(self._async_session_stack.get() + (session,))
+    def endAsyncSession(self):
+        _s:tuple = self._async_session_stack.get()
+        if _s:
+            self._async_session_stack.set(_s[:-1])
+            return _s[-1]
+        else:
+            raise Exception('Session栈已经空，栈溢出')
 
 class TX:
-    def __init__(self, pydbc: PydbcTools,*,propagation:Propagation=Propagation.REQUIRED,rollback_for:Union[Type[Exception], Tuple[Type[Exception], ...]] = Exception):
+    def __init__(self, pydbc: PydbcTools,*,propagation:Propagation=Propagation.REQUIRED,rollback_for:Union[Type[Exception], Tuple[Type[Exception], ...]] = Exception,
+                 executor:ExecutorType=ExecutorType.SIMPLE):
+        """executor=ExecutorType.BATCH时事务Session中的写语句排队用executemany执行，见PydbcTools.setExecutorType"""
+        self._pydbc = pydbc
         self._session_factory = pydbc._sessoin_factory
         self._propagation = propagation
         self._rollback_for = rollback_for if isinstance(rollback_for, tuple) else (rollback_for,)
+        self._batch = executor is not None and executor.value == ExecutorType.BATCH.value
+
+    def _use_executor(self, use_async:bool=False)->tuple:
+        """executor=BATCH时Session在TX范围内使用BATCH方式，返回(排队, 外层的设置)，退出TX时恢复外层的设置"""
+        if not self._batch:
+            return None
+        session = self._pydbc.getTxSession(use_async)
+        if session is None:
+            return None
+        queue = self._pydbc._batch_queue(session, True)
+        enabled, queue.enabled = queue.enabled, True
+        return queue, enabled
+
+    @staticmethod
+    def _flush_executor(executor:tuple):
+        # 外层使用SIMPLE时，TX内排队的语句在返回前执行，外层后续的语句和返回的行数不受影响
+        if executor is not None and not executor[1]:
+            executor[0].flush()
+
+    async def _aflush_executor(self, executor:tuple):
+        if executor is not None and not executor[1]:
+            await self._pydbc._aflush_batch(self._session_factory.getAsyncSession())
+
+    @staticmethod
+    def _restore_executor(executor:tuple):
+        if executor is not None:
+            executor[0].enabled = executor[1]
     
     def __call__(self, func: Callable) -> Callable:
         _logger.DEBUG(f'创建TX装饰器,隔离级别={self._propagation}=>{self._propagation.value}')
         return self._async_wrapper(func) if inspectoin.iscoroutinefunction(func) else self._sync_wrapper(func)
     
     def _handle_when_expcetion(self, func:Callable, need_end, *args, **kwargs):
+        executor = self._use_executor()
         try:
-            return func(*args, **kwargs)
+            rtn = func(*args, **kwargs)
+            self._flush_executor(executor)
+            return rtn
         except Exception as e:      
             if self._rollback_for:
                 session = self._session_factory.getSession()
                 if session and session.in_transaction():
                     if self._should_rollback(type(e)):
-                        _logger.DEBUG()
+                        _logger.DEBUG(f'事务回滚{type(e).__name__}')
                         session.rollback()
                     else:
                         # 对于不需要回滚的异常，尝试提交
@@ -870,13 +3111,17 @@ class TX:
                             session.rollback()
             raise
         finally:
+            self._restore_executor(executor)
             if need_end:
                 self._session_factory.endSession()
             pass
         
     async def _async_handle_when_expcetion(self, func:Callable, need_end, *args, **kwargs):
+        executor = self._use_executor()
         try:
-            return await  func(*args, **kwargs)
+            rtn = await  func(*args, **kwargs)
+            self._flush_executor(executor)
+            return rtn
         except Exception as e:
             session = self._session_factory.getSession()                
             if session and session.in_transaction():
@@ -891,10 +3136,67 @@ class TX:
                         session.rollback()
             raise
         finally:
+            self._restore_executor(executor)
             if need_end:
                 self._session_factory.endSession()
             pass
         
+    async def _async_session_handle_when_expcetion(self, func:Callable, *args, **kwargs):
+        executor = self._use_executor(True)
+        try:
+            rtn = await func(*args, **kwargs)
+            await self._aflush_executor(executor)
+            return rtn
+        except Exception as e:
+            session = self._session_factory.getAsyncSession()
+            if session and session.in_transaction() and not self._should_rollback(type(e)):
+                # 对于不需要回滚的异常，尝试提交；需要回滚的由session.begin()退出时回滚
+                try:
+                    await session.commit()
+                except Exception:
+                    # 如果提交失败，则回滚
+                    await session.rollback()
+            raise
+        finally:
+            self._restore_executor(executor)
+
+    async def _async_session_call(self, func:Callable, *args, **kwargs):
+        """数据源启用异步引擎时，async函数上的TX共用同一个AsyncSession"""
+        if self._propagation == Propagation.SUPPORTS:
+            _logger.DEBUG('异步事务Propagation.SUPPORTS')
+            return await self._async_session_handle_when_expcetion(func, *args, **kwargs)
+        elif self._propagation == Propagation.REQUIRES_NEW or (self._propagation == Propagation.REQUIRED and self._session_factory.getAsyncSession() is None):
+            cur_session = self._session_factory.createAsyncSession()
+            self._session_factory.beginAsyncSession(cur_session)
+            _logger.DEBUG(f'异步事务Propagation.{self._propagation.value}->NEW')
+            try:
+                async with cur_session.begin():
+                    return await self._async_session_handle_when_expcetion(func, *args, **kwargs)
+            finally:
+                self._session_factory.endAsyncSession()
+                await cur_session.close()
+        elif self._propagation == Propagation.REQUIRED:
+            cur_session = self._session_factory.getAsyncSession()
+            if cur_session.in_transaction():
+                await self._pydbc._aflush_batch(cur_session)   # 排队的语句属于外层事务
+                async with cur_session.begin_nested():
+                    _logger.DEBUG('异步事务Propagation.REQUIRED->USED_NEW')
+                    return await self._async_session_handle_when_expcetion(func, *args, **kwargs)
+            else:
+                async with cur_session.begin():
+                    _logger.DEBUG('异步事务Propagation.REQUIRED->USED_CURRENT')
+                    return await self._async_session_handle_when_expcetion(func, *args, **kwargs)
+        elif self._propagation == Propagation.NEVER:
+            if self._session_factory.getAsyncSession():
+                raise Exception('已经启动了事务，NEVER不支持活动事务')
+        elif self._propagation == Propagation.MANDATORY:
+            if not self._session_factory.getAsyncSession():
+                raise Exception('没有启动事务，MANDATORY必须已经启动事务')
+        else:
+            _logger.DEBUG(f'事务级别{self._propagation}')
+
+        return await func(*args, **kwargs)
+
     def _sync_wrapper(self, func: Callable) -> Callable:
         _logger.DEBUG('TX装饰器同步模式')
         @functools.wraps(func)
@@ -922,6 +3224,7 @@ class TX:
                         return self._handle_when_expcetion(func, need_end, *args, **kwargs)
                 else:
                     if cur_session.in_transaction:
+                        self._pydbc._flush_batch(cur_session)   # 排队的语句属于外层事务
                         with cur_session.begin_nested():
                             _logger.DEBUG('事务Propagation.REQUIRED->USED_NEW')
                             return self._handle_when_expcetion(func, need_end, *args, **kwargs)
@@ -950,6 +3253,9 @@ class TX:
         async def wrapper(*args, **kwargs):
             need_end = False
             
+            if self._session_factory.isAsync():
+                return await self._async_session_call(func, *args, **kwargs)
+            
             if self._propagation == Propagation.SUPPORTS:
                 _logger.DEBUG('事务Propagation.SUPPORTS')
                 return await self._async_handle_when_expcetion(func, need_end, *args, **kwargs)
@@ -971,6 +3277,7 @@ class TX:
                         return await self._async_handle_when_expcetion(func, need_end, *args, **kwargs)
                 else:
                     if cur_session.in_transaction:
+                        self._pydbc._flush_batch(cur_session)   # 排队的语句属于外层事务
                         with cur_session.begin_nested():
                             _logger.DEBUG('事务Propagation.REQUIRED->USED_CURRENT')
                             return await self._async_handle_when_expcetion(func, need_end, *args, **kwargs)
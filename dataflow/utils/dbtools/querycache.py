@@ -0,0 +1,175 @@
+from cachetools import TLRUCache
+from dataflow.utils.log import Logger
+from dataflow.utils.utils import json_to_str, str_to_json
+from typing import Callable
+import hashlib
+import re
+import threading
+
+_logger = Logger('dataflow.utils.dbtools.querycache')
+
+_IDENTIFIER = r'(?:[`"\[]?[\w$]+[`"\]]?\s*\.\s*)*[`"\[]?[\w$]+[`"\]]?'
+_READ_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+(' + _IDENTIFIER + ')', re.IGNORECASE)
+_WRITE_TABLE = re.compile(r'^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPSERT\s+INTO|MERGE\s+INTO|DELETE\s+FROM|DELETE|UPDATE|TRUNCATE\s+TABLE|TRUNCATE|COPY)\s+(' + _IDENTIFIER + ')', re.IGNORECASE)
+_WRITE_KEYWORDS = ('INSERT', 'UPDATE', 'DELETE', 'MERGE', 'REPLACE', 'UPSERT', 'TRUNCATE', 'COPY')
+
+_MISS = object()
+
+
+def _table_name(identifier:str)->str:
+    """去掉引号和schema，表名统一小写作为标签"""
+    return re.sub(r'[`"\[\]\s]', '', identifier).split('.')[-1].lower()
+
+def read_tables(sql:str)->frozenset[str]:
+    """SQL读取的表(FROM/JOIN之后的表名)"""
+    return frozenset(_table_name(one) for one in _READ_TABLES.findall(sql))
+
+def write_tables(sql:str)->frozenset[str]:
+    """写语句(INSERT/UPDATE/DELETE/MERGE/REPLACE/TRUNCATE/COPY)修改的表，查询语句返回空集合"""
+    head = sql.lstrip()[:8].upper()
+    if not head.startswith(_WRITE_KEYWORDS):
+        return frozenset()
+    m = _WRITE_TABLE.match(sql)
+    return frozenset([_table_name(m.group(1))]) if m else frozenset()
+
+
+class QueryCache:
+    """查询结果缓存，进程内LRU+TTL，可选Redis二级缓存
+    缓存key包含SQL读取的每个表的版本号，写表时表版本加1，旧结果不再命中，配置Redis时表版本保存在Redis，多进程之间一致
+    Redis中的结果按JSON保存，日期等类型取回后为字符串"""
+    def __init__(self, name:str, maxsize:int=10000, ttl:int=60, redis=None, prefix:str='pydbc:cache'):
+        self.name = name
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis   # RedisTools或者返回RedisTools的函数
+        self._local = TLRUCache(maxsize=maxsize, ttu=lambda key, value, now: now + value[0])
+        self._versions:dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._hits = {'local': 0, 'redis': 0}
+        self._misses = 0
+        self._invalidations = 0
+
+    def _get_redis(self):
+        if callable(self._redis):
+            try:
+                self._redis = self._redis()
+            except Exception as e:
+                _logger.WARN(f'结果缓存{self.name}获取Redis失败，只使用进程内缓存:{e}')
+                self._redis = None
+        return self._redis
+
+    def _table_versions(self, tables:frozenset[str])->list:
+        tables = sorted(tables)
+        redis = self._get_redis()
+        if redis is not None and tables:
+            try:
+                return list(zip(tables, redis.mget([f'{self.prefix}:ver:{t}' for t in tables])))
+            except Exception as e:
+                _logger.WARN(f'结果缓存{self.name}读取Redis表版本失败:{e}')
+        with self._lock:
+            return [(t, self._versions.get(t, 0)) for t in tables]
+
+    def key(self, sql:str, params:dict)->str:
+        versions = self._table_versions(read_tables(sql))
+        items = sorted((k, repr(v)) for k, v in (params or {}).items())
+        raw = repr((' '.join(sql.split()), items, versions))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, key:str):
+        with self._lock:
+            value = self._local.get(key)
+            if value is not None:
+                self._hits['local'] += 1
+                return _copy(value[1])
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                cached = redis.get(f'{self.prefix}:val:{self.name}:{key}')
+            except Exception as e:
+                _logger.WARN(f'结果缓存{self.name}读取Redis失败:{e}')
+                cached = None
+            if cached is not None:
+                value = str_to_json(cached)['v']
+                with self._lock:
+                    self._local[key] = (self.ttl, value)
+                    self._hits['redis'] += 1
+                return _copy(value)
+        with self._lock:
+            self._misses += 1
+        return _MISS
+
+    def put(self, key:str, value, ttl:int=None):
+        ttl = ttl or self.ttl
+        with self._lock:
+            self._local[key] = (ttl, value)
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                redis.set(f'{self.prefix}:val:{self.name}:{key}', json_to_str({'v': value}), ttl)
+            except Exception as e:
+                _logger.WARN(f'结果缓存{self.name}写入Redis失败:{e}')
+        return _copy(value)
+
+    def load(self, sql:str, params:dict, loader:Callable, ttl:int=None):
+        key = self.key(sql, params)
+        value = self.get(key)
+        if value is _MISS:
+            value = self.put(key, loader(), ttl)
+        return value
+
+    async def aload(self, sql:str, params:dict, loader:Callable, ttl:int=None):
+        key = self.key(sql, params)
+        value = self.get(key)
+        if value is _MISS:
+            value = self.put(key, await loader(), ttl)
+        return value
+
+    def invalidate(self, tables:set[str]|frozenset[str]):
+        """写表后表版本加1，读取这些表的缓存结果失效"""
+        if not tables:
+            return
+        _logger.DEBUG(f'结果缓存{self.name}失效表{tables}')
+        with self._lock:
+            for t in tables:
+                self._versions[t] = self._versions.get(t, 0) + 1
+            self._invalidations += 1
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                for t in tables:
+                    redis.incr(f'{self.prefix}:ver:{t}')
+            except Exception as e:
+                _logger.WARN(f'结果缓存{self.name}更新Redis表版本失败:{e}')
+
+    def invalidate_sql(self, sql:str):
+        self.invalidate(write_tables(sql))
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self)->dict:
+        with self._lock:
+            hits = self._hits['local'] + self._hits['redis']
+            total = hits + self._misses
+            return {
+                'size': len(self._local),
+                'maxsize': self._local.maxsize,
+                'ttl': self.ttl,
+                'redis': self._redis is not None,
+                'hits': hits,
+                'local_hits': self._hits['local'],
+                'redis_hits': self._hits['redis'],
+                'misses': self._misses,
+                'invalidations': self._invalidations,
+                'hit_ratio': round(hits / total, 4) if total else 0.0,
+            }
+
+
+def _copy(value):
+    """返回结果的浅拷贝，调用方修改行dict不影响缓存"""
+    if isinstance(value, list):
+        return [dict(one) if isinstance(one, dict) else one for one in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
@@ -108,6 +108,23 @@ class RedisTools:
             rtn = str_to_json(rtn)
         return rtn
 
+    def mget(self, keys:list)->list:
+        """
+        批量获取键的值
+        :param keys: 键列表
+        :return: 值列表，不存在的键为None
+        """
+        return self.__redis_client__.mget(keys)
+
+    def incr(self, key, amount:int=1)-> ResponseT:
+        """
+        键的值加amount
+        :param key: 键
+        :param amount: 增量
+        :return: 增加后的值
+        """
+        return self.__redis_client__.incr(key, amount)
+
     def delete(self, key)-> ResponseT:
         """
         删除键
@@ -0,0 +1,99 @@
+from dataflow.utils.log import Logger
+from pydantic import BaseModel
+from typing import Any, Callable, Sequence
+import dataclasses
+import functools
+import inspect
+
+_logger = Logger('dataflow.utils.dbtools.rowmapper')
+
+
+def _pydantic_mapper(cls:type[BaseModel], columns:tuple[str, ...], validate:bool)->Callable[[Sequence], Any]:
+    fields = {}
+    for name, info in cls.model_fields.items():
+        key = (info.alias or name) if validate else name   # model_validate按别名取值
+        fields[name] = key
+        if info.alias:
+            fields[info.alias] = key
+    index = [(i, fields[col]) for i, col in enumerate(columns) if col in fields]
+    if validate:
+        validate_one = cls.model_validate
+        return lambda row: validate_one({name: row[i] for i, name in index})
+    if cls.__private_attributes__ or cls.model_config.get('extra') == 'allow':
+        construct = cls.model_construct
+        return lambda row: construct(**{name: row[i] for i, name in index})
+    return _construct_mapper(cls, index)
+
+
+def _construct_mapper(cls:type[BaseModel], index:list[tuple[int, str]])->Callable[[Sequence], Any]:
+    """等同于model_construct，没有私有属性和extra字段时直接设置__dict__，缺少的列使用字段默认值"""
+    names = {name for _, name in index}
+    defaults = [(name, info) for name, info in cls.model_fields.items() if name not in names and not info.is_required()]
+    fields_set = frozenset(names)
+    new = cls.__new__
+    setattr_ = object.__setattr__
+
+    def _map(row:Sequence):
+        values = {name: row[i] for i, name in index}
+        for name, info in defaults:
+            values[name] = info.get_default(call_default_factory=True)
+        obj = new(cls)
+        setattr_(obj, '__dict__', values)
+        setattr_(obj, '__pydantic_fields_set__', set(fields_set))
+        setattr_(obj, '__pydantic_extra__', None)
+        setattr_(obj, '__pydantic_private__', None)
+        return obj
+    return _map
+
+
+def _dataclass_mapper(cls:type, columns:tuple[str, ...])->Callable[[Sequence], Any]:
+    names = {one.name for one in dataclasses.fields(cls) if one.init}
+    index = [(i, col) for i, col in enumerate(columns) if col in names]
+    return lambda row: cls(**{name: row[i] for i, name in index})
+
+
+def _object_mapper(cls:type, columns:tuple[str, ...])->Callable[[Sequence], Any]:
+    """普通类：无参构造后按列名设置已有的属性(实例属性、__slots__、类属性或者类型注解)；不能无参构造时按列名作为关键字参数构造"""
+    try:
+        probe = cls()
+    except TypeError:
+        params = inspect.signature(cls).parameters
+        keywords = any(one.kind == one.VAR_KEYWORD for one in params.values())
+        index = [(i, col) for i, col in enumerate(columns) if keywords or col in params]
+        return lambda row: cls(**{name: row[i] for i, name in index})
+    annotations = getattr(cls, '__annotations__', {})
+    index = [(i, col) for i, col in enumerate(columns) if hasattr(probe, col) or col in annotations
+             or col in getattr(cls, '__slots__', ())]
+
+    def _map(row:Sequence):
+        obj = cls()
+        for i, name in index:
+            setattr(obj, name, row[i])
+        return obj
+    return _map
+
+
+@functools.lru_cache(maxsize=1024)
+def row_mapper(resultType:type, columns:tuple[str, ...], validate:bool=True)->Callable[[Sequence], Any]:
+    """按(resultType, 列名元组)生成行转换函数并缓存，转换时按列序号直接从Row元组取值，不生成中间的行dict
+    pydantic模型validate=False时使用model_construct跳过校验，dataclass按字段构造，普通类构造后设置属性"""
+    if isinstance(resultType, type) and issubclass(resultType, BaseModel):
+        mapper = _pydantic_mapper(resultType, columns, validate)
+    elif dataclasses.is_dataclass(resultType):
+        mapper = _dataclass_mapper(resultType, columns)
+    else:
+        mapper = _object_mapper(resultType, columns)
+    _logger.DEBUG(f'生成行转换{resultType.__name__}{columns} validate={validate}')
+    return mapper
+
+
+def map_rows(resultType:type, columns:Sequence[str], rows:Sequence[Sequence], validate:bool=True)->list:
+    mapper = row_mapper(resultType, tuple(columns), validate)
+    return [mapper(row) for row in rows]
+
+
+def dict_mapper(resultType:type, validate:bool=True)->Callable[[dict], Any]:
+    """dict行(queryOne、queryPage和结果缓存返回的行)的转换，相同列名的行共用row_mapper"""
+    def _map(row:dict):
+        return row_mapper(resultType, tuple(row), validate)(tuple(row.values()))
+    return _map
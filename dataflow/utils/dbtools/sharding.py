@@ -0,0 +1,280 @@
+from dataflow.utils.log import Logger
+from dataflow.utils.utils import PageResult
+from dataflow.utils.dbtools.pydbc import PydbcTools
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Any, Callable, Iterable
+import bisect
+import contextlib
+import contextvars
+import functools
+import inspect
+import math
+import threading
+import zlib
+
+_logger = Logger('dataflow.utils.dbtools.sharding')
+
+
+class ShardingTools:
+    """分片数据源，持有多个PydbcTools分片，按分片键路由
+    strategy：hash(按键值的字符串形式crc32取模，5、'5'、5.0路由到同一分片)、range(ranges=[[上界, 分片], ..., [None, 分片]]，上界不包含)、map(mapping={值: 分片}，default为未匹配时的分片)
+    参数(或insertT等的数据)包含分片键时只访问对应分片，分片键为list/tuple/set时访问这些值所在的分片，
+    没有分片键的查询并发访问全部分片后合并(scatter-gather)，没有分片键的update/delete在全部分片执行，insert必须有分片键
+    每个分片是独立的数据库，不支持跨分片事务"""
+    STRATEGIES = ('hash', 'range', 'map')
+
+    def __init__(self, shards:dict[str, PydbcTools], key:str, strategy:str='hash', ranges:list=None, mapping:dict=None,
+                 default:str=None, max_workers:int=None):
+        if not shards:
+            raise ValueError('分片数据源至少需要一个分片')
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'不支持的分片方式{strategy}，可选{self.STRATEGIES}')
+        self.shards = dict(shards)
+        self.names = list(self.shards.keys())
+        self.key = key
+        self.strategy = strategy
+        self.default = default
+        self._mapping = {self._canonical(k): v for k, v in (mapping or {}).items()}
+        ranges = sorted(ranges or [], key=lambda one: (one[0] is None, one[0]))
+        self._bounds = [one[0] for one in ranges if one[0] is not None]
+        self._range_shards = [one[1] for one in ranges]
+        for name in [*self._mapping.values(), *self._range_shards, *([default] if default else [])]:
+            if name not in self.shards:
+                raise ValueError(f'分片{name}不存在，可选{self.names}')
+        if strategy == 'range' and (not ranges or ranges[-1][0] is not None):
+            _logger.WARN('range分片没有配置[None, 分片]，超过最大上界的值无法路由')
+        self._hint = contextvars.ContextVar(f'shard_hint_{id(self)}', default=None)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.shards), thread_name_prefix='shard')
+        self._lock = threading.Lock()
+        self._routed = {name: 0 for name in self.names}
+        self._scatters = 0
+
+    @staticmethod
+    def _canonical(value)->str:
+        """分片键值的统一形式，HTTP参数是字符串、数据库行是数字，同一个值需要路由到同一分片"""
+        if isinstance(value, (float, Decimal)) and math.isfinite(value) and value == int(value):
+            return str(int(value))
+        return str(value)
+
+    def _range_value(self, value):
+        """range分片的上界为数字时，数字字符串按数字比较"""
+        if isinstance(value, str) and self._bounds and isinstance(self._bounds[0], (int, float, Decimal)):
+            try:
+                return Decimal(value)
+            except ArithmeticError:
+                return value
+        return value
+
+    def shardOf(self, value)->str:
+        """分片键值对应的分片名称"""
+        if self.strategy == 'hash':
+            index = zlib.crc32(self._canonical(value).encode('utf-8')) % len(self.names)
+            return self.names[index]
+        if self.strategy == 'range':
+            index = bisect.bisect_right(self._bounds, self._range_value(value))
+            if index >= len(self._range_shards):
+                raise ValueError(f'分片键{self.key}={value}超出range分片范围')
+            return self._range_shards[index]
+        name = self._mapping.get(self._canonical(value), self.default)
+        if name is None:
+            raise ValueError(f'分片键{self.key}={value}没有对应的分片')
+        return name
+
+    def getShard(self, name:str)->PydbcTools:
+        return self.shards[name]
+
+    def getShards(self)->dict[str, PydbcTools]:
+        return dict(self.shards)
+
+    @contextlib.contextmanager
+    def route(self, value):
+        """指定分片键值，with内的调用按该值路由，参数中没有分片键(或者名称不同)时使用，pybatis的shardKey通过它传递"""
+        token = self._hint.set(value)
+        try:
+            yield self
+        finally:
+            self._hint.reset(token)
+
+    def _targets(self, params:dict=None)->list[str]:
+        value = self._hint.get()
+        if value is None and params and isinstance(params, dict):
+            value = params.get(self.key)
+        if value is None:
+            return self.names
+        if isinstance(value, (list, tuple, set, frozenset)):
+            wanted = {self.shardOf(one) for one in value}
+            return [name for name in self.names if name in wanted]
+        return [self.shardOf(value)]
+
+    def _run(self, targets:list[str], func:Callable[[PydbcTools], Any])->list:
+        """单个分片直接执行，多个分片并发执行，返回结果按分片顺序"""
+        with self._lock:
+            if len(targets) == 1:
+                self._routed[targets[0]] += 1
+            else:
+                self._scatters += 1
+        if len(targets) == 1:
+            return [func(self.shards[targets[0]])]
+        futures = [self._executor.submit(contextvars.copy_context().run, func, self.shards[name]) for name in targets]
+        return [one.result() for one in futures]
+
+    def _single(self, params:dict, action:str)->PydbcTools:
+        targets = self._targets(params)
+        if len(targets) != 1:
+            raise ValueError(f'{action}需要分片键{self.key}')
+        with self._lock:
+            self._routed[targets[0]] += 1
+        return self.shards[targets[0]]
+
+    def queryMany(self, sql, params:dict=None, cache:bool|int=None)->list[dict]:
+        """没有分片键时按分片顺序合并全部分片的结果，需要全局排序或者LIMIT时使用queryPage"""
+        rtn = []
+        for rows in self._run(self._targets(params), lambda ds: ds.queryMany(sql, params, cache)):
+            rtn.extend(rows or [])
+        return rtn
+
+    def queryOne(self, sql, params:dict=None, cache:bool|int=None)->dict:
+        """没有分片键时返回第一个有结果的分片的行"""
+        for row in self._run(self._targets(params), lambda ds: ds.queryOne(sql, params, cache)):
+            if row is not None:
+                return row
+        return None
+
+    def queryCount(self, sql, params:dict=None, cache:bool|int=None)->int:
+        return sum(self._run(self._targets(params), lambda ds: ds.queryCount(sql, params, cache)))
+
+    def queryPage(self, sql, params:dict=None, page=1, pagesize=10, order_by:list[str]|str=None, after:str=None, count:bool|str=None, cache:bool|int=None)->PageResult:
+        """分页查询，参数和PydbcTools.queryPage相同，单个分片时直接使用分片的queryPage
+        多个分片时：order_by+after(或第一页)每个分片按游标取pagesize+1行，归并排序后取前pagesize行，游标对全部分片通用；
+        order_by且page>1没有after时每个分片取前page*pagesize行归并后截取该页；没有order_by时按分片顺序拼接后截取，页数较深时建议使用order_by
+        总数为各分片总数之和，任一分片不统计(-1)时为-1"""
+        targets = self._targets(params)
+        if len(targets) == 1:
+            return self._run(targets, lambda ds: ds.queryPage(sql, params, page, pagesize, order_by, after, count, cache))[0]
+        first = self.shards[targets[0]]
+        mode = first._count_mode(count)
+        page = page if page > 0 else 1
+
+        if order_by and pagesize > 0:
+            keys, values, kparams, total, need_count = first._keyset_plan(params, pagesize, order_by, after, mode)
+            if values is None and page > 1:
+                kparams['_pagesize_'] = page * pagesize + 1
+            parts = self._run(targets, lambda ds: (ds._count(sql, params, mode, cache) if need_count else None,
+                                                   ds.queryMany(ds._keyset_sql(sql, keys, values), dict(kparams), cache)))
+            if need_count:
+                total = self._sum_total([one[0] for one in parts])
+            rows = self._merge([one[1] for one in parts], keys)
+            if values is None and page > 1:
+                rows = rows[(page - 1) * pagesize:]
+            return PydbcTools._keyset_result(rows, keys, pagesize, page, total)
+
+        limit = page * pagesize if pagesize > 0 else 0
+        parts = self._run(targets, lambda ds: ds.queryPage(sql, dict(params or {}), 1, limit, count=count, cache=cache))
+        total = self._sum_total([one.total for one in parts])
+        rows = []
+        for one in parts:
+            rows.extend(one.list or [])
+        if pagesize <= 0:
+            return PageResult(total, pagesize, 1, (1 if total > 0 else 0) if total >= 0 else -1, rows)
+        rows = rows[(page - 1) * pagesize: page * pagesize]
+        return PageResult(total, pagesize, page, (total + pagesize - 1)//pagesize if total >= 0 else -1, rows or None)
+
+    @staticmethod
+    def _sum_total(totals:list[int])->int:
+        return -1 if any(one is None or one < 0 for one in totals) else sum(totals)
+
+    @staticmethod
+    def _merge(parts:list[list[dict]], keys:list[tuple[str, bool]])->list[dict]:
+        """各分片已按keys排序的结果归并为全局顺序，多列不同方向时按列从后往前稳定排序"""
+        rows = [row for one in parts for row in (one or [])]
+        for col, desc in reversed(keys):
+            rows.sort(key=lambda row: (row[col] is None, row[col]) if not desc else (row[col] is not None, row[col]), reverse=desc)
+        return rows
+
+    def update(self, sql, params=None, autokey=None):
+        """有分片键时在对应分片执行，否则在全部分片执行，返回影响行数之和"""
+        if autokey is not None:
+            return self._single(params, 'insert').update(sql, params, autokey)
+        return sum(self._run(self._targets(params), lambda ds: ds.update(sql, params)))
+
+    def insert(self, sql, params=None, autokey:str=None):
+        return self._single(params, 'insert').insert(sql, params, autokey)
+
+    def delete(self, sql, params=None):
+        return self.update(sql, params)
+
+    def insertT(self, tablename:str, params:dict=None)->int:
+        return self._single(params, 'insertT').insertT(tablename, params)
+
+    def updateT(self, tablename:str, obj:dict=None, condiftion:dict=None, sql=None):
+        """分片键取自condiftion，其次obj，都没有时在全部分片执行"""
+        targets = self._targets(condiftion if condiftion and self.key in condiftion else obj)
+        return sum(self._run(targets, lambda ds: ds.updateT(tablename, obj, condiftion, sql)))
+
+    def deleteT(self, tablename:str, condiftion:dict=None, sql=None):
+        return sum(self._run(self._targets(condiftion), lambda ds: ds.deleteT(tablename, condiftion, sql)))
+
+    def insertManyT(self, tablename:str, rows:Iterable[dict], batchsize:int=1000)->int:
+        """按分片键分组后每个分片批量写入"""
+        groups = self._group(rows, 'insertManyT')
+        return sum(self._run_groups(groups, lambda ds, one: ds.insertManyT(tablename, one, batchsize)))
+
+    def upsertManyT(self, tablename:str, rows:Iterable[dict], conflict_cols:list[str]=None, update_cols:list[str]=None, batchsize:int=1000)->int:
+        groups = self._group(rows, 'upsertManyT')
+        return sum(self._run_groups(groups, lambda ds, one: ds.upsertManyT(tablename, one, conflict_cols, update_cols, batchsize)))
+
+    def _group(self, rows:Iterable[dict], action:str)->dict[str, list[dict]]:
+        groups:dict[str, list[dict]] = {}
+        for row in rows:
+            if row.get(self.key) is None:
+                raise ValueError(f'{action}的数据缺少分片键{self.key}:{row}')
+            groups.setdefault(self.shardOf(row[self.key]), []).append(row)
+        return groups
+
+    def _run_groups(self, groups:dict[str, list[dict]], func:Callable[[PydbcTools, list[dict]], Any])->list:
+        with self._lock:
+            self._scatters += 1
+        futures = [self._executor.submit(contextvars.copy_context().run, func, self.shards[name], rows) for name, rows in groups.items()]
+        return [one.result() for one in futures]
+
+    def getDbType(self)->str:
+        return self.shards[self.names[0]].getDbType()
+
+    def getSqlStats(self):
+        """SQL统计在各分片的PydbcTools上"""
+        return None
+
+    def getShardStats(self)->dict:
+        with self._lock:
+            return {'key': self.key, 'strategy': self.strategy, 'routed': dict(self._routed), 'scatters': self._scatters,
+                    'shards': {name: ds.getPoolStats() for name, ds in self.shards.items()}}
+
+    def __repr__(self):
+        return f'ShardingTools(key={self.key}, strategy={self.strategy}, shards={self.names})'
+
+
+def with_shard_key(proxy:Callable, ds, signature, shardKey:str)->Callable:
+    """pybatis语句声明shardKey时，调用期间按该参数的值路由分片"""
+    if not isinstance(ds, ShardingTools) or not shardKey:
+        return proxy
+
+    def _shard_value(args, kwargs):
+        bound = signature.bind_partial(*args, **kwargs)
+        bound.apply_defaults()
+        if shardKey not in bound.arguments:
+            raise ValueError(f'{proxy.__qualname__}没有分片键参数{shardKey}')
+        return bound.arguments[shardKey]
+
+    if inspect.iscoroutinefunction(proxy):
+        @functools.wraps(proxy)
+        async def _async_shard_proxy(*args, **kwargs):
+            with ds.route(_shard_value(args, kwargs)):
+                return await proxy(*args, **kwargs)
+        return _async_shard_proxy
+
+    @functools.wraps(proxy)
+    def _shard_proxy(*args, **kwargs):
+        with ds.route(_shard_value(args, kwargs)):
+            return proxy(*args, **kwargs)
+    return _shard_proxy
@@ -0,0 +1,156 @@
+from dataflow.utils.log import Logger
+from jinja2 import Template, nodes, meta
+import datetime
+import decimal
+import threading
+
+_logger = Logger('dataflow.utils.dbtools.sqlrender')
+
+_MISSING = object()
+_PENDING = object()
+
+# 模板变量对渲染结果的影响：只影响条件分支(真假/None/是否定义)，只影响循环次数(长度)，值直接影响输出
+_TEST = 1
+_LEN = 2
+_VALUE = 3
+
+_SHAPE_TESTS = ('none', 'defined', 'undefined')
+_IMMUTABLE = (str, int, float, decimal.Decimal, datetime.date, datetime.time, datetime.timedelta)
+
+
+def _analyse(template:Template, source:str)->list[tuple[str, int]]|None:
+    """分析SQL模板中每个外部变量的使用方式，返回[(变量, 方式)]；include/import/extends等依赖其他模板时返回None(不缓存)"""
+    ast = template.environment.parse(source)
+    if any(True for _ in ast.find_all((nodes.Include, nodes.Import, nodes.FromImport, nodes.Extends))):
+        return None
+    names = meta.find_undeclared_variables(ast)
+    kinds:dict[str, int] = {}
+
+    def _use(name:str, kind:int):
+        kinds[name] = max(kinds.get(name, 0), kind)
+
+    def _visit(node:nodes.Node, parent:nodes.Node, test:bool):
+        # test为True时node只用于判断真假(if条件、not、and/or)
+        if isinstance(node, nodes.Name):
+            if node.ctx == 'load' and node.name in names:
+                if test or (isinstance(parent, nodes.Test) and parent.name in _SHAPE_TESTS):
+                    _use(node.name, _TEST)
+                elif isinstance(parent, nodes.Filter) and parent.name in ('length', 'count'):
+                    _use(node.name, _LEN)
+                else:
+                    _use(node.name, _VALUE)
+            return
+        if isinstance(node, nodes.For):
+            targets = {one.name for one in node.target.find_all(nodes.Name)} | ({node.target.name} if isinstance(node.target, nodes.Name) else set())
+            item_used = node.test is not None or any(one.name in targets for body in node.body + node.else_ for one in body.find_all(nodes.Name))
+            if isinstance(node.iter, nodes.Name) and node.iter.name in names:
+                _use(node.iter.name, _VALUE if item_used else _LEN)   # 循环体只使用loop.index等时只和长度有关
+            else:
+                _visit(node.iter, node, False)
+            if node.test is not None:
+                _visit(node.test, node, False)
+            for child in node.body + node.else_:
+                _visit(child, node, False)
+            return
+        if isinstance(node, (nodes.If, nodes.CondExpr)):
+            _visit(node.test, node, True)
+            children = node.body + node.elif_ + node.else_ if isinstance(node, nodes.If) else [node.expr1, node.expr2]
+            for child in children:
+                if child is not None:
+                    _visit(child, node, False)
+            return
+        if isinstance(node, nodes.Not):
+            _visit(node.node, node, test)
+            return
+        if isinstance(node, (nodes.And, nodes.Or)):
+            _visit(node.left, node, test)
+            _visit(node.right, node, test)
+            return
+        for child in node.iter_child_nodes():
+            _visit(child, node, False)
+
+    _visit(ast, None, False)
+    return sorted(kinds.items())
+
+
+def _shape(value, kind:int):
+    if value is _MISSING:
+        return 0
+    if value is None:
+        return 1
+    if kind == _TEST:
+        return 3 if value else 2
+    if kind == _LEN:
+        return (len(value),)
+    if not isinstance(value, _IMMUTABLE):
+        raise TypeError(f'{type(value)}')   # 对象和容器的内容可能变化，不缓存
+    return (value.__class__, value)
+
+
+class SqlRenderer:
+    """动态SQL渲染缓存：参数值通过:name绑定，渲染出的SQL只取决于条件分支和循环次数，
+    按每个模板变量的形状(是否定义、是否None、真假、列表长度)缓存渲染结果，形状相同的调用直接返回同一个SQL字符串，
+    PydbcTools按SQL字符串缓存text()，因此同时复用编译后的语句；模板中直接输出({{ x }})或者比较的变量按值作为缓存key"""
+    def __init__(self, name:str, template:Template, source:str, maxsize:int=256):
+        self.name = name
+        self.template = template
+        self.maxsize = maxsize
+        self._source = source
+        self._shapes = _PENDING   # 第一次渲染时分析模板，不增加启动时间
+        self._cache:dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    def _analyse(self):
+        try:
+            shapes = _analyse(self.template, self._source)
+        except Exception as e:
+            _logger.WARN(f'分析SQL模板{self.name}失败，不使用渲染缓存:{e}')
+            shapes = None
+        self._shapes = shapes
+        self._source = None
+
+    def render(self, data)->str:
+        if self._shapes is _PENDING:
+            self._analyse()
+        if self._shapes is None or not isinstance(data, dict):
+            return self.template.render(data)
+        try:
+            key = tuple([_shape(data.get(name, _MISSING), kind) for name, kind in self._shapes])
+            sql = self._cache.get(key)
+        except Exception:
+            with self._lock:
+                self.uncached += 1
+            return self.template.render(data)
+        if sql is not None:
+            with self._lock:
+                self.hits += 1
+            return sql
+        sql = self.template.render(data)
+        with self._lock:
+            self.misses += 1
+            if len(self._cache) < self.maxsize:
+                self._cache[key] = sql
+        return sql
+
+    def stats(self)->dict:
+        with self._lock:
+            total = self.hits + self.misses + self.uncached
+            return {'cacheable': None if self._shapes is _PENDING else self._shapes is not None, 'shapes': len(self._cache), 'hits': self.hits,
+                    'misses': self.misses, 'uncached': self.uncached,
+                    'hit_ratio': round(self.hits / total, 4) if total else 0.0}
+
+
+_renderers:dict[str, SqlRenderer] = {}
+
+def renderer(name:str, template:Template, source:str)->SqlRenderer:
+    """创建并登记语句的渲染器，name为namespace.id或者函数全名，同名重新加载时替换"""
+    one = SqlRenderer(name, template, source)
+    _renderers[name] = one
+    return one
+
+def render_stats()->dict[str, dict]:
+    """每个语句的渲染缓存命中率"""
+    return {name: one.stats() for name, one in list(_renderers.items())}
@@ -0,0 +1,171 @@
+from dataflow.utils.log import Logger
+import contextvars
+import contextlib
+import functools
+import hashlib
+import re
+import threading
+
+_logger = Logger('dataflow.utils.dbtools.sqlstats')
+
+# 当前执行的pybatis语句，namespace.id或者函数全名，PydbcTools记录SQL统计时使用
+sql_statement:contextvars.ContextVar[str] = contextvars.ContextVar('sql_statement', default=None)
+
+@contextlib.contextmanager
+def statement(name:str):
+    token = sql_statement.set(name)
+    try:
+        yield
+    finally:
+        sql_statement.reset(token)
+
+
+_COMMENTS = re.compile(r'/\*.*?\*/|--[^\n]*', re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'(?<![\w$.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+_BINDS = re.compile(r'(?<!:):[A-Za-z_]\w*|%\(\w+\)s|%s|\$\d+|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUES_LIST = re.compile(r'(\(\?\+?\))(?:\s*,\s*\(\?\+?\))+')
+_SPACES = re.compile(r'\s+')
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql:str)->str:
+    """SQL指纹，去掉注释，字符串、数字和绑定参数替换为?，IN列表和多行VALUES合并，空白压缩并转小写"""
+    sql = _COMMENTS.sub(' ', sql)
+    sql = _STRINGS.sub('?', sql)
+    sql = _BINDS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _SPACES.sub(' ', sql).strip().lower()
+    sql = _IN_LIST.sub('(?+)', sql)
+    return _VALUES_LIST.sub(r'\1+', sql)
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'id', 'statement', 'calls', 'errors', 'rows', 'total', 'max', 'counts')
+
+    def __init__(self, fingerprint:str, buckets:int):
+        self.fingerprint = fingerprint
+        self.id = hashlib.sha1(fingerprint.encode()).hexdigest()[:12]
+        self.statement = None
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.counts = [0] * buckets
+
+
+class SqlStats:
+    """按SQL指纹统计执行次数、耗时(总计/p50/p99/最大)和行数，最多保留size个指纹，超出时淘汰总耗时最小的指纹
+    耗时分桶统计，分位数按桶内线性插值估算，同时用于Prometheus histogram导出"""
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name:str, size:int=500, slow_ms:float=1000):
+        self.name = name
+        self.size = size
+        self.slow = slow_ms / 1000 if slow_ms is not None and slow_ms >= 0 else None
+        self.buckets = self.BUCKETS + (float('inf'),)
+        self._entries:dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._evicted = 0
+
+    def record(self, sql:str, seconds:float, rows:int=0, error:bool=False, params=None)->_Entry:
+        fp = fingerprint(sql)
+        stmt = sql_statement.get()
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None:
+                if len(self._entries) >= self.size:
+                    del self._entries[min(self._entries.values(), key=lambda one: one.total).fingerprint]
+                    self._evicted += 1
+                entry = self._entries[fp] = _Entry(fp, len(self.buckets))
+            entry.calls += 1
+            entry.total += seconds
+            entry.rows += rows if rows and rows > 0 else 0
+            if error:
+                entry.errors += 1
+            if seconds > entry.max:
+                entry.max = seconds
+            if stmt is not None:
+                entry.statement = stmt
+            for i, le in enumerate(self.buckets):
+                if seconds <= le:
+                    entry.counts[i] += 1
+                    break
+        if self.slow is not None and seconds >= self.slow:
+            _logger.WARN(f'慢SQL[{self.name}] {seconds*1000:.1f}ms statement={stmt} fingerprint={entry.id} rows={rows}\n[SQL]:{sql}\n[Parameter]:{_short(params)}')
+        return entry
+
+    def add_rows(self, entry:_Entry, rows:int):
+        """查询的行数在取完结果后补充"""
+        with self._lock:
+            entry.rows += rows
+
+    def _quantile(self, entry:_Entry, q:float)->float:
+        rank = q * entry.calls
+        seen = 0
+        lower = 0.0
+        for le, cnt in zip(self.buckets, entry.counts):
+            if cnt and seen + cnt >= rank:
+                upper = entry.max if le == float('inf') or le > entry.max else le
+                return lower + (upper - lower) * (rank - seen) / cnt
+            seen += cnt
+            lower = le
+        return entry.max
+
+    def top(self, n:int=20, order:str='total')->list[dict]:
+        """按total(总耗时)、calls、avg、max、rows、errors排序的前n个指纹"""
+        keys = {
+            'total': lambda one: one.total,
+            'calls': lambda one: one.calls,
+            'avg': lambda one: one.total / one.calls,
+            'max': lambda one: one.max,
+            'rows': lambda one: one.rows,
+            'errors': lambda one: one.errors,
+        }
+        if order not in keys:
+            raise ValueError(f'不支持的排序{order}，可选{list(keys)}')
+        with self._lock:
+            entries = sorted(self._entries.values(), key=keys[order], reverse=True)[:n]
+            return [{
+                'id': one.id,
+                'fingerprint': one.fingerprint,
+                'statement': one.statement,
+                'calls': one.calls,
+                'errors': one.errors,
+                'rows': one.rows,
+                'total_ms': round(one.total * 1000, 3),
+                'avg_ms': round(one.total * 1000 / one.calls, 3),
+                'p50_ms': round(self._quantile(one, 0.5) * 1000, 3),
+                'p99_ms': round(self._quantile(one, 0.99) * 1000, 3),
+                'max_ms': round(one.max * 1000, 3),
+            } for one in entries]
+
+    def histograms(self)->list[dict]:
+        """每个指纹的累计分桶，Prometheus导出使用"""
+        with self._lock:
+            rtn = []
+            for one in self._entries.values():
+                total = 0
+                cumulative = []
+                for le, cnt in zip(self.buckets, one.counts):
+                    total += cnt
+                    cumulative.append((le, total))
+                rtn.append({'id': one.id, 'statement': one.statement, 'buckets': cumulative, 'sum': one.total,
+                            'calls': one.calls, 'errors': one.errors, 'rows': one.rows})
+            return rtn
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._evicted = 0
+
+    def stats(self)->dict:
+        with self._lock:
+            return {'fingerprints': len(self._entries), 'size': self.size, 'evicted': self._evicted,
+                    'slow_ms': self.slow * 1000 if self.slow is not None else None}
+
+
+def _short(params, limit:int=500)->str:
+    text = repr(params)
+    return text if len(text) <= limit else text[:limit] + '...'
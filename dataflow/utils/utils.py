@@ -703,7 +703,8 @@ class PageResult:
         pagesize: int =10,
         page: int = 1,
         totalPage: int = 0,
-        list: Optional[List[Any]] = None
+        list: Optional[List[Any]] = None,
+        cursor: Optional[str] = None
     ):
         """
         初始化 ValueObject 类的实例。
@@ -712,12 +713,14 @@ class PageResult:
         :param page: 当前页码，默认为 1
         :param totalPage: 总页数，默认为 1
         :param list: 当前页的记录列表，默认为空列表
+        :param cursor: keyset分页的下一页游标，最后一页或OFFSET分页为None
         """
         self.total = total
         self.pagesize = pagesize
         self.page = page
         self.totalPage = totalPage
         self.list = list if list is not None else []
+        self.cursor = cursor
 
     def __eq__(self, other):
         """
@@ -728,7 +731,8 @@ class PageResult:
                     self.pagesize == other.pagesize and
                     self.page == other.page and
                     self.totalPage == other.totalPage and
-                    self.list == other.list)
+                    self.list == other.list and
+                    self.cursor == other.cursor)
         return False
 
     def __hash__(self):
@@ -746,6 +750,7 @@ class PageResult:
             "page": self.page,
             "totalPage": self.totalPage,
             "list": self.list,
+            "cursor": self.cursor,
         }
 
     
@@ -754,7 +759,7 @@ class PageResult:
         定义对象的字符串表示。
         """
         return (f"PageResult(total={self.total}, pagesize={self.pagesize}, "
-                f"page={self.page}, totalPage={self.totalPage}, list={self.list})")
+                f"page={self.page}, totalPage={self.totalPage}, cursor={self.cursor}, list={self.list})")
 
 class ReponseVO:
     # status: bool = Field(True, description="响应状态")
@@ -13,6 +13,8 @@ from fastapi.encoders import jsonable_encoder as original_jsonable_encoder
 from dataflow.utils.utils import date2str_yyyymmddddmmss, has_method
 from datetime import datetime, date
 import fastapi.encoders
+import csv
+import io
 
 _logger = Logger('dataflow.utils.web.asgi')
 
@@ -134,6 +136,52 @@ def getRequestHeader(request:Request, name:str, dv:str=None)->str:
     return dv
     
 
+
+def _flatten_rows(row):
+    # queryStream(chunked=True)返回的是list[dict]
+    return row if isinstance(row, list) else (row,)
+
+def ndjson_stream(rows):
+    """把queryStream/aqueryStream的行迭代器转换成NDJSON字节流，直接作为StreamingResponse(media_type='application/x-ndjson')的内容
+    同步迭代器由Starlette放到线程池里迭代，不阻塞事件循环"""
+    def _line(row)->bytes:
+        return ''.join(json_to_str(one) + '\n' for one in _flatten_rows(row)).encode('utf-8')
+    
+    if hasattr(rows, '__aiter__'):
+        async def _agen():
+            async for row in rows:
+                yield _line(row)
+        return _agen()
+    return (_line(row) for row in rows)
+
+def csv_stream(rows, header:list[str]=None):
+    """把queryStream/aqueryStream的行迭代器转换成CSV字节流，header为空时使用第一行的字段名"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    fields = list(header) if header else None
+    if fields:
+        writer.writerow(fields)
+    
+    def _line(row)->bytes:
+        nonlocal fields
+        for one in _flatten_rows(row):
+            if fields is None:
+                fields = list(one.keys())
+                writer.writerow(fields)
+            writer.writerow([one.get(k) for k in fields])
+        v = buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+        return v.encode('utf-8')
+    
+    if hasattr(rows, '__aiter__'):
+        async def _agen():
+            async for row in rows:
+                yield _line(row)
+        return _agen()
+    return (_line(row) for row in rows)
+
+
 if __name__ == "__main__":
     matcher = AntPathMatcher()
     def test_match(str1,str2):
@@ -150,5 +198,3 @@ if __name__ == "__main__":
     test_match("*/api/**", "/aaa/api/") # 输出: True    
     test_match("*/api/**", "aaa/api/") # 输出: True    
     test_match("**/api/**", "/test/aaa/api/") # 输出: True    
-
-
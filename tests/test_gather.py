@@ -0,0 +1,28 @@
+"""gather回归测试，使用sqlite临时库
+
+PYTHONPATH=. python -m pytest tests/test_gather.py
+"""
+import asyncio
+import logging
+import os
+
+logging.disable(logging.CRITICAL)
+
+from dataflow.utils.dbtools.pydbc import PydbcTools  # noqa: E402
+from dataflow.utils.dbtools.gather import gather  # noqa: E402
+
+
+def test_gather_without_async_driver(tmp_path):
+    """配置了async_enabled但是没有异步驱动时和pybatis一样在线程池中执行同步方法"""
+    path = os.path.join(tmp_path, 'gather.db')
+    p = PydbcTools(url=f'sqlite:///{path}', async_url=f'sqlite+nosuchdriver:///{path}', async_enabled=True)
+    p.update('create table t(id integer primary key)')
+    p.batch('insert into t(id) values(:id)', [{'id': i} for i in range(1, 6)])
+
+    async def main():
+        return await gather([(p, 'select count(*) c from t', None, 'queryOne'), (p, 'select id from t order by id')],
+                            return_exceptions=False)
+
+    one, many = asyncio.run(main())
+    assert one.get() == {'c': 5} and [row['id'] for row in many.get()] == [1, 2, 3, 4, 5]
+    assert not p.isAsyncSupported()
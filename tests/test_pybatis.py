@@ -0,0 +1,137 @@
+"""pybatis回归测试，使用sqlite临时库
+
+PYTHONPATH=. python -m pytest tests/test_pybatis.py
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, AsyncIterator, Optional
+
+logging.disable(logging.CRITICAL)
+
+from dataflow.utils.dbtools import pybatis  # noqa: E402
+from dataflow.utils.dbtools.pydbc import PydbcTools, TX  # noqa: E402
+from dataflow.utils.dbtools.pybatis import SELECT, UPDATE, PageMode, _flush_after_commit  # noqa: E402
+from dataflow.utils.dbtools.namespacecache import NamespaceCache  # noqa: E402
+from dataflow.utils.utils import PageResult  # noqa: E402
+
+
+def _create_db(path, rows:int=25, **kwargs)->PydbcTools:
+    p = PydbcTools(url=f'sqlite:///{os.path.join(path, "pybatis.db")}', **kwargs)
+    p.update('create table t(id integer primary key, v int)')
+    p.batch('insert into t(id, v) values(:id, :v)', [{'id': i, 'v': i} for i in range(1, rows + 1)])
+    return p
+
+
+def test_async_stub_does_not_create_async_engine(tmp_path):
+    """没有配置async_enabled时协程存根在线程池中执行同步方法，加入async函数上TX的同步Session"""
+    p = _create_db(tmp_path)
+
+    @UPDATE(p, sql='insert into t(id, v) values(:id, :v)')
+    async def insert(id:int, v:int)->int: ...
+
+    @SELECT(p, sql='select count(*) from t')
+    async def count()->int: ...
+
+    @TX(p)
+    async def work():
+        await insert(100, 1)
+        assert await count() == 26
+        p.update('insert into t(id, v) values(:id, :v)', {'id': 101, 'v': 1})
+        raise ValueError('rollback')
+
+    async def main():
+        assert await count() == 25
+        try:
+            await work()
+        except ValueError:
+            pass
+        return await count()
+
+    assert asyncio.run(main()) == 25
+    assert p.async_engine is None
+
+
+def test_optional_page_mode_parameter(tmp_path):
+    """Optional[PageMode]、PageMode | None和Any声明的参数传入PageMode时分页查询"""
+    p = _create_db(tmp_path)
+
+    @SELECT(p, 'select * from t order by id')
+    def optional(page:Optional[PageMode]=None): ...
+
+    @SELECT(p, 'select * from t order by id')
+    def union(page:PageMode|None=None): ...
+
+    @SELECT(p, 'select * from t order by id')
+    def any(page:Any=None): ...
+
+    @SELECT(p, 'select * from t where id > :id order by id')
+    def plain(id:int, page:int=None): ...
+
+    for query in (optional, union, any):
+        rtn = query(PageMode(pageno=2, pagesize=10))
+        assert isinstance(rtn, PageResult)
+        assert rtn.total == 25 and [one['id'] for one in rtn.list] == list(range(11, 21))
+        assert query() == {'id': 1, 'v': 1}
+    assert plain(24) == {'id': 25, 'v': 25}
+
+
+def test_namespace_cache_flushed_once_after_commit(tmp_path):
+    """事务中多次写只注册一个提交监听，提交后每个namespace缓存清空一次，回滚不清空"""
+    p = _create_db(tmp_path)
+    cache, other = NamespaceCache('test.a'), NamespaceCache('test.b')
+
+    @TX(p)
+    def work(fail:bool=False):
+        session = p.getTxSession()
+        for i in range(1000):
+            _flush_after_commit(session, cache)
+        _flush_after_commit(session, other)
+        assert len(session.dispatch.after_commit) == 1
+        if fail:
+            raise ValueError('rollback')
+
+    work()
+    assert cache.stats()['flushes'] == 1 and other.stats()['flushes'] == 1
+    try:
+        work(True)
+    except ValueError:
+        pass
+    assert cache.stats()['flushes'] == 1
+
+
+def test_async_stream_threads_bounded(tmp_path, monkeypatch):
+    """没有异步驱动时并发的异步流最多占用_STREAM_WORKERS个线程，提前break后游标关闭并归还线程"""
+    monkeypatch.setattr(pybatis, '_STREAM_WORKERS', 2)
+    p = _create_db(tmp_path)
+
+    @SELECT(p, 'select * from t order by id', fetchSize=3)
+    def stream()->AsyncIterator[dict]: ...
+
+    async def consume()->list:
+        ids = []
+        async for one in stream():
+            ids.append(one['id'])
+            await asyncio.sleep(0.001)
+        return ids
+
+    async def first(n:int)->list:
+        ids = []
+        async for one in stream():
+            ids.append(one['id'])
+            if len(ids) == n:
+                break
+        return ids
+
+    async def main():
+        threads = threading.active_count()
+        rtn = await asyncio.gather(*[consume() for i in range(6)])
+        assert threading.active_count() - threads <= 2
+        assert await first(4) == [1, 2, 3, 4]
+        await asyncio.sleep(0.05)   # break后异步生成器由事件循环的finalizer关闭
+        assert p.getPoolStats()['checkedout'] == 0
+        assert len(pybatis._get_stream_lanes()._free) == 2
+        return rtn
+
+    assert asyncio.run(main()) == [list(range(1, 26))] * 6
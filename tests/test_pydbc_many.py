@@ -0,0 +1,46 @@
+"""insertManyT回归测试
+
+PYTHONPATH=. python -m pytest tests/test_pydbc_many.py
+"""
+import logging
+
+logging.disable(logging.CRITICAL)
+
+from dataflow.utils.dbtools.pydbc import PydbcTools  # noqa: E402
+
+
+def test_mysql_lastid_backfill():
+    """mysql按LAST_INSERT_ID()和auto_increment_increment回填，交错锁模式下多行不回填"""
+    rows = [{'v': i} for i in range(3)]
+    PydbcTools._backfill_lastid(rows, 'id', (10, 1, 1))
+    assert [one['id'] for one in rows] == [10, 11, 12]
+
+    rows = [{'v': i} for i in range(3)]
+    PydbcTools._backfill_lastid(rows, 'id', (11, 10, 1))   # 多主环境auto_increment_increment=10
+    assert [one['id'] for one in rows] == [11, 21, 31]
+
+    rows = [{'v': i} for i in range(3)]
+    PydbcTools._backfill_lastid(rows, 'id', (10, 1, 2))
+    assert all('id' not in one for one in rows)
+
+    rows = [{'v': 0}]
+    PydbcTools._backfill_lastid(rows, 'id', (10, 1, 2))
+    assert rows[0]['id'] == 10
+
+
+def test_upsert_dedup_conflict_rows(tmp_path, monkeypatch):
+    """同一批中冲突列相同的行只保留最后一行，冲突列为NULL的行保留；mariadb按mysql生成ON DUPLICATE KEY"""
+    p = PydbcTools(url=f'sqlite:///{tmp_path}/many.db')
+    p.update('create table t(id integer primary key, k int, v int)')
+    p.update('create unique index t_k on t(k)')
+    rows = [{'k': 1, 'v': 1}, {'k': 2, 'v': 2}, {'k': 1, 'v': 3}, {'k': None, 'v': 4}, {'k': None, 'v': 5}]
+    assert p.upsertManyT('t', rows, conflict_cols=['k']) == 4
+    assert p.queryMany('select k, v from t order by v') == \
+        [{'k': 2, 'v': 2}, {'k': 1, 'v': 3}, {'k': None, 'v': 4}, {'k': None, 'v': 5}]
+
+    monkeypatch.setattr(p, 'getDbType', lambda: 'mariadb')
+    info = {**p.get_table_info('t'), 'auto_increment_column': 'id'}
+    plans = p._plan_manyT('t', info, [{'k': 1, 'v': 1}, {'k': 1, 'v': 2}], 1000, ['k'], upsert=True)
+    assert len(plans) == 1 and 'ON DUPLICATE KEY UPDATE `v` = VALUES(`v`)' in plans[0][0] and len(plans[0][2]) == 1
+    plans = p._plan_manyT('t', info, [{'k': 3, 'v': 1}], 1000)
+    assert plans[0][0].endswith('RETURNING `id`') and plans[0][4] == 'returning'
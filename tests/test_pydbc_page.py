@@ -0,0 +1,83 @@
+"""queryPage回归测试，使用sqlite临时库
+
+PYTHONPATH=. python -m pytest tests/test_pydbc_page.py
+"""
+import asyncio
+import logging
+import os
+
+logging.disable(logging.CRITICAL)
+
+from dataflow.utils.dbtools.pydbc import PydbcTools  # noqa: E402
+from dataflow.utils.dbtools.pybatis import SELECT, PageMode  # noqa: E402
+from sqlalchemy.exc import SQLAlchemyError  # noqa: E402
+
+
+def _create_db(path, **kwargs)->PydbcTools:
+    p = PydbcTools(url=f'sqlite:///{os.path.join(path, "page.db")}', **kwargs)
+    p.update('create table t(id integer primary key, v int)')
+    p.batch('insert into t(id, v) values(:id, :v)', [{'id': i, 'v': i % 3} for i in range(1, 26)])
+    return p
+
+
+def _ids(rtn)->list:
+    return [one['id'] for one in rtn.list]
+
+
+def test_keyset_page_without_cursor(tmp_path):
+    """order_by分页没有after时按page定位，返回的cursor可以继续翻页"""
+    p = _create_db(tmp_path)
+    rtn = p.queryPage('select * from t', None, 2, 10, order_by='id desc')
+    assert rtn.page == 2 and rtn.total == 25 and _ids(rtn) == list(range(15, 5, -1))
+    rtn = p.queryPage('select * from t', None, 3, 10, order_by='id desc', after=rtn.cursor)
+    assert _ids(rtn) == list(range(5, 0, -1)) and rtn.cursor is None
+    assert _ids(p.queryPage('select * from t', None, 3, 10, order_by=['v', 'id'])) == \
+        [one['id'] for one in p.queryMany('select * from t order by v, id')][20:]
+
+    async def main():
+        rtn = await p.aqueryPage('select * from t', None, 2, 10, order_by='id')
+        await p.adispose()
+        return rtn
+
+    rtn = asyncio.run(main())
+    assert rtn.page == 2 and _ids(rtn) == list(range(11, 21))
+
+
+def test_page_mode_orderby(tmp_path):
+    p = _create_db(tmp_path)
+
+    @SELECT(p, 'select * from t')
+    def query(page:PageMode): ...
+
+    assert _ids(query(PageMode(pageno=2, pagesize=10, orderby=['id']))) == list(range(11, 21))
+
+
+def _walk(p, sql, order_by, pagesize=4)->list:
+    ids, cursor = [], None
+    while True:
+        rtn = p.queryPage(sql, None, 1, pagesize, order_by=order_by, after=cursor)
+        ids.extend(_ids(rtn))
+        cursor = rtn.cursor
+        if cursor is None:
+            return ids
+
+
+def test_keyset_null_columns(tmp_path):
+    """排序列包含NULL时ASC(NULL在前)和DESC(NULL在后)都不丢行"""
+    p = _create_db(tmp_path)
+    p.update('update t set v = null where id % 4 = 0 or id in (1, 2, 3)')
+    for order_by in (['v', 'id'], 'v desc, id', 'v desc, id desc', ['v', 'id desc']):
+        expect = [one['id'] for one in p.queryMany(f'select * from t order by {order_by if isinstance(order_by, str) else ", ".join(order_by)}')]
+        assert _walk(p, 'select * from t', order_by) == expect
+        assert _walk(p, 'select * from t', order_by, 5) == expect
+
+
+def test_keyset_duplicate_columns(tmp_path):
+    """排序列组合不唯一并且相同值跨页时抛出异常，加上唯一列后完整翻页"""
+    p = _create_db(tmp_path)
+    try:
+        _walk(p, 'select * from t', 'v')
+        assert False, '排序列重复时应该抛出异常'
+    except SQLAlchemyError:
+        pass
+    assert sorted(_walk(p, 'select * from t', 'v, id')) == list(range(1, 26))
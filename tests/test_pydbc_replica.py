@@ -0,0 +1,43 @@
+"""只读副本回归测试，使用sqlite临时库
+
+PYTHONPATH=. python -m pytest tests/test_pydbc_replica.py
+"""
+import logging
+import os
+
+logging.disable(logging.CRITICAL)
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from dataflow.utils.dbtools.pydbc import PydbcTools  # noqa: E402
+
+
+def _create_db(path, name:str, v:int)->str:
+    url = f'sqlite:///{os.path.join(path, name)}'
+    p = PydbcTools(url=url)
+    p.update('create table t(id integer primary key, v int)')
+    p.update('insert into t(id, v) values(1, :v)', {'v': v})
+    p.engine.dispose()
+    return url
+
+
+def test_replica_sql_error_keeps_healthy(tmp_path):
+    """SQL错误直接抛出，不标记副本不可用，也不在主库重试"""
+    p = PydbcTools(url=_create_db(tmp_path, 'primary.db', 0), replicas=[_create_db(tmp_path, 'replica.db', 1)])
+    assert p.queryOne('select v from t') == {'v': 1}
+    try:
+        p.queryMany('select nosuchcol from t')
+        assert False, 'SQL错误应该抛出'
+    except OperationalError:
+        pass
+    stats = p._replicas.stats()[0]
+    assert stats['healthy'] and stats['errors'] == 0
+    assert p.queryOne('select v from t') == {'v': 1}
+
+
+def test_replica_connect_error_falls_back(tmp_path):
+    """副本连接失败时标记不可用并在主库执行"""
+    replica = f'sqlite:///{os.path.join(tmp_path, "missing", "replica.db")}'
+    p = PydbcTools(url=_create_db(tmp_path, 'primary.db', 0), replicas=[replica], replica_check_interval=3600)
+    assert p.queryOne('select v from t') == {'v': 0}
+    stats = p._replicas.stats()[0]
+    assert not stats['healthy'] and stats['errors'] == 1
@@ -0,0 +1,150 @@
+"""TX事务回归测试，使用sqlite临时库
+
+PYTHONPATH=. python -m pytest tests/test_pydbc_tx.py
+"""
+import asyncio
+import logging
+import os
+
+import pytest
+
+logging.disable(logging.CRITICAL)
+
+from dataflow.utils.dbtools.pydbc import PydbcTools, TX, ExecutorType  # noqa: E402
+
+
+def _create_db(path, **kwargs)->PydbcTools:
+    p = PydbcTools(url=f'sqlite:///{os.path.join(path, "tx.db")}', **kwargs)
+    p.update('create table t(id integer primary key, v int)')
+    return p
+
+
+def test_async_tx_rollback_after_async_engine_created(tmp_path):
+    """没有配置async_enabled时，异步引擎是否已经创建不影响async函数上的TX使用同步Session"""
+    p = _create_db(tmp_path)
+
+    @TX(p)
+    async def work():
+        p.update('insert into t(id, v) values(:id, :v)', {'id': 1, 'v': 1})
+        raise ValueError('rollback')
+
+    async def main():
+        with pytest.raises(ValueError):
+            await work()
+        before = p.queryCount('select * from t')
+        await p.aqueryMany('select * from t')   # 创建异步引擎
+        with pytest.raises(ValueError):
+            await work()
+        await p.adispose()
+        return before, p.queryCount('select * from t')
+
+    assert asyncio.run(main()) == (0, 0)
+
+
+def test_sync_method_in_async_session_tx_raises(tmp_path):
+    """async_enabled时async函数上的TX使用AsyncSession，同步方法不能加入该事务"""
+    p = _create_db(tmp_path, async_enabled=True)
+
+    @TX(p)
+    async def work():
+        p.update('insert into t(id, v) values(:id, :v)', {'id': 1, 'v': 1})
+
+    @TX(p)
+    async def awork():
+        await p.aupdate('insert into t(id, v) values(:id, :v)', {'id': 2, 'v': 1})
+        raise ValueError('rollback')
+
+    async def main():
+        with pytest.raises(Exception, match='异步事务'):
+            await work()
+        with pytest.raises(ValueError):
+            await awork()
+        await p.adispose()
+
+    asyncio.run(main())
+    assert p.queryCount('select * from t') == 0
+
+
+_INSERT = 'insert into t(id, v) values(:id, :v)'
+
+
+def test_batch_tx_rowcount(tmp_path):
+    """BATCH事务中的语句返回-1，相邻的相同SQL合并为一次executemany，查询前执行"""
+    p = _create_db(tmp_path, batch_size=1000)
+
+    @TX(p, executor=ExecutorType.BATCH)
+    def work():
+        rtns = [p.insert(_INSERT, {'id': i, 'v': i}) for i in range(2500)]
+        rtns.append(p.update('update t set v=0 where id<:id', {'id': 10}))
+        count = p.queryCount('select * from t')
+        return rtns, count, p.flushStatements()
+
+    rtns, count, results = work()
+    assert set(rtns) == {-1} and count == 2500
+    assert [(one.size, one.rowcount) for one in results] == [(1000, 1000), (1000, 1000), (500, 500), (1, 10)]
+    assert p.queryCount('select * from t where v=0') == 10
+
+
+def test_batch_tx_rollback(tmp_path):
+    p = _create_db(tmp_path)
+
+    @TX(p, executor=ExecutorType.BATCH)
+    def work():
+        p.insert(_INSERT, {'id': 1, 'v': 1})
+        raise ValueError('rollback')
+
+    with pytest.raises(ValueError):
+        work()
+    assert p.queryCount('select * from t') == 0
+
+    @TX(p)
+    def outer():
+        p.insert(_INSERT, {'id': 2, 'v': 1})
+        with pytest.raises(ValueError):
+            work()
+
+    outer()
+    assert p.queryCount('select * from t') == 0   # 内层异常回滚整个Session
+
+
+def test_nested_batch_tx_restores_simple(tmp_path):
+    """外层SIMPLE事务调用BATCH的TX，返回后外层的语句仍然立即执行，内层排队的语句在返回前执行"""
+    p = _create_db(tmp_path)
+
+    @TX(p, executor=ExecutorType.BATCH)
+    def inner():
+        assert p.insert(_INSERT, {'id': 2, 'v': 1}) == -1
+        assert p.insert(_INSERT, {'id': 3, 'v': 1}) == -1
+
+    @TX(p)
+    def outer():
+        assert p.insert(_INSERT, {'id': 1, 'v': 1}) == 1
+        inner()
+        assert p._batch_queue(p.getTxSession()).pending == []
+        assert p.update('update t set v=2 where id>:id', {'id': 0}) == 3
+        assert p.insert(_INSERT, {'id': 4, 'v': 1}) == 1
+
+    outer()
+    assert p.queryCount('select * from t') == 4
+
+
+def test_nested_batch_async_session_tx(tmp_path):
+    p = _create_db(tmp_path, async_enabled=True)
+
+    @TX(p, executor=ExecutorType.BATCH)
+    async def inner():
+        assert await p.ainsert(_INSERT, {'id': 2, 'v': 1}) == -1
+
+    @TX(p)
+    async def outer():
+        assert await p.ainsert(_INSERT, {'id': 1, 'v': 1}) == 1
+        await inner()
+        assert await p.aupdate('update t set v=2 where id>:id', {'id': 0}) == 2
+
+    async def main():
+        await outer()
+        rtn = await p.aqueryCount('select * from t where v=2')
+        await p.adispose()
+        return rtn
+
+    assert asyncio.run(main()) == 2
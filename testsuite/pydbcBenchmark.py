@@ -0,0 +1,204 @@
+"""PydbcTools性能对比，使用sqlite临时库
+
+PYTHONPATH=. python testsuite/pydbcBenchmark.py frame 1000000
+PYTHONPATH=. python testsuite/pydbcBenchmark.py statement 100000
+PYTHONPATH=. python testsuite/pydbcBenchmark.py bulk 1000000
+PYTHONPATH=. python testsuite/pydbcBenchmark.py mapper 20000
+PYTHONPATH=. python testsuite/pydbcBenchmark.py model 10000
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+logging.disable(logging.CRITICAL)
+
+from dataflow.utils.dbtools.pydbc import PydbcTools  # noqa: E402
+from dataflow.utils.utils import dataframe_fillna, PageResult  # noqa: E402
+import pandas as pd  # noqa: E402
+from pydantic import BaseModel  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+
+def _create_db(rows:int, **kwargs)->PydbcTools:
+    file = os.path.join(tempfile.gettempdir(), f'pydbc_benchmark_{rows}.db')
+    p = PydbcTools(url=f'sqlite:///{file}', **kwargs)
+    if p.queryOne("select count(1) cnt from sqlite_master where type='table' and name='t_bench'")['cnt'] == 0 \
+            or p.queryCount('select * from t_bench') != rows:
+        p.update('drop table if exists t_bench')
+        p.update('create table t_bench(id integer primary key, code text, price real, volume integer, tradedate text)')
+        with p.engine.begin() as connection:
+            connection.exec_driver_sql(
+                'insert into t_bench(id, code, price, volume, tradedate) values(?, ?, ?, ?, ?)',
+                [(i, f'{i % 5000:06d}', i * 0.01, i % 100000, '2025-10-01') for i in range(rows)]
+            )
+    return p
+
+
+def _timeit(name:str, func, repeat:int=3):
+    costs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rtn = func()
+        costs.append(time.perf_counter() - start)
+    print(f'{name:<40} best={min(costs)*1000:10.1f}ms')
+    return rtn
+
+
+def bench_frame(rows:int):
+    p = _create_db(rows)
+    sql = 'select id, code, price, volume, tradedate from t_bench'
+    print(f'== queryMany->DataFrame VS queryFrame/queryColumns, {rows}行')
+
+    def current_path():
+        return dataframe_fillna(pd.DataFrame(p.queryMany(sql)))
+
+    df1 = _timeit('queryMany + DataFrame + dataframe_fillna', current_path)
+    _timeit('queryMany + DataFrame', lambda: pd.DataFrame(p.queryMany(sql)))
+    df2 = _timeit('queryFrame', lambda: p.queryFrame(sql))
+    _timeit('queryColumns', lambda: p.queryColumns(sql))
+    print(f'结果行数 {len(df1)}/{len(df2)}')
+
+
+def bench_statement(calls:int):
+    sql = """select id, code, price, volume, tradedate from t_bench
+             where id = :id and code = :code and volume >= :volume"""
+    p = _create_db(10000)
+    print(f'== text()语句缓存，单条查询{calls}次')
+    _percall('text(sql)', lambda: text(sql), calls)
+    _percall('PydbcTools._text(sql)', lambda: p._text(sql), calls)
+    with p.engine.connect() as connection:
+        params = {'id': 1, 'code': '000001', 'volume': 0}
+        _percall('execute(text(sql))', lambda: connection.execute(text(sql), params).fetchone(), calls)
+        _percall('execute(PydbcTools._text(sql))', lambda: connection.execute(p._text(sql), params).fetchone(), calls)
+    for size in (0, 1024):
+        p = _create_db(10000, statement_cache_size=size)
+        _percall(f'queryOne statement_cache_size={size}', lambda: p.queryOne(sql, params), calls)
+    print(p.getStatementCacheStats())
+
+
+def bench_bulk(rows:int):
+    file = os.path.join(tempfile.gettempdir(), 'pydbc_benchmark_bulk.db')
+    p = PydbcTools(url=f'sqlite:///{file}')
+    print(f'== batch VS bulkLoad，写入{rows}行')
+
+    def _reset():
+        p.update('drop table if exists t_bulk')
+        p.update('create table t_bulk(id integer primary key, code text, price real, volume integer, tradedate text)')
+
+    def _rows():
+        return ((i, f'{i % 5000:06d}', i * 0.01, i % 100000, '2025-10-01') for i in range(rows))
+
+    _reset()
+    _timeit('batch batchsize=100', lambda: p.batch('insert into t_bulk values(?, ?, ?, ?, ?)', _rows(), 100), repeat=1)
+    _reset()
+    rtn = _timeit('bulkLoad batchsize=10000', lambda: p.bulkLoad('t_bulk', _rows()), repeat=1)
+    print(f'{"":<40} {rtn}')
+
+
+class _FixedResult:
+    """返回预先从sqlite取出的结果，只计算映射方法本身的开销"""
+    def __init__(self, p:PydbcTools, one_sql:str, many_sql:str):
+        self.one = p.queryOne(one_sql, {'id': 1})
+        self.many = p.queryMany(many_sql, {'id': 10})
+        self.page = p.queryPage(many_sql, {'id': 10}, 1, 10, count='none')
+
+    def getSqlStats(self):
+        return None
+
+    def queryOne(self, sql, params=None, cache=None):
+        return dict(self.one)
+
+    def queryMany(self, sql, params=None, cache=None):
+        return list(self.many)
+
+    def queryPage(self, sql, params=None, page=1, pagesize=10, order_by=None, after=None, count=None, cache=None):
+        return PageResult(self.page.total, pagesize, page, self.page.totalPage, list(self.page.list))
+
+
+def bench_mapper(calls:int):
+    from dataflow.utils.dbtools.pybatis import SELECT, PageMode
+    p = _create_db(10000)
+    one_sql = 'select id, code, price from t_bench where id = :id'
+    many_sql = 'select id, code, price from t_bench where id < :id'
+    fixed = _FixedResult(p, one_sql, many_sql)
+    page = PageMode(pageno=1, pagesize=10, count='none')
+    print(f'== pybatis映射方法的调用开销，{calls}次')
+
+    for name, ds in (('sqlite', p), ('固定结果', fixed)):
+        @SELECT(ds, one_sql)
+        def select_one(id:int)->dict: ...
+
+        @SELECT(ds, 'select code from t_bench where id = :id')
+        def select_code(id:int)->str: ...
+
+        @SELECT(ds, many_sql)
+        def select_many(id:int)->list: ...
+
+        @SELECT(ds, many_sql)
+        def select_page(id:int, page:PageMode)->PageResult: ...
+
+        cases = [
+            ('queryOne', lambda: ds.queryOne(one_sql, {'id': 1}), lambda: select_one(1)),
+            ('queryOne 单列', lambda: ds.queryOne('select code from t_bench where id = :id', {'id': 1}), lambda: select_code(1)),
+            ('queryMany', lambda: ds.queryMany(many_sql, {'id': 10}), lambda: select_many(10)),
+            ('queryPage', lambda: ds.queryPage(many_sql, {'id': 10, 'page': page}, 1, 10, count='none'), lambda: select_page(10, page)),
+        ]
+        for case, direct, mapper in cases:
+            base = _percall(f'{name} {case} 直接调用', direct, calls)
+            cost = _percall(f'{name} {case} @SELECT', mapper, calls)
+            print(f'{"":<40} 映射开销{(cost - base)*1e6/calls:8.2f}us')
+
+
+class BenchRow(BaseModel):
+    id: int
+    code: str
+    price: float
+    volume: int
+    tradedate: str
+
+
+def bench_model(rows:int):
+    from dataflow.utils.dbtools.pybatis import SELECT
+    from dataflow.utils.reflect import getInstance
+    p = _create_db(max(rows, 10000))
+    sql = 'select id, code, price, volume, tradedate from t_bench where id < :n'
+    print(f'== 查询结果转换为pydantic模型，{rows}行')
+
+    @SELECT(p, sql, resultType=BenchRow)
+    def select_validate(n:int)->list: ...
+
+    @SELECT(p, sql, resultType=BenchRow, validate=False)
+    def select_construct(n:int)->list: ...
+
+    _timeit('queryMany', lambda: p.queryMany(sql, {'n': rows}))
+    _timeit('queryMany + getInstance每行', lambda: [getInstance(f'{__name__}.BenchRow', one) for one in p.queryMany(sql, {'n': rows})])
+    _timeit('@SELECT resultType validate=True', lambda: select_validate(rows))
+    _timeit('@SELECT resultType validate=False', lambda: select_construct(rows))
+
+
+def _percall(name:str, func, calls:int, repeat:int=3):
+    costs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        costs.append(time.perf_counter() - start)
+    print(f'{name:<40} best={min(costs)*1000:10.1f}ms 每次调用{min(costs)*1e6/calls:8.2f}us')
+    return min(costs)
+
+
+if __name__ == "__main__":
+    case = sys.argv[1] if len(sys.argv) > 1 else 'frame'
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    if case == 'frame':
+        bench_frame(rows)
+    elif case == 'statement':
+        bench_statement(rows)
+    elif case == 'bulk':
+        bench_bulk(rows)
+    elif case == 'mapper':
+        bench_mapper(rows)
+    elif case == 'model':
+        bench_model(rows)